@@ -1,12 +1,15 @@
+import os
 import uuid
 import json
 import base64
+from collections.abc import Mapping
 from typing import Any, AsyncGenerator, Dict, Optional
 
 from starlette.applications import Starlette
 from starlette.middleware.cors import CORSMiddleware
 from starlette.requests import Request
-from starlette.responses import JSONResponse
+from starlette.responses import JSONResponse, Response
+from starlette.concurrency import run_in_threadpool
 from starlette.routing import Route, WebSocketRoute
 from starlette.websockets import WebSocket, WebSocketDisconnect
 from starlette.staticfiles import StaticFiles
@@ -23,12 +26,53 @@ except ModuleNotFoundError:
         _sys.path.insert(0, _repo_root)
     from src.agent import root_agent
 
-# In-memory store for demo; replace with DB if needed
+from src.data_store.checkpoint import get_checkpoint_store
+from src.data_store.data_store import XRD_DATA_STORE
+from src.data_store.pyramid import drop_pyramids, encode_viewport, get_pyramid
+from src.run_paths import RunPaths, use_run_paths
+
+APP_NAME = "CrystaLens"
+
+# Every run reads and writes relative to the project root, whatever the server's working
+# directory; set per run (a context variable), so concurrent runs never touch the process cwd.
+PROJECT_PATHS = RunPaths.under(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+os.environ.setdefault("XRD_CHECKPOINT_DIR", PROJECT_PATHS.output("checkpoints"))
+
+# In-memory index of runs; rebuilt from the checkpoint store on startup
 RUN_INPUTS: Dict[str, Dict[str, Any]] = {}
 
+# cached viewport pyramids are keyed by run id, so they go with the run's store namespace
+XRD_DATA_STORE.on_drop(drop_pyramids)
+
+
+def _restore_runs() -> None:
+    """Re-register checkpointed runs after a restart; runs that were still going become resumable."""
+    checkpoints = get_checkpoint_store()
+    if checkpoints is None:
+        return
+    checkpoints.prune()
+    for run in checkpoints.runs():
+        status = "interrupted" if run["status"] == "running" else run["status"]
+        if status != run["status"]:
+            checkpoints.set_status(run["run_id"], status)
+        RUN_INPUTS.setdefault(run["run_id"], {"input": run["input"], "options": run["options"], "status": status})
+
+
+_restore_runs()
+
+_RUNNER: Optional[InMemoryRunner] = None
+
+
+def _runner() -> InMemoryRunner:
+    """The one runner (and session service) shared by all runs; sessions are keyed by run id."""
+    global _RUNNER
+    if _RUNNER is None:
+        _RUNNER = InMemoryRunner(agent=root_agent, app_name=APP_NAME)
+    return _RUNNER
+
 
 def _make_json_safe(value: Any) -> Any:
-    if isinstance(value, dict):
+    if isinstance(value, Mapping):
         return {k: _make_json_safe(v) for k, v in value.items()}
     if isinstance(value, list):
         return [_make_json_safe(v) for v in value]
@@ -46,30 +90,67 @@ def _make_json_safe(value: Any) -> Any:
         return str(value)
 
 
-async def run_agent_stream(user_input: str, options: Optional[Dict[str, Any]] = None, *, session_id: str) -> AsyncGenerator[Dict[str, Any], None]:
-    yield {"type": "status", "payload": "starting"}
-    try:
-        from pathlib import Path
-        import os
-        project_root = str(Path(__file__).resolve().parents[2])
-        prev_cwd = os.getcwd()
-        os.chdir(project_root)
+def _remember_dataset(run_id: str, payload_raw: Any) -> None:
+    """Record which dataset path a run loaded, so the viewport endpoint can find it."""
+    if not isinstance(payload_raw, dict) or run_id not in RUN_INPUTS:
+        return
+    delta = (payload_raw.get("actions") or {}).get("stateDelta") or {}
+    loader = delta.get("data_loader_output")
+    if isinstance(loader, str):
         try:
-            runner = InMemoryRunner(agent=root_agent, app_name="CrystaLens")
-            # Ensure the session exists before running (async method preferred)
-            await runner.session_service.create_session(app_name="CrystaLens", user_id="web", session_id=session_id)
-            message = Content(role="user", parts=[Part(text=user_input)])
-            async for event in runner.run_async(user_id="web", session_id=session_id, new_message=message, run_config=RunConfig()):
-                try:
-                    payload_raw = event.model_dump(by_alias=True)
-                except Exception:
-                    payload_raw = str(event)
-                payload = _make_json_safe(payload_raw)
-                yield {"type": "event", "payload": payload}
-        finally:
-            os.chdir(prev_cwd)
+            loader = json.loads(loader)
+        except Exception:
+            loader = None
+    if isinstance(loader, dict) and loader.get("path"):
+        paths = RUN_INPUTS[run_id].setdefault("paths", [])
+        if loader["path"] not in paths:
+            paths.append(loader["path"])
+
+
+async def run_agent_stream(user_input: str, options: Optional[Dict[str, Any]] = None, *, session_id: str,
+                           resume: bool = False) -> AsyncGenerator[Dict[str, Any], None]:
+    yield {"type": "status", "payload": "resuming" if resume else "starting"}
+    checkpoints = get_checkpoint_store()
+    runner = _runner()
+    sessions = runner.session_service
+    try:
+        # every run gets its own store namespace, dropped a while after the run ends
+        with use_run_paths(PROJECT_PATHS), XRD_DATA_STORE.namespace(session_id) as store:
+            state = None
+            if checkpoints is not None:
+                # completed stages are skipped by the stage callbacks (see xrd_agent.checkpointing)
+                restored = checkpoints.restore(session_id, store) if resume else None
+                state = restored["state"] if restored else None
+                checkpoints.start_run(session_id, user_input, options)
+            # a resumed run starts a fresh session from its checkpointed state
+            await sessions.delete_session(app_name=APP_NAME, user_id="web", session_id=session_id)
+            await sessions.create_session(app_name=APP_NAME, user_id="web", session_id=session_id, state=state)
+            try:
+                message = Content(role="user", parts=[Part(text=user_input)])
+                async for event in runner.run_async(user_id="web", session_id=session_id, new_message=message, run_config=RunConfig()):
+                    try:
+                        payload_raw = event.model_dump(by_alias=True)
+                    except Exception:
+                        payload_raw = str(event)
+                    _remember_dataset(session_id, payload_raw)
+                    payload = _make_json_safe(payload_raw)
+                    yield {"type": "event", "payload": payload}
+            finally:
+                # the checkpoint store keeps what a later resume needs; the shared service must not grow
+                await sessions.delete_session(app_name=APP_NAME, user_id="web", session_id=session_id)
+        if checkpoints is not None:
+            checkpoints.set_status(session_id, "done")
+            # apply the retention policy to older finished runs
+            for expired in await run_in_threadpool(checkpoints.prune):
+                RUN_INPUTS.pop(expired, None)
+        if session_id in RUN_INPUTS:
+            RUN_INPUTS[session_id]["status"] = "done"
         yield {"type": "done"}
     except Exception as exc:  # pragma: no cover
+        if checkpoints is not None:
+            checkpoints.set_status(session_id, "error")
+        if session_id in RUN_INPUTS:
+            RUN_INPUTS[session_id]["status"] = "error"
         yield {"type": "error", "payload": str(exc)}
 
 
@@ -79,6 +160,9 @@ async def create_run(request: Request):
     options = data.get("options")
     run_id = str(uuid.uuid4())
     RUN_INPUTS[run_id] = {"input": user_input, "options": options}
+    checkpoints = get_checkpoint_store()
+    if checkpoints is not None:
+        checkpoints.start_run(run_id, user_input, options)
     return JSONResponse({"run_id": run_id})
 
 
@@ -92,7 +176,12 @@ async def stream_run(websocket: WebSocket) -> None:
 
     req = RUN_INPUTS[run_id]
     try:
-        async for event in run_agent_stream(req.get("input", ""), req.get("options"), session_id=run_id):
+        if req.get("status") == "done":
+            await websocket.send_json({"type": "done"})
+            return
+        # interrupted or failed runs continue from their last completed stage
+        resume = req.get("status") in ("interrupted", "error")
+        async for event in run_agent_stream(req.get("input", ""), req.get("options"), session_id=run_id, resume=resume):
             await websocket.send_json(event)
     except WebSocketDisconnect:
         pass
@@ -100,17 +189,112 @@ async def stream_run(websocket: WebSocket) -> None:
         await websocket.close()
 
 
+_TRACES = {"raw", "smoothed", "corrected"}
+
+
+def _restore_namespace(run_id: str):
+    """Bring a finished run's data back from its checkpoint (it expires again like any ended run)."""
+    checkpoints = get_checkpoint_store()
+    if checkpoints is None:
+        return None
+    store = XRD_DATA_STORE.get_namespace(run_id, create=True)
+    if checkpoints.restore(run_id, store) is None:
+        XRD_DATA_STORE.drop_namespace(run_id)
+        return None
+    XRD_DATA_STORE.end_namespace(run_id)
+    return store
+
+
+def _viewport(run_id: str, path: str, loop: Optional[int], trace: str, xmin: Optional[float], xmax: Optional[float], points: int):
+    store = XRD_DATA_STORE.get_namespace(run_id) or _restore_namespace(run_id)
+    if store is None:
+        return None, f"No stored data for run {run_id}"
+    if not path:
+        if not len(store):
+            return None, "Run has not loaded a dataset yet."
+        path = list(store)[-1]
+    # relative paths name the same files the run's tools saw
+    with use_run_paths(PROJECT_PATHS):
+        stored = store.get(path)
+    if stored is None:
+        return None, f"No data in store for {path}"
+    x = stored["two_theta_deg"]
+    if trace == "raw":
+        node, key = stored, "intensity"
+        loop = 0
+    else:
+        loops = stored.get("loops") or {}
+        if not loops:
+            return None, "Dataset has not been preprocessed yet."
+        loop = max(loops) if loop is None else loop
+        if loop not in loops:
+            return None, f"No loop {loop} for {path}"
+        node, key = loops[loop], "intensity_smooth" if trace == "smoothed" else "intensity_corr"
+        if key not in node:
+            return None, f"Trace '{trace}' not available for loop {loop}"
+    y = node[key]
+    # the cache follows the stored content, not the (possibly re-mapped) array objects
+    pyramid = get_pyramid((run_id, path, loop, trace), x, y, version=(stored.digest("two_theta_deg"), node.digest(key)))
+    xs, ys, level = pyramid.query(x, y, xmin, xmax, points)
+    return {"x": xs, "y": ys, "level": level, "total": len(pyramid), "loop": loop}, None
+
+
+async def viewport_data(request: Request):
+    """
+    Decimated 2θ/intensity samples of one trace inside a 2θ viewport.
+    Query: path (default: dataset loaded by the run), loop (default: latest),
+    trace=raw|smoothed|corrected, xmin, xmax, points (default 2000),
+    format=bin (default; uint32 n + float32 x[n] + float32 y[n]) | json.
+    """
+    run_id = request.path_params.get("run_id")
+    run = RUN_INPUTS.get(run_id)
+    if run is None:
+        return JSONResponse({"error": f"Unknown run_id {run_id}"}, status_code=404)
+    q = request.query_params
+    path = q.get("path") or (run.get("paths") or [None])[-1]
+    trace = q.get("trace", "corrected")
+    if trace not in _TRACES:
+        return JSONResponse({"error": f"trace must be one of {sorted(_TRACES)}"}, status_code=400)
+    try:
+        loop = int(q["loop"]) if "loop" in q else None
+        xmin = float(q["xmin"]) if "xmin" in q else None
+        xmax = float(q["xmax"]) if "xmax" in q else None
+        points = max(2, min(int(q.get("points", 2000)), 200_000))
+    except ValueError as exc:
+        return JSONResponse({"error": str(exc)}, status_code=400)
+
+    view, err = await run_in_threadpool(_viewport, run_id, path, loop, trace, xmin, xmax, points)
+    if err:
+        return JSONResponse({"error": err}, status_code=404)
+    headers = {
+        "X-Points": str(len(view["x"])),
+        "X-Total-Points": str(view["total"]),
+        "X-Level": str(view["level"]),
+        "X-Loop": str(view["loop"]),
+    }
+    if q.get("format") == "json":
+        return JSONResponse({"x": view["x"].tolist(), "y": view["y"].tolist(), "level": view["level"],
+                             "total": view["total"], "loop": view["loop"]}, headers=headers)
+    return Response(encode_viewport(view["x"], view["y"]), media_type="application/octet-stream", headers=headers)
+
+
+async def store_usage(request: Request):
+    """Memory accounting of the data store: budget, resident/spilled bytes and per-dataset sizes."""
+    return JSONResponse(XRD_DATA_STORE.memory_usage())
+
+
 routes = [
     Route("/api/runs", create_run, methods=["POST"]),
+    Route("/api/store", store_usage, methods=["GET"]),
+    Route("/api/runs/{run_id}/data", viewport_data, methods=["GET"]),
     WebSocketRoute("/api/runs/{run_id}/stream", stream_run),
 ]
 
 app = Starlette(routes=routes)
 
 # Serve generated artifacts (HTML/PNG) from xrd_outputs
-from pathlib import Path as _Path
-_outputs_dir = str(_Path(__file__).resolve().parents[2] / "xrd_outputs")
-app.mount("/xrd_outputs", StaticFiles(directory=_outputs_dir), name="xrd_outputs")
+os.makedirs(PROJECT_PATHS.outputs, exist_ok=True)
+app.mount("/xrd_outputs", StaticFiles(directory=PROJECT_PATHS.outputs), name="xrd_outputs")
 
 app.add_middleware(
     CORSMiddleware,
@@ -118,4 +302,5 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Points", "X-Total-Points", "X-Level", "X-Loop"],
 )
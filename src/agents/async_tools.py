@@ -0,0 +1,67 @@
+import asyncio
+import atexit
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+# worker counts per kind of work; CPU work beyond the core count only adds contention
+_SIZES: Dict[str, Callable[[], int]] = {
+    "cpu": lambda: int(os.getenv("TOOL_CPU_WORKERS", os.cpu_count() or 1)),
+    "io": lambda: int(os.getenv("TOOL_IO_WORKERS", 16)),
+}
+_EXECUTORS: Dict[str, ThreadPoolExecutor] = {}
+_LOCK = threading.Lock()
+
+
+def tool_executor(kind: str = "cpu") -> ThreadPoolExecutor:
+    """Process-wide executor for blocking tool work ("cpu" or "io"), created on first use."""
+    if kind not in _SIZES:
+        raise ValueError(f"Unknown executor kind '{kind}'")
+    with _LOCK:
+        if kind not in _EXECUTORS:
+            _EXECUTORS[kind] = ThreadPoolExecutor(max_workers=max(1, _SIZES[kind]()), thread_name_prefix=f"tool-{kind}")
+        return _EXECUTORS[kind]
+
+
+async def run_blocking(func: Callable[..., Any], *args: Any, kind: str = "cpu", **kwargs: Any) -> Any:
+    """
+    Await a blocking call on a tool executor. The caller's context variables
+    (e.g. the run's data store namespace) are carried over to the worker.
+    """
+    ctx = contextvars.copy_context()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(tool_executor(kind), functools.partial(ctx.run, func, *args, **kwargs))
+
+
+def offload(func: Optional[Callable[..., Any]] = None, *, kind: str = "cpu"):
+    """
+    Async variant of a synchronous tool: same name, docstring and signature
+    (so ADK declares it identically), but the body runs on a tool executor
+    and the event loop keeps streaming other runs meanwhile.
+
+    Threads rather than processes: the tools read and write the in-process
+    data store and tool_context.state, and numpy/scipy release the GIL in
+    their heavy loops.
+    """
+    def wrap(f: Callable[..., Any]):
+        @functools.wraps(f)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            return await run_blocking(f, *args, kind=kind, **kwargs)
+
+        return wrapper
+
+    return wrap(func) if func is not None else wrap
+
+
+def shutdown_tool_executors(wait: bool = True) -> None:
+    with _LOCK:
+        executors = list(_EXECUTORS.values())
+        _EXECUTORS.clear()
+    for executor in executors:
+        executor.shutdown(wait=wait, cancel_futures=not wait)
+
+
+atexit.register(shutdown_tool_executors, False)
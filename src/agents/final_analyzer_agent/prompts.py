@@ -13,6 +13,9 @@ Rules:
     }
 - Retrieve the results for all XRD analysis loops, excluding raw intensity arrays.
 - Use the tool results together with {retriever_results} to form a detailed synthesis.
+- To put this sample in context, you may call `query_results_warehouse` to find previously analysed samples,
+  e.g. {"two_theta": 28.4, "tolerance_deg": 0.2, "max_size_nm": 20} for samples with a peak near 28.4° and
+  a mean crystallite size below 20 nm, or {"material_id": "mp-149"} for samples matched to a reference phase.
 
 When writing the final analysis:
 - Provide a **technical, domain-expert level explanation**.
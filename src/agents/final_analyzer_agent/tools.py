@@ -1,13 +1,14 @@
 from typing import Dict, Any
-import os
 from src.data_store.data_store import XRD_DATA_STORE
+from src.run_paths import current_run_paths
+from src.data_store.warehouse import get_warehouse
 
 def get_analysis_results(payload: Dict[str, Any]) -> Dict[str, Any]:
     """
     Returns the final XRD_DATA_STORE content for analysis.
     Excludes raw diffraction arrays to keep the payload compact.
     """
-    path = os.path.abspath(payload.get("path", ""))
+    path = current_run_paths().resolve(payload.get("path", ""))
     store = XRD_DATA_STORE[path]["loops"]
     if not store:
         return {"success": False, "message": f"No XRD data found for {path}"}
@@ -26,3 +27,40 @@ def get_analysis_results(payload: Dict[str, Any]) -> Dict[str, Any]:
         "results": results,
         "message": "Retrieved XRD analysis results for final analysis."
     }
+
+
+def query_results_warehouse(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Search results saved from all previous runs (the results warehouse).
+    Optional payload keys:
+      - two_theta / tolerance_deg (default 0.2): runs with a peak near 2θ,
+        or two_theta_min / two_theta_max for an explicit interval,
+      - min_size_nm / max_size_nm: bounds on the mean Scherrer size,
+      - sample_name, material_id,
+      - latest_only (default=True), limit (default=50).
+    """
+    try:
+        lo, hi = payload.get("two_theta_min"), payload.get("two_theta_max")
+        if payload.get("two_theta") is not None:
+            center = float(payload["two_theta"])
+            tol = float(payload.get("tolerance_deg", 0.2))
+            lo, hi = center - tol, center + tol
+
+        runs = get_warehouse().query(
+            two_theta_min=lo,
+            two_theta_max=hi,
+            min_size_nm=payload.get("min_size_nm"),
+            max_size_nm=payload.get("max_size_nm"),
+            sample_name=payload.get("sample_name"),
+            material_id=payload.get("material_id"),
+            latest_only=bool(payload.get("latest_only", True)),
+            limit=int(payload.get("limit", 50)),
+        )
+        return {
+            "success": True,
+            "n_runs": len(runs),
+            "runs": runs,
+            "message": f"Found {len(runs)} matching runs in the results warehouse."
+        }
+    except Exception as e:
+        return {"success": False, "runs": [], "message": f"Failed: {str(e)}"}
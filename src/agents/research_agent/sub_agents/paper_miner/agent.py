@@ -4,6 +4,7 @@ from src.agents.research_agent.sub_agents.paper_miner import prompts
 from src.agents.research_agent.sub_agents.paper_miner.tools.search_papers import search_papers
 from src.agents.research_agent.sub_agents.paper_miner.tools.download_pdfs import download_pdfs
 from src.agents.research_agent.sub_agents.paper_miner.tools.extract_texts_from_pdfs import extract_texts_from_pdfs
+from src.agents.async_tools import offload
 
 paper_miner_agent = Agent(
     model="gemini-2.5-flash",
@@ -12,7 +13,7 @@ paper_miner_agent = Agent(
     instruction=prompts.PAPER_MINER_PROMPT,
     tools=[search_papers,
            download_pdfs,
-           extract_texts_from_pdfs,
+           offload(extract_texts_from_pdfs),
            ],
 )
 
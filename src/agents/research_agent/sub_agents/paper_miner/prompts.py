@@ -12,8 +12,8 @@ Workflow:
      * MUST include: filetype:pdf
      * If the user asks for "latest" (or gives no date), add a recent year range (e.g., 2023..NOW).
    - Call search_papers(query, max_results=10).
-   - Call download_pdfs(urls=[...], output_dir="papers/downloaded_pdfs").
-   - Call extract_texts_from_pdfs(pdf_paths=[<paths from step 3>], output_dir="papers/extracted_texts").
+   - Call download_pdfs(urls=[...]) (files go to the default papers folder).
+   - Call extract_texts_from_pdfs(pdf_paths=[<paths from step 3>]) (texts go where the retriever indexes them).
    - Return results as specified in JSON format.
 
 2) If the user provides both a file path (for XRD agent) and a material/topic:
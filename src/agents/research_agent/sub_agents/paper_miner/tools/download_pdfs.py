@@ -1,15 +1,61 @@
-import pathlib, requests
+import asyncio
+import pathlib
 from typing import List, Dict, Any
 
+import httpx
 
-def download_pdfs(urls: List[str], output_dir: str = "papers/downloaded_pdfs",
-                  timeout_sec: int = 20) -> Dict[str, Any]:
+from src.run_paths import current_run_paths
+
+# simultaneous downloads; more mostly trips rate limits on publisher sites
+MAX_CONCURRENT_DOWNLOADS = 6
+
+
+async def _download_one(client: httpx.AsyncClient, u: str, path: pathlib.Path) -> Dict[str, Any]:
+    try:
+        # Some servers don't support HEAD reliably; if HEAD fails, fall back to GET
+        try:
+            head = await client.head(u)
+            ctype = head.headers.get("Content-Type", "").lower()
+            is_pdf = "application/pdf" in ctype
+        except Exception:
+            is_pdf = False
+
+        # If HEAD was inconclusive, try a small ranged GET and sniff header bytes
+        if not is_pdf:
+            async with client.stream("GET", u, headers={"Range": "bytes=0-1023"}) as r0:
+                first_chunk = b""
+                async for chunk in r0.aiter_bytes(chunk_size=1024):
+                    first_chunk = chunk
+                    break
+            is_pdf = first_chunk.startswith(b"%PDF-")
+
+        if not is_pdf:
+            return {"url": u, "reason": "not a PDF"}
+
+        # Download
+        async with client.stream("GET", u) as resp:
+            if resp.status_code != 200:
+                return {"url": u, "reason": f"HTTP {resp.status_code}"}
+            with open(path, "wb") as f:
+                async for chunk in resp.aiter_bytes(chunk_size=8192):
+                    if chunk:
+                        f.write(chunk)
+
+        return {"url": u, "path": str(path)}
+
+    except Exception as e:
+        return {"url": u, "reason": str(e)}
+
+
+async def download_pdfs(urls: List[str], output_dir: str = "",
+                        timeout_sec: int = 20) -> Dict[str, Any]:
     """
     Download PDF files from a list of URLs into a local folder.
 
     Args:
         urls: List of HTTP/HTTPS links to check and download if they are PDFs.
-        output_dir: Folder to save files into (created if missing).
+        output_dir: Folder to save files into (created if missing); defaults to
+            downloaded_pdfs/ in the run's papers folder.
         timeout_sec: Per-request timeout.
 
     Returns:
@@ -18,49 +64,20 @@ def download_pdfs(urls: List[str], output_dir: str = "papers/downloaded_pdfs",
           - saved: list of {"url","path"} for downloaded PDFs
           - skipped: list of {"url","reason"} for non-PDFs or failures
     """
-    out = pathlib.Path(output_dir)
+    paths = current_run_paths()
+    out = pathlib.Path(paths.resolve(output_dir) if output_dir else paths.paper("downloaded_pdfs"))
     out.mkdir(parents=True, exist_ok=True)
 
-    saved, skipped = [], []
-
-    for idx, u in enumerate(urls, start=1):
-        try:
-            # Some servers don't support HEAD reliably; if HEAD fails, fall back to GET
-            try:
-                head = requests.head(u, allow_redirects=True, timeout=timeout_sec)
-                ctype = head.headers.get("Content-Type", "").lower()
-                is_pdf = "application/pdf" in ctype
-            except Exception:
-                is_pdf = False
-
-            # If HEAD was inconclusive, try a small ranged GET and sniff header bytes
-            if not is_pdf:
-                r0 = requests.get(u, stream=True, timeout=timeout_sec,
-                                  headers={"Range": "bytes=0-1023"})
-                first_chunk = next(r0.iter_content(chunk_size=1024), b"")
-                is_pdf = first_chunk.startswith(b"%PDF-")
-
-            if not is_pdf:
-                skipped.append({"url": u, "reason": "not a PDF"})
-                continue
-
-            # Download
-            resp = requests.get(u, stream=True, timeout=timeout_sec)
-            if resp.status_code != 200:
-                skipped.append({"url": u, "reason": f"HTTP {resp.status_code}"})
-                continue
+    limit = asyncio.Semaphore(MAX_CONCURRENT_DOWNLOADS)
 
+    async def bounded(client: httpx.AsyncClient, idx: int, u: str) -> Dict[str, Any]:
+        async with limit:
             # Make a friendly filename
-            name = f"paper_{idx}.pdf"
-            path = out / name
-            with open(path, "wb") as f:
-                for chunk in resp.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-
-            saved.append({"url": u, "path": str(path)})
+            return await _download_one(client, u, out / f"paper_{idx}.pdf")
 
-        except Exception as e:
-            skipped.append({"url": u, "reason": str(e)})
+    async with httpx.AsyncClient(timeout=timeout_sec, follow_redirects=True) as client:
+        results = await asyncio.gather(*(bounded(client, idx, u) for idx, u in enumerate(urls, start=1)))
 
+    saved = [r for r in results if "path" in r]
+    skipped = [r for r in results if "path" not in r]
     return {"status": "ok", "saved": saved, "skipped": skipped}
@@ -3,17 +3,20 @@ from typing import List, Dict, Any
 
 import fitz
 
+from src.run_paths import current_run_paths
+
 
 def extract_texts_from_pdfs(
     pdf_paths: List[str],
-    output_dir: str = "papers/extracted_texts"
+    output_dir: str = ""
 ) -> Dict[str, Any]:
     """
     Extract plain text from a list of local PDF files and save as .txt files.
 
     Args:
         pdf_paths: List of local PDF file paths (e.g., results from download_pdfs).
-        output_dir: Directory to write extracted .txt files.
+        output_dir: Directory to write extracted .txt files; defaults to
+            extracted_texts/ in the run's papers folder.
 
     Returns:
         dict with:
@@ -21,13 +24,15 @@ def extract_texts_from_pdfs(
           - saved: list of {"pdf","text_path","pages","chars"}
           - skipped: list of {"pdf","reason"}
     """
-    out = pathlib.Path(output_dir)
+    paths = current_run_paths()
+    out = pathlib.Path(paths.resolve(output_dir) if output_dir else paths.paper("extracted_texts"))
     out.mkdir(parents=True, exist_ok=True)
 
     saved, skipped = [], []
 
     for p in pdf_paths:
         try:
+            p = paths.resolve(p)
             if not os.path.exists(p):
                 skipped.append({"pdf": p, "reason": "file not found"})
                 continue
@@ -1,4 +1,6 @@
-import os, requests
+import os
+
+import httpx
 from typing import List, Dict, Any
 
 import dotenv
@@ -8,7 +10,7 @@ dotenv.load_dotenv()
 GOOGLE_CSE_API_KEY = os.getenv("GOOGLE_CSE_API_KEY")
 GOOGLE_CSE_ID = os.getenv("GOOGLE_CSE_ID")
 
-def search_papers(query: str, max_results: int = 10) -> Dict[str, Any]:
+async def search_papers(query: str, max_results: int = 10) -> Dict[str, Any]:
     """
     Search Google Programmable Search (Custom Search JSON API) and return a list of result URLs.
 
@@ -36,22 +38,24 @@ def search_papers(query: str, max_results: int = 10) -> Dict[str, Any]:
     all_urls: List[str] = []
     calls_needed = (max_results + 9) // 10
 
-    for i in range(calls_needed):
-        start_index = i * 10 + 1
-        results_for_call = min(10, max_results - len(all_urls))
-        params = {"key": GOOGLE_CSE_API_KEY, "cx": GOOGLE_CSE_ID, "q": query,
-                  "num": results_for_call, "start": start_index}
-        r = requests.get(url, params=params, timeout=20)
-        if r.status_code != 200:
-            return {"status": "error", "query": query, "urls": list(dict.fromkeys(all_urls)),
-                    "total": len(all_urls),
-                    "message": f"HTTP {r.status_code}: {r.text[:300]}"}
-        data = r.json()
-        items = data.get("items", [])
-        batch = [item["link"].split("?")[0] for item in items if "link" in item]
-        all_urls.extend(batch)
-        if len(all_urls) >= max_results or not items:
-            break
+    # async client: waiting on the search API does not block the event loop
+    async with httpx.AsyncClient(timeout=20) as client:
+        for i in range(calls_needed):
+            start_index = i * 10 + 1
+            results_for_call = min(10, max_results - len(all_urls))
+            params = {"key": GOOGLE_CSE_API_KEY, "cx": GOOGLE_CSE_ID, "q": query,
+                      "num": results_for_call, "start": start_index}
+            r = await client.get(url, params=params)
+            if r.status_code != 200:
+                return {"status": "error", "query": query, "urls": list(dict.fromkeys(all_urls)),
+                        "total": len(all_urls),
+                        "message": f"HTTP {r.status_code}: {r.text[:300]}"}
+            data = r.json()
+            items = data.get("items", [])
+            batch = [item["link"].split("?")[0] for item in items if "link" in item]
+            all_urls.extend(batch)
+            if len(all_urls) >= max_results or not items:
+                break
 
     unique_urls = list(dict.fromkeys(all_urls))[:max_results]
     print(f"🔗 Total unique links found: {len(unique_urls)}")
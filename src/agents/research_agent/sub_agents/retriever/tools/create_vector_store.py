@@ -1,4 +1,5 @@
 import os
+import asyncio
 import json
 import pickle
 import pathlib
@@ -7,18 +8,21 @@ from typing import List, Dict, Any
 import numpy as np
 import faiss
 from dataclasses import dataclass
-from openai import OpenAI
+from openai import AsyncOpenAI
 import dotenv
 
+from src.agents.async_tools import run_blocking
+from src.run_paths import current_run_paths
+
 # Load API key
 dotenv.load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-# Directories
-EXTRACTED_DIR = "papers/extracted_texts"
-VECTOR_STORE_DIR = "papers/vector_store"
-INDEX_FILE = os.path.join(VECTOR_STORE_DIR, "papers.faiss")
-CHUNKS_FILE = os.path.join(VECTOR_STORE_DIR, "papers.chunks")
+# Directories, inside the current run's papers folder
+EXTRACTED_DIR = "extracted_texts"
+VECTOR_STORE_DIR = "vector_store"
+INDEX_FILE = "papers.faiss"
+CHUNKS_FILE = "papers.chunks"
 
 # ---------- Data Structures ----------
 
@@ -83,18 +87,23 @@ def _split_text(text: str, chunk_size: int, chunk_overlap: int) -> List[str]:
 
 # ---------- Embedding ----------
 
-def _embed_texts_openai(
+async def _embed_texts_openai(
     texts: List[str],
     model: str = "text-embedding-3-small",
-    batch_size: int = 64
+    batch_size: int = 64,
+    max_concurrency: int = 4,
 ) -> np.ndarray:
-    client = OpenAI(api_key=OPENAI_API_KEY)
-    vectors: List[List[float]] = []
+    client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+    limit = asyncio.Semaphore(max_concurrency)
+
+    async def embed(batch: List[str]) -> List[List[float]]:
+        async with limit:
+            resp = await client.embeddings.create(model=model, input=batch)
+            return [d.embedding for d in resp.data]
 
-    for i in range(0, len(texts), batch_size):
-        batch = texts[i:i + batch_size]
-        resp = client.embeddings.create(model=model, input=batch)
-        vectors.extend([d.embedding for d in resp.data])
+    # batches are requested concurrently; gather keeps their order
+    batches = await asyncio.gather(*(embed(texts[i:i + batch_size]) for i in range(0, len(texts), batch_size)))
+    vectors: List[List[float]] = [v for batch in batches for v in batch]
 
     arr = np.array(vectors, dtype=np.float32)
     # Normalize embeddings for cosine similarity
@@ -104,25 +113,8 @@ def _embed_texts_openai(
 
 # ---------- Main Tool ----------
 
-def create_vector_store() -> Dict[str, Any]:
-    """
-    Build a FAISS vector index from extracted text files.
-
-    Returns:
-        dict: { status, files_indexed, chunks, index_paths }
-    """
-    print(">>> Creating vector store...")
-    extracted_dir = EXTRACTED_DIR
-    vector_store_dir = VECTOR_STORE_DIR
-    chunk_size = 1200
-    chunk_overlap = 200
-    embedding_model = "text-embedding-3-large"
-    os.makedirs(vector_store_dir, exist_ok=True)
-
+def _collect_chunks(extracted_dir: str, chunk_size: int, chunk_overlap: int):
     txt_files = [f for f in os.listdir(extracted_dir) if f.endswith(".txt")]
-    if not txt_files:
-        return {"status": "error", "message": "No .txt files found.", "files_indexed": 0, "chunks": 0}
-
     docs_texts: List[str] = []
     docs_metas: List[Dict[str, Any]] = []
 
@@ -148,12 +140,11 @@ def create_vector_store() -> Dict[str, Any]:
                 "chunk_index": idx,
                 "chunk_size": len(chunk),
             })
+    return txt_files, docs_texts, docs_metas
 
-    if not docs_texts:
-        return {"status": "error", "message": "No content to index.", "files_indexed": len(txt_files), "chunks": 0}
-
-    embeddings = _embed_texts_openai(docs_texts, model=embedding_model)
 
+def _write_index(embeddings: np.ndarray, docs_texts: List[str], docs_metas: List[Dict[str, Any]],
+                 vector_store_dir: str) -> Dict[str, str]:
     dim = embeddings.shape[1]
     index = faiss.IndexFlatIP(dim)
     index.add(embeddings)
@@ -167,12 +158,41 @@ def create_vector_store() -> Dict[str, Any]:
     paper_chunks: List[PaperChunk] = [PaperChunk(text=t, metadata=m) for t, m in zip(docs_texts, docs_metas)]
     with open(chunks_path, "wb") as f:
         pickle.dump(paper_chunks, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return {"faiss": faiss_path, "chunks": chunks_path}
+
+
+async def create_vector_store() -> Dict[str, Any]:
+    """
+    Build a FAISS vector index from extracted text files.
+
+    Returns:
+        dict: { status, files_indexed, chunks, index_paths }
+    """
+    print(">>> Creating vector store...")
+    paths = current_run_paths()
+    extracted_dir = paths.paper(EXTRACTED_DIR)
+    vector_store_dir = paths.paper(VECTOR_STORE_DIR)
+    chunk_size = 1200
+    chunk_overlap = 200
+    embedding_model = "text-embedding-3-large"
+    os.makedirs(vector_store_dir, exist_ok=True)
+
+    txt_files, docs_texts, docs_metas = await run_blocking(
+        _collect_chunks, extracted_dir, chunk_size, chunk_overlap, kind="io")
+    if not txt_files:
+        return {"status": "error", "message": "No .txt files found.", "files_indexed": 0, "chunks": 0}
+
+    if not docs_texts:
+        return {"status": "error", "message": "No content to index.", "files_indexed": len(txt_files), "chunks": 0}
+
+    embeddings = await _embed_texts_openai(docs_texts, model=embedding_model)
+    index_paths = await run_blocking(_write_index, embeddings, docs_texts, docs_metas, vector_store_dir)
 
     return {
         "status": "ok",
         "files_indexed": len(txt_files),
         "chunks": len(docs_texts),
-        "index_paths": {"faiss": faiss_path, "chunks": chunks_path}
+        "index_paths": index_paths
     }
 
 def check_vector_store() -> Dict[str, Any]:
@@ -186,28 +206,30 @@ def check_vector_store() -> Dict[str, Any]:
         }
     """
     print(">>> Checking vector store...")
-    faiss_exists = os.path.exists(INDEX_FILE)
-    chunks_exists = os.path.exists(CHUNKS_FILE)
+    index_file = current_run_paths().paper(VECTOR_STORE_DIR, INDEX_FILE)
+    chunks_file = current_run_paths().paper(VECTOR_STORE_DIR, CHUNKS_FILE)
+    faiss_exists = os.path.exists(index_file)
+    chunks_exists = os.path.exists(chunks_file)
 
     if faiss_exists and chunks_exists:
         return {
             "status": "ok",
             "index_paths": {
-                "faiss": INDEX_FILE,
-                "chunks": CHUNKS_FILE
+                "faiss": index_file,
+                "chunks": chunks_file
             }
         }
     else:
         return {
             "status": "error",
             "index_paths": {
-                "faiss": INDEX_FILE if faiss_exists else None,
-                "chunks": CHUNKS_FILE if chunks_exists else None
+                "faiss": index_file if faiss_exists else None,
+                "chunks": chunks_file if chunks_exists else None
             }
         }
 
 # if __name__ == "__main__":
 #     print(">>> Building vector store from extracted texts...")
-#     result = create_vector_store()
+#     result = asyncio.run(create_vector_store())
 #     print(">>> Done.")
 #     print(json.dumps(result, indent=2))
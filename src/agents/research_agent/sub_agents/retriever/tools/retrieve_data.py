@@ -1,26 +1,41 @@
 import os
+import asyncio
 import pickle
 import faiss
 import numpy as np
 from typing import Dict, Any, List
-from openai import OpenAI
+from openai import AsyncOpenAI
 
-client = OpenAI()
+from src.agents.async_tools import run_blocking
+from src.run_paths import current_run_paths
 
-VECTOR_DIR = "papers/vector_store"
-INDEX_FILE = os.path.join(VECTOR_DIR, "papers.faiss")
-CHUNKS_FILE = os.path.join(VECTOR_DIR, "papers.chunks")  # updated extension
+client = AsyncOpenAI()
 
+# inside the current run's papers folder
+VECTOR_DIR = "vector_store"
+INDEX_FILE = "papers.faiss"
+CHUNKS_FILE = "papers.chunks"  # updated extension
 
-def _embed_query(query: str) -> List[float]:
-    response = client.embeddings.create(
+
+async def _embed_query(query: str) -> List[float]:
+    response = await client.embeddings.create(
         input=[query],
         model="text-embedding-3-large"
     )
     return response.data[0].embedding
 
 
-def retrieve_data(payload: Dict[str, Any]) -> Dict[str, Any]:
+def _load_store(index_file: str, chunks_file: str):
+    # Load FAISS index
+    index = faiss.read_index(index_file)
+
+    # Load PaperChunk objects
+    with open(chunks_file, "rb") as f:
+        documents = pickle.load(f)
+    return index, documents
+
+
+async def retrieve_data(payload: Dict[str, Any]) -> Dict[str, Any]:
     """
     Retrieve relevant chunks for a given query from FAISS index.
 
@@ -34,21 +49,18 @@ def retrieve_data(payload: Dict[str, Any]) -> Dict[str, Any]:
     query = payload.get("query", "")
     top_k = payload.get("top_k", 5)
 
-    if not os.path.exists(INDEX_FILE) or not os.path.exists(CHUNKS_FILE):
+    index_file = current_run_paths().paper(VECTOR_DIR, INDEX_FILE)
+    chunks_file = current_run_paths().paper(VECTOR_DIR, CHUNKS_FILE)
+    if not os.path.exists(index_file) or not os.path.exists(chunks_file):
         return {"status": "error", "message": "Vector store not found. Run create_vector_store first."}
 
-    # Load FAISS index
-    index = faiss.read_index(INDEX_FILE)
-
-    # Load PaperChunk objects
-    with open(CHUNKS_FILE, "rb") as f:
-        documents = pickle.load(f)
-
-    # Embed query
-    qvec = np.array([_embed_query(query)], dtype="float32")
+    # the index loads on a worker thread while the query is embedded
+    (index, documents), qvec = await asyncio.gather(
+        run_blocking(_load_store, index_file, chunks_file, kind="io"), _embed_query(query))
+    qvec = np.array([qvec], dtype="float32")
 
     # Search
-    D, I = index.search(qvec, top_k)
+    D, I = await run_blocking(index.search, qvec, top_k)
     results = []
     for idx, score in zip(I[0], D[0]):
         if 0 <= idx < len(documents):
@@ -0,0 +1,288 @@
+"""
+Headless batch runs of the numeric XRD pipeline over directories of scans.
+
+    python -m src.agents.xrd_agent.batch sample_data/ -o batch_out --workers 4
+
+Files are processed by `run_pipeline` on a process pool (no web UI, no model
+calls). Each completed file becomes one row of a columnar summary, written in
+atomically renamed parts so that a crashed or interrupted batch resumes by
+skipping inputs already summarized (same path, size and mtime).
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+import pandas as pd
+
+DEFAULT_PATTERNS = ("*.csv", "*.txt", "*.xy", "*.dat", "*.xlsx")
+# the report stage writes per-file JSON/HTML; summaries usually do not need it
+DEFAULT_STAGES = ("scherrer_wh", "reference")
+
+
+def discover(inputs: Sequence[str], patterns: Sequence[str] = DEFAULT_PATTERNS, recursive: bool = True) -> List[str]:
+    """Absolute paths of every matching file under the given files/directories, sorted and unique."""
+    found: Set[str] = set()
+    for item in inputs:
+        if os.path.isfile(item):
+            found.add(os.path.abspath(item))
+            continue
+        for pattern in patterns:
+            spec = os.path.join(item, "**", pattern) if recursive else os.path.join(item, pattern)
+            found.update(os.path.abspath(p) for p in glob.glob(spec, recursive=recursive) if os.path.isfile(p))
+    return sorted(found)
+
+
+def _file_key(path: str) -> Tuple[str, int, int]:
+    st = os.stat(path)
+    return path, int(st.st_size), int(st.st_mtime_ns)
+
+
+# --- summary parts -------------------------------------------------------------
+def _parquet_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _read_part(path: str) -> pd.DataFrame:
+    return pd.read_parquet(path) if path.endswith(".parquet") else pd.read_csv(path)
+
+
+def read_summary(output_dir: str) -> pd.DataFrame:
+    """All rows written so far (every part of the summary)."""
+    parts = sorted(glob.glob(os.path.join(output_dir, "parts", "part-*.*")))
+    parts = [p for p in parts if not os.path.basename(p).startswith(".")]
+    if not parts:
+        return pd.DataFrame()
+    return pd.concat([_read_part(p) for p in parts], ignore_index=True)
+
+
+def completed_inputs(output_dir: str) -> Set[Tuple[str, int, int]]:
+    """(path, size, mtime) of the inputs already summarized successfully."""
+    df = read_summary(output_dir)
+    if df.empty:
+        return set()
+    ok = df[df["status"] == "ok"]
+    return set(zip(ok["path"], ok["size_bytes"].astype(int), ok["mtime_ns"].astype(int)))
+
+
+def _write_part(output_dir: str, rows: List[Dict[str, Any]], parquet: bool) -> str:
+    parts_dir = os.path.join(output_dir, "parts")
+    os.makedirs(parts_dir, exist_ok=True)
+    ext = "parquet" if parquet else "csv"
+    name = f"part-{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{time.perf_counter_ns()}.{ext}"
+    tmp, final = os.path.join(parts_dir, f".{name}"), os.path.join(parts_dir, name)
+    df = pd.DataFrame(rows)
+    if parquet:
+        df.to_parquet(tmp, index=False)
+    else:
+        df.to_csv(tmp, index=False)
+    os.replace(tmp, final)
+    return final
+
+
+# --- worker ------------------------------------------------------------------------
+def _init_worker(memory_mb: Optional[int]) -> None:
+    if memory_mb:
+        os.environ["XRD_STORE_MEMORY_MB"] = str(memory_mb)
+
+
+def process_file(path: str, options: Dict[str, Any]) -> Dict[str, Any]:
+    """One summary row for one scan; runs in a worker process, in its own store namespace."""
+    from src.agents.xrd_agent.pipeline import run_pipeline
+    from src.agents.xrd_agent.sub_agents.hyperparameter_optimizer.search import PARAM_NAMES
+    from src.data_store.data_store import XRD_DATA_STORE
+    from src.run_paths import RunPaths, use_run_paths
+
+    path, size, mtime = _file_key(path)
+    row: Dict[str, Any] = {"path": path, "size_bytes": size, "mtime_ns": mtime,
+                           "sample_name": os.path.splitext(os.path.basename(path))[0], "worker_pid": os.getpid()}
+    t0 = time.perf_counter()
+    namespace = f"batch-{os.getpid()}-{time.perf_counter_ns()}"
+    try:
+        # reports and indexes go to <output_dir>/xrd_outputs, whichever process runs the file
+        outputs = os.path.join(options["output_dir"], "xrd_outputs")
+        with use_run_paths(RunPaths.under(os.getcwd(), outputs=outputs)), \
+                XRD_DATA_STORE.namespace(namespace, end_on_exit=False):
+            payload = {"path": path, "sample_name": row["sample_name"], "plot": False, **options.get("params", {})}
+            # every file is seen once, so memoization would only hold memory
+            result = run_pipeline(payload, stages=options.get("stages"), use_cache=False)
+            entry = XRD_DATA_STORE[path] if path in XRD_DATA_STORE else None
+            row["n_points"] = int(len(entry["intensity"])) if entry is not None else 0
+            if entry is not None and row["n_points"]:
+                row["two_theta_min"] = float(entry["two_theta_deg"].min())
+                row["two_theta_max"] = float(entry["two_theta_deg"].max())
+    except Exception as e:
+        row.update(status="failed", message=f"Failed: {str(e)}", t_total=time.perf_counter() - t0)
+        return row
+    finally:
+        XRD_DATA_STORE.drop_namespace(namespace)
+
+    res = result["results"]
+    peaks = res.get("peaks") or []
+    sizes = [s["L_nm"] for s in res.get("scherrer") or []]
+    wh = res.get("williamson_hall") or {}
+    mp = res.get("mp_comparison") or {}
+    row.update({
+        "status": "ok" if result["success"] else "failed",
+        "message": result["message"],
+        "n_peaks": len(peaks),
+        "peaks_two_theta": json.dumps([round(p["two_theta"], 4) for p in peaks]),
+        "peaks_fwhm_deg": json.dumps([round(p["fwhm_deg"], 5) for p in peaks]),
+        "scherrer_mean_nm": float(sum(sizes) / len(sizes)) if sizes else None,
+        "wh_strain": wh.get("slope_strain"),
+        "wh_intercept": wh.get("intercept_size"),
+        "wh_r2": wh.get("r2"),
+        "mp_material_id": mp.get("material_id"),
+        "mp_matched": mp.get("matched_count"),
+    })
+    row.update({k: result["params"].get(k) for k in PARAM_NAMES})
+    row.update({f"t_{s['stage']}": s.get("elapsed_s") for s in result["stages"]})
+    row["t_total"] = time.perf_counter() - t0
+    return row
+
+
+# --- driver ------------------------------------------------------------------------
+def run_batch(
+    inputs: Sequence[str],
+    output_dir: str,
+    workers: Optional[int] = None,
+    patterns: Sequence[str] = DEFAULT_PATTERNS,
+    stages: Optional[Sequence[str]] = DEFAULT_STAGES,
+    params: Optional[Dict[str, Any]] = None,
+    resume: bool = True,
+    flush_every: int = 50,
+    tasks_per_child: Optional[int] = 200,
+    worker_memory_mb: Optional[int] = 256,
+    log=print,
+) -> Dict[str, Any]:
+    """
+    Process every input scan and append its row to the summary in `output_dir`.
+
+    At most 2 x workers files are in flight, and workers are recycled every
+    `tasks_per_child` files, so memory stays bounded for any batch size;
+    each worker's data store is capped at `worker_memory_mb`. Rows are
+    flushed every `flush_every` files. workers=0 runs in-process.
+    Returns throughput and per-stage timing statistics.
+    """
+    output_dir = os.path.abspath(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    files = discover(inputs, patterns)
+    done = completed_inputs(output_dir) if resume else set()
+    todo = [f for f in files if _file_key(f) not in done]
+    log(f"{len(files)} files found, {len(files) - len(todo)} already summarized, {len(todo)} to process")
+
+    parquet = _parquet_available()
+    options = {"stages": list(stages) if stages else None, "params": dict(params or {}), "output_dir": output_dir}
+    workers = (os.cpu_count() or 1) if workers is None else int(workers)
+    pending_rows: List[Dict[str, Any]] = []
+    stage_times: Dict[str, List[float]] = defaultdict(list)
+    n_ok = n_failed = n_points = 0
+    t0 = time.perf_counter()
+
+    def collect(row: Dict[str, Any]) -> None:
+        nonlocal n_ok, n_failed, n_points
+        pending_rows.append(row)
+        if row.get("status") == "ok":
+            n_ok += 1
+        else:
+            n_failed += 1
+        n_points += int(row.get("n_points") or 0)
+        for k, v in row.items():
+            if k.startswith("t_") and v is not None:
+                stage_times[k[2:]].append(float(v))
+        n = n_ok + n_failed
+        if len(pending_rows) >= flush_every:
+            _write_part(output_dir, pending_rows, parquet)
+            pending_rows.clear()
+        if n % max(1, flush_every) == 0 or n == len(todo):
+            elapsed = time.perf_counter() - t0
+            log(f"[{n}/{len(todo)}] {n / elapsed:.2f} files/s, {n_points / elapsed:,.0f} points/s, {n_failed} failed")
+
+    try:
+        if workers <= 0:
+            for f in todo:
+                collect(process_file(f, options))
+        else:
+            pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                       initargs=(worker_memory_mb,),
+                                       max_tasks_per_child=tasks_per_child)
+            with pool:
+                in_flight = set()
+                for f in todo:
+                    in_flight.add(pool.submit(process_file, f, options))
+                    if len(in_flight) >= 2 * workers:
+                        finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        for fut in finished:
+                            collect(fut.result())
+                for fut in wait(in_flight).done:
+                    collect(fut.result())
+    finally:
+        if pending_rows:
+            _write_part(output_dir, pending_rows, parquet)
+
+    elapsed = time.perf_counter() - t0
+    summary = read_summary(output_dir)
+    summary_path = os.path.join(output_dir, "summary.parquet" if parquet else "summary.csv")
+    if not summary.empty:
+        # latest row per input wins (a resumed batch may have retried failures)
+        summary = summary.drop_duplicates("path", keep="last")
+        if parquet:
+            summary.to_parquet(summary_path, index=False)
+        else:
+            summary.to_csv(summary_path, index=False)
+    stats = {
+        "files": len(todo),
+        "skipped": len(files) - len(todo),
+        "ok": n_ok,
+        "failed": n_failed,
+        "elapsed_s": round(elapsed, 3),
+        "files_per_s": round(len(todo) / elapsed, 3) if elapsed > 0 else None,
+        "points_per_s": round(n_points / elapsed, 1) if elapsed > 0 else None,
+        "stage_timing_s": {
+            s: {"mean": round(sum(v) / len(v), 4), "total": round(sum(v), 3)} for s, v in stage_times.items() if v
+        },
+        "summary_path": summary_path,
+    }
+    return stats
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run the numeric XRD pipeline over directories of scans.")
+    parser.add_argument("inputs", nargs="+", help="Files or directories to process (searched recursively).")
+    parser.add_argument("-o", "--output-dir", default="xrd_batch", help="Where the summary and reports go.")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Worker processes (default: CPU count, 0 = in-process).")
+    parser.add_argument("--pattern", action="append", dest="patterns", help="File glob, repeatable (default: csv/txt/xy/dat/xlsx).")
+    parser.add_argument("--report", action="store_true", help="Also write per-file JSON reports and plots.")
+    parser.add_argument("--params", type=json.loads, default=None,
+                        help='Pipeline parameters for every file, as JSON (e.g. \'{"mp_identifier": "mp-149"}\').')
+    parser.add_argument("--no-resume", action="store_true", help="Reprocess inputs that are already summarized.")
+    parser.add_argument("--flush-every", type=int, default=50)
+    parser.add_argument("--tasks-per-child", type=int, default=200)
+    parser.add_argument("--worker-memory-mb", type=int, default=256)
+    args = parser.parse_args(argv)
+
+    stats = run_batch(
+        args.inputs, args.output_dir, workers=args.workers, patterns=args.patterns or DEFAULT_PATTERNS,
+        stages=("report",) if args.report else DEFAULT_STAGES, params=args.params, resume=not args.no_resume,
+        flush_every=args.flush_every, tasks_per_child=args.tasks_per_child, worker_memory_mb=args.worker_memory_mb,
+        log=lambda msg: print(msg, file=sys.stderr),
+    )
+    print(f"{stats['ok']} ok, {stats['failed']} failed, {stats['skipped']} skipped in {stats['elapsed_s']:.1f}s "
+          f"({stats['files_per_s']} files/s, {stats['points_per_s']} points/s)")
+    for stage, t in stats["stage_timing_s"].items():
+        print(f"  {stage:<12} mean {t['mean'] * 1000:8.1f} ms   total {t['total']:8.2f} s")
+    print(f"summary: {stats['summary_path']}")
+    return 0 if stats["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
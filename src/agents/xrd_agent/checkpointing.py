@@ -0,0 +1,55 @@
+import logging
+from typing import Optional
+
+from google.adk.agents.callback_context import CallbackContext
+from google.genai import types
+
+from src.agents.async_tools import run_blocking
+from src.data_store.checkpoint import get_checkpoint_store
+from src.data_store.data_store import XRD_DATA_STORE
+
+logger = logging.getLogger(__name__)
+
+COMPLETED_STAGES_KEY = "completed_stages"
+_RUNNING_STAGE_KEY = "running_stage"
+
+
+def _stage_key(callback_context: CallbackContext) -> str:
+    return f"{callback_context.agent_name}@{callback_context.state.get('loop_iteration', 1)}"
+
+
+def skip_completed_stage(callback_context: CallbackContext) -> Optional[types.Content]:
+    """
+    before_agent_callback of the pipeline stages: when a run resumed from a
+    checkpoint already completed this stage for the current loop, skip it
+    (its store entries and output_key state were restored).
+    """
+    key = _stage_key(callback_context)
+    if key in (callback_context.state.get(COMPLETED_STAGES_KEY) or []):
+        return types.Content(role="model", parts=[types.Part(text=f"Stage {key} restored from checkpoint.")])
+    callback_context.state[_RUNNING_STAGE_KEY] = key
+    return None
+
+
+async def checkpoint_stage(callback_context: CallbackContext) -> Optional[types.Content]:
+    """
+    after_agent_callback of the pipeline stages: mark the stage completed and
+    persist the run's store namespace and session state on an I/O worker, so
+    the SQLite and .npy writes do not block the event loop. Checkpoint
+    failures are logged and never fail the run.
+    """
+    key = callback_context.state.get(_RUNNING_STAGE_KEY) or _stage_key(callback_context)
+    completed = list(callback_context.state.get(COMPLETED_STAGES_KEY) or [])
+    if key not in completed:
+        completed.append(key)
+    callback_context.state[COMPLETED_STAGES_KEY] = completed
+
+    checkpoints = get_checkpoint_store()
+    if checkpoints is not None:
+        try:
+            run_id = callback_context._invocation_context.session.id
+            await run_blocking(checkpoints.save, run_id, XRD_DATA_STORE.current(), callback_context.state.to_dict(),
+                               stage=key, kind="io")
+        except Exception as e:
+            logger.warning("Checkpoint of stage %s failed: %s", key, e)
+    return None
@@ -0,0 +1,270 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+from dataclasses import dataclass
+from graphlib import TopologicalSorter
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from google.adk.tools import ToolContext
+
+from src.data_store.data_store import XRD_DATA_STORE, canonical_key
+from src.run_paths import current_run_paths
+from src.agents.xrd_agent.sub_agents.data_loader.tools import inspect_xrd_file, load_xrd_data
+from src.agents.xrd_agent.sub_agents.data_preprocessor.tools import preprocess_xrd_data
+from src.agents.xrd_agent.sub_agents.hyperparameter_optimizer.search import PARAM_NAMES
+from src.agents.xrd_agent.sub_agents.hyperparameter_optimizer.tools import estimate_parameters
+from src.agents.xrd_agent.sub_agents.peak_finder.tools import find_and_fit_peaks
+from src.agents.xrd_agent.sub_agents.scherrer_and_wh.tools import scherrer_and_wh
+from src.agents.xrd_agent.sub_agents.reference_check.tools.compare_with_mp import compare_with_mp
+from src.agents.xrd_agent.sub_agents.reporter.tools.analyzer import save_results
+from src.agents.xrd_agent.sub_agents.reporter.tools.plotter import plot_results
+
+
+class _PipelineContext:
+    """Stand-in for ToolContext: the stage tools only use `state`."""
+
+    def __init__(self, state: Dict[str, Any]):
+        self.state = state
+
+
+@dataclass(frozen=True)
+class Stage:
+    """
+    One node of the pipeline DAG: a store-backed tool, the payload keys that
+    change its output, and the store values it writes (at the entry level
+    when `base`, otherwise in the loop's dict). Those values plus the tool's
+    result are what gets memoized; stages with side effects outside the store
+    (`memo=False`) always run.
+    """
+
+    name: str
+    run: Callable[[Dict[str, Any], Any], Dict[str, Any]]
+    deps: Tuple[str, ...] = ()
+    params: Tuple[str, ...] = ()
+    outputs: Tuple[str, ...] = ()
+    base: bool = False
+    memo: bool = True
+
+
+def _report(payload: Dict[str, Any], ctx: _PipelineContext) -> Dict[str, Any]:
+    saved = save_results(payload, ctx)
+    if not saved.get("success") or not payload.get("plot", True):
+        return saved
+    loop_iter = ctx.state.get("loop_iteration", 1)
+    plotted = plot_results({"defer_static": True, **payload}, ctx)
+    # plot_results advances the loop counter for the agent loop; a pipeline run stays on its loop
+    ctx.state["loop_iteration"] = loop_iter
+    return {**saved, "figures": plotted.get("figures", []), "deferred_figures": plotted.get("deferred_figures", []),
+            "success": plotted.get("success", False),
+            "message": f"{saved['message']} {plotted.get('message', '')}".strip()}
+
+
+STAGES: Dict[str, Stage] = {s.name: s for s in (
+    Stage("load", load_xrd_data, (),
+          ("two_theta_col", "intensity_col", "unit_two_theta", "sample_name", "mp_identifier", "formula",
+           "wavelength_angstrom"),
+          ("two_theta_deg", "intensity", "meta"), base=True),
+    Stage("estimate", estimate_parameters, ("load",), ("reference_two_theta",), ("meta",), base=True),
+    Stage("preprocess", preprocess_xrd_data, ("estimate",), PARAM_NAMES[:4],
+          ("intensity_smooth", "intensity_corr", "meta")),
+    Stage("peaks", find_and_fit_peaks, ("preprocess",), PARAM_NAMES[4:], ("peaks", "meta")),
+    Stage("scherrer_wh", scherrer_and_wh, ("peaks",), (),
+          ("scherrer", "williamson_hall", "williamson_hall_diagnostics")),
+    Stage("reference", compare_with_mp, ("peaks",), ("mp_identifier", "mp_top_n", "mp_min_intensity"),
+          ("mp_comparison",)),
+    # report files are named by sample and loop, so another run may have overwritten them
+    Stage("report", _report, ("scherrer_wh", "reference"), ("compress", "plot", "static_backend", "max_points"),
+          memo=False),
+)}
+
+# memoized stage outputs keep their arrays alive, so the cache is bounded by their size (and entry count)
+_MEMO_SIZE = 256
+_MEMO_MAX_BYTES = int(float(os.getenv("XRD_PIPELINE_CACHE_MB", "256")) * (1 << 20))
+_MEMO: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_MEMO_BYTES = 0
+_MEMO_LOCK = threading.Lock()
+
+
+def _detach(value: Any) -> Any:
+    """Snapshot of a store value: arrays are shared (they are read-only), containers are copied."""
+    if isinstance(value, np.ndarray):
+        return value
+    if isinstance(value, Mapping):
+        return {k: _detach(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_detach(v) for v in value]
+    return value
+
+
+def _nbytes(value: Any) -> int:
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, Mapping):
+        return sum(_nbytes(v) for v in value.values())
+    if isinstance(value, list):
+        return sum(_nbytes(v) for v in value)
+    return 0
+
+
+def _file_digest(path: str) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _stage_key(stage: Stage, payload: Dict[str, Any], dep_keys: Sequence[str], loop_iter: int) -> str:
+    params = {k: payload[k] for k in stage.params if payload.get(k) is not None}
+    if stage.name == "load":
+        # the loaded entry records its path, so identical files at two paths must not share it
+        source = canonical_key(payload["path"])
+        params["file"] = [source, _file_digest(source)]
+    blob = json.dumps([stage.name, loop_iter, params, list(dep_keys)], sort_keys=True, default=str)
+    return hashlib.blake2b(blob.encode(), digest_size=16).hexdigest()
+
+
+def _guess_columns(path: str) -> Dict[str, Any]:
+    """2θ = first increasing numeric column, intensity = the next numeric one (what the ingester agent decides)."""
+    numeric = [c for c in inspect_xrd_file({"path": path})["columns"] if c["dtype"] == "numeric"]
+    if len(numeric) < 2:
+        raise ValueError(f"Need two numeric columns in {path}")
+    theta = next((c for c in numeric if c["example_values"] == sorted(c["example_values"])), numeric[0])
+    intensity = next(c for c in numeric if c is not theta)
+    return {"two_theta_col": theta["name"], "intensity_col": intensity["name"],
+            "unit_two_theta": "rad" if theta["max"] <= 2 * np.pi else "deg"}
+
+
+def run_pipeline(payload: Dict[str, Any], stages: Optional[Sequence[str]] = None,
+                 use_cache: bool = True) -> Dict[str, Any]:
+    """
+    Run the deterministic XRD stages directly as a DAG, no model calls:
+    load → estimate → preprocess → peaks → {scherrer_wh, reference} → report.
+
+    Each stage calls the same tool the agents use, on the same store and
+    loop layout. Its output is memoized under a content hash of the input
+    file (load), its own parameters and its upstream stages' keys, so
+    re-running with changed peak settings only recomputes peaks and what
+    depends on them; on a hit the stored values are put back into the store.
+    `stages` limits the run to those stages and their ancestors.
+    """
+    payload = dict(payload)
+    if not payload.get("two_theta_col") or not payload.get("intensity_col"):
+        payload = {**_guess_columns(payload["path"]), **payload}
+    payload.setdefault("unit_two_theta", "deg")
+    path = payload["path"]
+    loop_iter = int(payload.get("loop_iteration", 1))
+    ctx = _PipelineContext({"loop_iteration": loop_iter})
+
+    graph = {s.name: set(s.deps) for s in STAGES.values()}
+    wanted = set(graph)
+    if stages:
+        wanted, todo = set(), list(stages)
+        while todo:
+            name = todo.pop()
+            if name not in STAGES:
+                raise ValueError(f"Unknown stage '{name}'")
+            if name not in wanted:
+                wanted.add(name)
+                todo.extend(graph[name])
+
+    t0 = time.perf_counter()
+    keys: Dict[str, str] = {}
+    results: Dict[str, Dict[str, Any]] = {}
+    report: List[Dict[str, Any]] = []
+    failed: Optional[str] = None
+    for name in TopologicalSorter(graph).static_order():
+        if name not in wanted:
+            continue
+        stage = STAGES[name]
+        if failed is not None:
+            report.append({"stage": name, "status": "skipped", "message": f"Upstream stage {failed} failed."})
+            continue
+        t = time.perf_counter()
+        key = _stage_key(stage, payload, [keys[d] for d in stage.deps], loop_iter)
+        with _MEMO_LOCK:
+            hit = _MEMO.get(key) if use_cache and stage.memo else None
+            if hit is not None:
+                _MEMO.move_to_end(key)
+        if hit is not None and (path in XRD_DATA_STORE or stage.name == "load"):
+            if stage.name == "load":
+                XRD_DATA_STORE[path] = {k: _detach(v) for k, v in hit["values"].items()}
+            else:
+                entry = XRD_DATA_STORE[path]
+                target = entry if stage.base else entry.setdefault("loops", {}).setdefault(loop_iter, {})
+                for k, v in hit["values"].items():
+                    target[k] = _detach(v)
+            result, cached = hit["result"], True
+        else:
+            ctx.state["loop_iteration"] = loop_iter
+            result, cached = stage.run(dict(payload), ctx), False
+            if result.get("success") and stage.memo:
+                entry = XRD_DATA_STORE[path]
+                source = entry if stage.base else entry["loops"][loop_iter]
+                values = {k: _detach(source[k]) for k in stage.outputs if k in source}
+                _remember(key, {"result": result, "values": values, "nbytes": _nbytes(values)})
+        keys[name] = key
+        results[name] = result
+        report.append({"stage": name, "status": "cached" if cached else ("done" if result.get("success") else "failed"),
+                       "elapsed_s": round(time.perf_counter() - t, 4), "message": result.get("message")})
+        if not result.get("success"):
+            failed = name
+
+    loop_data = (XRD_DATA_STORE[path].get("loops") or {}).get(loop_iter, {}) if path in XRD_DATA_STORE else {}
+    return {
+        "success": failed is None,
+        "path": path,
+        "loop_iteration": loop_iter,
+        "stages": report,
+        "results": {k: loop_data.get(k) for k in ("peaks", "scherrer", "williamson_hall", "mp_comparison")
+                    if k in loop_data},
+        "params": {k: (loop_data.get("meta") or {}).get(k) for k in PARAM_NAMES},
+        "report": {k: v for k, v in results.get("report", {}).items() if k in ("json_path", "arrays_path", "figures", "deferred_figures")},
+        "elapsed_s": round(time.perf_counter() - t0, 4),
+        "message": (f"Pipeline complete in {time.perf_counter() - t0:.2f}s "
+                    f"({sum(r['status'] == 'cached' for r in report)}/{len(report)} stages from cache)."
+                    if failed is None else f"Pipeline stopped at stage {failed}: {results[failed].get('message')}"),
+    }
+
+
+def _remember(key: str, snapshot: Dict[str, Any]) -> None:
+    global _MEMO_BYTES
+    if snapshot["nbytes"] > _MEMO_MAX_BYTES:
+        return
+    with _MEMO_LOCK:
+        old = _MEMO.pop(key, None)
+        _MEMO_BYTES += snapshot["nbytes"] - (old["nbytes"] if old else 0)
+        _MEMO[key] = snapshot
+        while len(_MEMO) > _MEMO_SIZE or _MEMO_BYTES > _MEMO_MAX_BYTES:
+            _MEMO_BYTES -= _MEMO.popitem(last=False)[1]["nbytes"]
+
+
+def clear_pipeline_cache() -> None:
+    global _MEMO_BYTES
+    with _MEMO_LOCK:
+        _MEMO.clear()
+        _MEMO_BYTES = 0
+
+
+def run_xrd_pipeline(payload: Dict[str, Any], tool_context: ToolContext) -> Dict[str, Any]:
+    """
+    Run the whole numeric XRD analysis in one call, without the per-stage agents:
+    load, parameter estimate, preprocessing, peak fitting, Scherrer/WH,
+    reference check (when an mp_identifier is known) and report.
+    Expects payload to include 'path'. Optional: two_theta_col, intensity_col,
+    unit_two_theta (guessed from the file otherwise), sample_name,
+    mp_identifier, any of the eight pipeline parameters (override the
+    estimate), stages (run only these and what they depend on), plot (default=True).
+    Unchanged stages are served from cache.
+    """
+    try:
+        result = run_pipeline(payload, stages=payload.get("stages"))
+        tool_context.state["loop_iteration"] = result["loop_iteration"]
+        return result
+    except Exception as e:
+        return {"success": False, "path": payload.get("path"), "message": f"Failed: {str(e)}"}
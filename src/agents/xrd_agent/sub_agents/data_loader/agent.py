@@ -2,15 +2,18 @@ from google.adk.agents import Agent
 from google.adk.tools.agent_tool import AgentTool
 
 from src.schemas import schemas
+from src.agents.xrd_agent.checkpointing import checkpoint_stage, skip_completed_stage
+from src.agents.xrd_agent.pipeline import run_xrd_pipeline
 from src.agents.xrd_agent.sub_agents.data_loader import prompts
 from src.agents.xrd_agent.sub_agents.data_loader.tools import inspect_xrd_file, load_xrd_data
+from src.agents.async_tools import offload
 
 data_ingester_agent = Agent(
     model="gemini-2.5-flash",
     name="data_ingester_agent",
     description="This agent reads the 2θ and intensity columns and decides on the unit of the 2θ column",
     instruction=prompts.DATA_INGESTION_INSTR,
-    tools=[inspect_xrd_file],
+    tools=[offload(inspect_xrd_file, kind="io")],
     output_schema=schemas.DataInjesterOutput,
     output_key="data_ingestion_output",
 )
@@ -22,10 +25,13 @@ data_loader_agent = Agent(
     instruction=prompts.DATA_LOADER_INSTR,
     tools=[
         AgentTool(agent=data_ingester_agent),
-        load_xrd_data,
+        offload(load_xrd_data, kind="io"),
+        offload(run_xrd_pipeline),
         ],
     output_schema=schemas.DataLoaderOutput,
     output_key="data_loader_output",
+    before_agent_callback=skip_completed_stage,
+    after_agent_callback=checkpoint_stage,
 )
 
 # root_agent = data_loader_agent
\ No newline at end of file
@@ -34,6 +34,11 @@ Handling the sample name:
 - If not explicitly given, but the file name contains a recognizable label (e.g. "sample_xrd_2.csv"), use the main part of the file name without extension ("sample_xrd_2").
 - If no clue is found, leave `sample_name` as null.
 
+Quick analysis:
+- If the user asks for a quick or fully automatic analysis, call `run_xrd_pipeline` (same path, columns, unit and sample name) instead of `load_xrd_data`.
+  It loads the data and runs every numeric stage (parameter estimate, preprocessing, peaks, Scherrer/WH, reference check, report) in one call.
+  Report its success and the chosen columns as for a normal load.
+
 Notes:
 - If the ingester indicates 'rad', the tool will convert values to degrees before storing.
 - Always include the metadata from the ingester in the final output.
@@ -4,6 +4,8 @@ import numpy as np
 from google.adk.tools import ToolContext
 
 from src.data_store.data_store import XRD_DATA_STORE
+from src.run_paths import current_run_paths
+from src.agents.xrd_agent.sub_agents.reference_check.tools.prefetch import start_reference_prefetch
 
 def inspect_xrd_file(payload: Dict[str, Any]) -> Dict[str, Any]:
     """
@@ -28,14 +30,14 @@ def inspect_xrd_file(payload: Dict[str, Any]) -> Dict[str, Any]:
         "num_rows": int
       }
     """
-    print("Payload:", payload)
-    path = payload["path"].lower()
+    source = current_run_paths().resolve(payload["path"])
+    path = source.lower()
     if path.endswith(".xlsx") or path.endswith(".xls"):
-        df = pd.read_excel(payload["path"])
+        df = pd.read_excel(source)
     elif path.endswith(".csv"):
-        df = pd.read_csv(payload["path"])
+        df = pd.read_csv(source)
     else:
-        df = pd.read_csv(payload["path"], sep=None, engine="python")
+        df = pd.read_csv(source, sep=None, engine="python")
 
     cols_meta = []
     for col in df.columns:
@@ -72,15 +74,20 @@ def load_xrd_data(payload: Dict[str, Any], tool_context: ToolContext) -> Dict[st
     """
     Loads XRD data and stores it in a global store.
     Returns only metadata and success status.
+
+    If an mp_identifier, formula or formula-like sample_name is known, the
+    Materials Project reference data is prefetched in the background while
+    the numeric stages run.
     """
     try:
-        path = payload["path"].lower()
+        source = current_run_paths().resolve(payload["path"])
+        path = source.lower()
         if path.endswith(".xlsx") or path.endswith(".xls"):
-            df = pd.read_excel(payload["path"])
+            df = pd.read_excel(source)
         elif path.endswith(".csv"):
-            df = pd.read_csv(payload["path"])
+            df = pd.read_csv(source)
         else:
-            df = pd.read_csv(payload["path"], sep=None, engine="python")
+            df = pd.read_csv(source, sep=None, engine="python")
 
         current_loop = 1
         tool_context.state["loop_iteration"] = current_loop
@@ -108,6 +115,14 @@ def load_xrd_data(payload: Dict[str, Any], tool_context: ToolContext) -> Dict[st
                 "two_theta_max": two_theta_max,
             },
         }
+        meta = XRD_DATA_STORE[payload["path"]]["meta"]
+        for key in ("mp_identifier", "formula", "wavelength_angstrom"):
+            if payload.get(key):
+                meta[key] = payload[key]
+        meta["reference_prefetch"] = start_reference_prefetch(
+            payload.get("mp_identifier") or payload.get("formula") or payload.get("sample_name"),
+            float(payload.get("wavelength_angstrom", 1.5406)),
+        )
 
         return {
             "success": True,
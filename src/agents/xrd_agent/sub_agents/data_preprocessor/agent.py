@@ -2,17 +2,21 @@ from google.adk.agents import Agent
 from google.adk.tools.agent_tool import AgentTool
 
 from src.schemas import schemas
+from src.agents.xrd_agent.checkpointing import checkpoint_stage, skip_completed_stage
 from src.agents.xrd_agent.sub_agents.data_preprocessor import prompts
 from src.agents.xrd_agent.sub_agents.data_preprocessor.tools import preprocess_xrd_data
+from src.agents.async_tools import offload
 
 data_preprocessor_agent = Agent(
     model="gemini-2.5-flash",
     name="data_preprocessor_agent",
     description="This agent preprocesses the XRD data.",
     instruction=prompts.DATA_PREPROCESSOR_INSTR,
-    tools=[preprocess_xrd_data],
+    tools=[offload(preprocess_xrd_data)],
     output_schema=schemas.DataPreprocessorOutput,
     output_key="data_preprocessor_output",
+    before_agent_callback=skip_completed_stage,
+    after_agent_callback=checkpoint_stage,
 )
 
 
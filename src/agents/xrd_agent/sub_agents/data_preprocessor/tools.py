@@ -1,7 +1,7 @@
 import numpy as np
 from scipy.signal import savgol_filter
+from scipy.linalg import solveh_banded
 import scipy.sparse as sp
-import scipy.sparse.linalg as spla
 from google.adk.tools import ToolContext
 
 from src.data_store.data_store import XRD_DATA_STORE
@@ -10,15 +10,28 @@ def _als_baseline(y: np.ndarray, lam: float = 1e5, p: float = 0.01, niter: int =
     """Asymmetric Least Squares baseline correction."""
     L = len(y)
     D = sp.diags([1, -2, 1], [0, 1, 2], shape=(L-2, L))
+    DTD = (D.T @ D).tocsr()
+    # W + lam*D'D is symmetric positive definite and pentadiagonal: solve it in banded form
+    ab = np.zeros((3, L))
+    ab[0, 2:] = lam * DTD.diagonal(2)
+    ab[1, 1:] = lam * DTD.diagonal(1)
+    main = lam * DTD.diagonal(0)
     w = np.ones(L)
     for _ in range(niter):
-        W = sp.diags(w, 0)
-        Z = W + lam * (D.T @ D)
-        z = spla.spsolve(Z, w * y)
+        ab[2] = main + w
+        z = solveh_banded(ab, w * y, check_finite=False)
         w = p * (y > z) + (1 - p) * (y < z)
     return z
 
 
+def preprocess_pattern(I: np.ndarray, window: int = 31, polyorder: int = 3, lam: float = 1e5, p: float = 0.01):
+    """Savitzky-Golay smoothing + ALS baseline; returns (I_smooth, I_corr) with negatives clipped."""
+    I_smooth = savgol_filter(I, window, polyorder)
+    baseline = _als_baseline(I_smooth, lam=lam, p=p)
+    I_corr = np.clip(I_smooth - baseline, a_min=0, a_max=None)
+    return I_smooth, I_corr
+
+
 def preprocess_xrd_data(payload: dict, tool_context: ToolContext) -> dict:
     """
     Preprocesses stored XRD data: smoothing + baseline correction.
@@ -33,8 +46,7 @@ def preprocess_xrd_data(payload: dict, tool_context: ToolContext) -> dict:
         loop_iter = tool_context.state.get("loop_iteration", 1)
 
         stored = XRD_DATA_STORE[path]
-        theta = np.array(stored["two_theta_deg"])
-        I = np.array(stored["intensity"])
+        I = stored["intensity"]
         meta = stored["meta"]
 
         # Params (fall back to defaults if not provided)
@@ -44,9 +56,7 @@ def preprocess_xrd_data(payload: dict, tool_context: ToolContext) -> dict:
         lam = float(payload.get("baseline_lambda", meta.get("baseline_lambda", 1e5)))
         p = float(payload.get("baseline_p", meta.get("baseline_p", 0.01)))
 
-        I_smooth = savgol_filter(I, win, poly)
-        baseline = _als_baseline(I_smooth, lam=lam, p=p)
-        I_corr = np.clip(I_smooth - baseline, a_min=0, a_max=None)
+        I_smooth, I_corr = preprocess_pattern(I, win, poly, lam, p)
 
         # Update store
         if "loops" not in stored:
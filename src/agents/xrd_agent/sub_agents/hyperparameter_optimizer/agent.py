@@ -2,15 +2,26 @@ from google.adk.agents import Agent
 from google.adk.tools.agent_tool import AgentTool
 
 from src.schemas import schemas
+from src.agents.xrd_agent.checkpointing import checkpoint_stage, skip_completed_stage
 from src.agents.xrd_agent.sub_agents.hyperparameter_optimizer import prompts
-from src.agents.xrd_agent.sub_agents.hyperparameter_optimizer.tools import get_analysis_results
+from src.agents.xrd_agent.sub_agents.hyperparameter_optimizer.tools import (
+    estimate_parameters, get_analysis_results, optimize_hyperparameters, sweep_hyperparameters,
+)
+from src.agents.async_tools import offload
 
 hyperparameter_optimizer_agent = Agent(
     model="gemini-2.5-flash",
     name="hyperparameter_optimizer_agent",
     description="This agent optimizes the hyperparameters for the XRD analysis pipeline.",
     instruction=prompts.HYPERPARAMETER_OPTIMIZER_INSTR,
-    tools=[get_analysis_results],
+    tools=[
+        offload(estimate_parameters),
+        offload(optimize_hyperparameters),
+        offload(sweep_hyperparameters),
+        get_analysis_results,
+    ],
     output_schema=schemas.HyperparameterOptimizerOutput,
     output_key="hyperparameter_optimizer_output",
+    before_agent_callback=skip_completed_stage,
+    after_agent_callback=checkpoint_stage,
 )
\ No newline at end of file
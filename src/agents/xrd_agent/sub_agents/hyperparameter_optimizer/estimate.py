@@ -0,0 +1,102 @@
+from typing import Any, Dict, Tuple
+
+import numpy as np
+from scipy.ndimage import minimum_filter1d, uniform_filter1d
+from scipy.signal import savgol_coeffs, savgol_filter
+
+
+def _highpass_sigma(y: np.ndarray, lag: int = 1) -> float:
+    r = y[lag:-lag] - 0.5 * (y[:-2 * lag] + y[2 * lag:])
+    # var(r) = 1.5 sigma^2 for white noise
+    return float(1.4826 * np.median(np.abs(r - np.median(r))) / np.sqrt(1.5))
+
+
+def estimate_noise(y: np.ndarray) -> float:
+    """
+    Robust noise sigma: MAD of the second-difference high-pass residual
+    y[i] - (y[i-1] + y[i+1]) / 2, which removes baselines and slopes and is
+    barely affected by peaks wider than a few points.
+    """
+    y = np.asarray(y, dtype=float)
+    if len(y) < 3:
+        return 0.0
+    return _highpass_sigma(y)
+
+
+def _odd(n: float) -> int:
+    return int(round(n)) | 1
+
+
+def estimate_initial_parameters(theta: np.ndarray, y: np.ndarray) -> Tuple[Dict[str, Any], Dict[str, float]]:
+    """
+    Starting values for the eight pipeline parameters derived from the
+    pattern itself (vectorized, no fitting):
+
+      - step: median 2θ spacing,
+      - sigma: robust noise level (estimate_noise),
+      - FWHM: from the autocorrelation of the roughly background-subtracted
+        signal, whose half-maximum lag is FWHM / sqrt(2) for Gaussian peaks
+        (the white-noise spike at lag 0 is removed first).
+
+    Smoothing window ~ 1 FWHM, ALS lambda so the baseline cannot bend within
+    a few FWHM (how stiff is best depends on the background; see
+    `estimate_parameters`, which also tries stiffer/softer variants),
+    prominence at 6 sigma of the smoothed noise (the smoothed residual is
+    correlated, so lower cut-offs pick up noise bumps), relative height at
+    3 sigma, minimum distance ~ 0.7 FWHM and fit window ~ 6 FWHM.
+    Returns (params, diagnostics).
+    """
+    theta = np.asarray(theta, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    step = float(np.median(np.diff(theta))) if n > 1 else 0.02
+    sigma = max(estimate_noise(y), 1e-12)
+
+    # rough background: running minimum over ~2° then a running mean to soften it
+    bg_win = max(3, min(n, int(round(2.0 / max(step, 1e-6)))))
+    background = uniform_filter1d(minimum_filter1d(y, bg_win, mode="nearest"), bg_win, mode="nearest")
+    s = np.clip(y - background, 0.0, None)
+    s = s - s.mean()
+
+    nfft = 1 << int(np.ceil(np.log2(2 * n)))
+    spec = np.fft.rfft(s, nfft)
+    ac = np.fft.irfft(spec * np.conj(spec), nfft)[: max(2, n // 4)]
+    ac[0] -= n * sigma ** 2
+    fwhm_pts = 5.0
+    if ac[0] > 0:
+        below = np.flatnonzero(ac[1:] <= 0.5 * ac[0])
+        if len(below):
+            k = below[0] + 1
+            # linear interpolation of the half-maximum crossing
+            lag = k - 1 + (ac[k - 1] - 0.5 * ac[0]) / max(ac[k - 1] - ac[k], 1e-12)
+            fwhm_pts = float(np.sqrt(2.0) * lag)
+    fwhm_pts = float(np.clip(fwhm_pts, 2.0, n / 10 if n > 50 else 5.0))
+
+    window = int(np.clip(_odd(fwhm_pts), 5, max(5, min(201, _odd(n / 10)))))
+    polyorder = 3 if window > 5 else 2
+    # noise left after Savitzky-Golay smoothing: white-noise prediction, or the
+    # measured residual at a lag of one window when the noise is correlated
+    sigma_s = sigma * float(np.sqrt(np.sum(savgol_coeffs(window, polyorder) ** 2)))
+    if n > 2 * window + 2:
+        sigma_s = max(sigma_s, _highpass_sigma(savgol_filter(y, window, polyorder), window))
+    peak_max = float(s.max() + s.mean()) if n else 1.0
+
+    params = {
+        "smoothing_window": window,
+        "smoothing_polyorder": polyorder,
+        # ALS cut-off period ~ 2*pi*lam**(1/4): keep it well above the peak width
+        "baseline_lambda": float(np.clip((2.0 * fwhm_pts) ** 4, 1e2, 1e9)),
+        "baseline_p": 0.01,
+        "peak_min_prominence": float(6.0 * sigma_s),
+        "peak_min_distance_pts": int(max(1, round(0.7 * fwhm_pts))),
+        "peak_min_height_rel": float(np.clip(3.0 * sigma_s / max(peak_max, 1e-12), 0.005, 0.15)),
+        "fit_window_deg": float(np.clip(6.0 * fwhm_pts * step, 0.2, 3.0)),
+    }
+    diagnostics = {
+        "step_deg": step,
+        "noise_sigma": sigma,
+        "smoothed_noise_sigma": sigma_s,
+        "fwhm_deg": fwhm_pts * step,
+        "snr": peak_max / sigma,
+    }
+    return params, diagnostics
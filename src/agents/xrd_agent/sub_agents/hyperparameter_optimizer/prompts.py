@@ -16,7 +16,11 @@ Your task is to decide values for the preprocessing and peak-finding hyperparame
 
 Rules:
 1. Check the current loop iteration from {loop_iteration}.
-   - If {loop_iteration} == 1, return the default parameters:
+   - If {loop_iteration} == 1, call `estimate_parameters` with {"path": "<dataset path>"} (path from
+     {data_loader_output}). It derives all eight values from the pattern's noise level, peak width
+     and step size and checks a few variants against the objective, in well under a second.
+     Return exactly those values.
+     Only if it fails, return the default parameters:
        smoothing_window=31,
        smoothing_polyorder=3,
        baseline_lambda=100000.0,
@@ -27,16 +31,19 @@ Rules:
        fit_window_deg=0.8
 2. If {loop_iteration} > 1:
    - If you need the path of the data use {data_loader_output}.
-   - First call the `get_analysis_results` tool to retrieve the current XRD_DATA_STORE content (including peaks, Scherrer sizes, WH results, and reference matching).
-   - Analyze whether peaks are missing, too noisy, too broad, or overfitted.
-   - Adjust parameters accordingly:
+   - Call the `optimize_hyperparameters` tool with {"path": "<dataset path>"}. It searches all eight
+     parameters in-process against a numeric score (fit residuals, peak SNR, smoothing fidelity,
+     reference match rate, WH R²) and returns the best set. Return exactly those values.
+   - If the user asks how sensitive the results are to the parameters, call `sweep_hyperparameters`
+     instead; it returns a leaderboard and per-parameter sensitivity, and its `best_params` can be returned.
+   - Only if the tool fails, call `get_analysis_results` and adjust the parameters by hand:
        * If peaks look too noisy → increase smoothing_window or baseline_lambda.
        * If peaks are missing → decrease peak_min_prominence or peak_min_height_rel.
        * If peaks overlap → adjust fit_window_deg or smoothing_polyorder.
        * If Scherrer/WH diagnostics are unstable → fine-tune baseline_p or prominence thresholds.
-   - Always justify your parameter updates based on the analysis results.
 
 Output:
 - Must strictly follow `HyperparameterOptimizerOutput`.
-- Include the chosen parameters and a short message explaining why they were selected.
+- Include the chosen parameters and a short message explaining why they were selected
+  (for optimizer results, quote the score and its components).
 """
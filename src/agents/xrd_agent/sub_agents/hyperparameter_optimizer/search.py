@@ -0,0 +1,323 @@
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.agents.xrd_agent.sub_agents.data_preprocessor.tools import preprocess_pattern
+from src.agents.xrd_agent.sub_agents.hyperparameter_optimizer.estimate import estimate_noise
+from src.agents.xrd_agent.sub_agents.peak_finder.tools import _voigt, detect_peaks, fit_peak
+from src.agents.xrd_agent.sub_agents.scherrer_and_wh.tools import scherrer_wh
+
+PARAM_NAMES = (
+    "smoothing_window",
+    "smoothing_polyorder",
+    "baseline_lambda",
+    "baseline_p",
+    "peak_min_prominence",
+    "peak_min_distance_pts",
+    "peak_min_height_rel",
+    "fit_window_deg",
+)
+
+DEFAULT_PARAMS = {
+    "smoothing_window": 31,
+    "smoothing_polyorder": 3,
+    "baseline_lambda": 1e5,
+    "baseline_p": 0.01,
+    "peak_min_prominence": 0.1,
+    "peak_min_distance_pts": 25,
+    "peak_min_height_rel": 0.15,
+    "fit_window_deg": 0.8,
+}
+
+
+@dataclass
+class Dim:
+    name: str
+    low: float
+    high: float
+    log: bool = False
+    kind: str = "float"  # "float" | "int" | "odd"
+
+    def decode(self, u: float) -> Any:
+        lo, hi = (np.log(self.low), np.log(self.high)) if self.log else (self.low, self.high)
+        v = lo + float(np.clip(u, 0.0, 1.0)) * (hi - lo)
+        v = float(np.exp(v)) if self.log else v
+        if self.kind == "int":
+            return int(round(v))
+        if self.kind == "odd":
+            return int(round(v)) | 1
+        return float(v)
+
+    def encode(self, v: float) -> float:
+        lo, hi = (np.log(self.low), np.log(self.high)) if self.log else (self.low, self.high)
+        v = np.log(max(float(v), 1e-300)) if self.log else float(v)
+        return float(np.clip((v - lo) / (hi - lo), 0.0, 1.0)) if hi > lo else 0.5
+
+
+def search_space(theta: np.ndarray, sigma: float) -> List[Dim]:
+    """Bounds for the eight pipeline parameters, scaled to the scan's step size and noise level."""
+    n = len(theta)
+    step = float(np.median(np.diff(theta))) if n > 1 else 0.02
+    max_win = max(7, min(201, n // 10))
+    max_dist = max(2, int(round(0.5 / max(step, 1e-6))))
+    return [
+        Dim("smoothing_window", 5, max_win, log=True, kind="odd"),
+        Dim("smoothing_polyorder", 2, 5, kind="int"),
+        Dim("baseline_lambda", 1e2, 1e9, log=True),
+        Dim("baseline_p", 3e-4, 0.1, log=True),
+        Dim("peak_min_prominence", sigma, 50 * sigma, log=True),
+        Dim("peak_min_distance_pts", 1, max_dist, log=True, kind="int"),
+        Dim("peak_min_height_rel", 0.005, 0.3, log=True),
+        Dim("fit_window_deg", 0.2, 2.0, log=True),
+    ]
+
+
+class PipelineObjective:
+    """
+    Numeric score (0-1, higher is better) of one parameter set on one pattern,
+    running the real preprocessing, detection and Voigt fitting cores.
+
+    Components (weights in parentheses, renormalized over those available):
+      fit (0.3)       1 - relative residual of the summed Voigt model inside the fit windows,
+      coverage (0.25) share of the significant corrected signal explained by the model,
+      snr (0.15)      mean peak height on a log scale from 3σ (0) to 100σ (1),
+      fidelity (0.15) how close raw - smoothed stays to pure noise (over-smoothing distorts peaks),
+      match (0.2)     F1 of fitted centers vs reference lines, when reference lines are known,
+      wh (0.1)        Williamson-Hall R², when at least 4 peaks give sizes.
+    The total is scaled down when the baseline cuts into a large part of the pattern.
+    Preprocessing outputs, individual peak fits and whole evaluations (keyed
+    by the upstream stage outputs) are cached across trials.
+    """
+
+    WEIGHTS = {"fit": 0.3, "coverage": 0.25, "snr": 0.15, "fidelity": 0.15, "match": 0.2, "wh": 0.1}
+
+    def __init__(self, theta: np.ndarray, intensity: np.ndarray, wavelength_angstrom: float = 1.5406,
+                 instrument_fwhm_deg: Optional[float] = None, reference_two_theta: Optional[Sequence[float]] = None,
+                 match_tol_deg: float = 0.2, max_fit_peaks: int = 30, max_nfev: Optional[int] = 300):
+        self.theta = np.asarray(theta, dtype=float)
+        self.raw = np.asarray(intensity, dtype=float)
+        self.sigma = max(estimate_noise(self.raw), 1e-6 * max(float(np.ptp(self.raw)), 1.0))
+        self.wavelength = wavelength_angstrom
+        self.instrument_fwhm = instrument_fwhm_deg
+        refs = np.asarray(reference_two_theta if reference_two_theta is not None else [], dtype=float)
+        self.refs = refs[(refs >= self.theta.min()) & (refs <= self.theta.max())]
+        self.match_tol = match_tol_deg
+        self.max_fit_peaks = max_fit_peaks
+        # well-posed peaks converge in < 100 evaluations; fits of noise bumps can take thousands
+        self.max_nfev = max_nfev
+        self._pre_cache: Dict[Tuple, Tuple[np.ndarray, np.ndarray]] = {}
+        self._fit_cache: Dict[Tuple, Optional[Dict[str, Any]]] = {}
+        self._eval_cache: Dict[Tuple, Tuple[float, Dict[str, float]]] = {}
+
+    def _preprocess(self, key: Tuple) -> Tuple[np.ndarray, np.ndarray]:
+        if key not in self._pre_cache:
+            self._pre_cache[key] = preprocess_pattern(self.raw, *key)
+        return self._pre_cache[key]
+
+    def _fit(self, pre_key: Tuple, I: np.ndarray, idx: int, fit_win: float) -> Optional[Dict[str, Any]]:
+        key = (pre_key, idx, round(fit_win, 4))
+        if key not in self._fit_cache:
+            try:
+                self._fit_cache[key] = fit_peak(self.theta, I, idx, fit_win, max_nfev=self.max_nfev)
+            except Exception:
+                self._fit_cache[key] = None
+        return self._fit_cache[key]
+
+    def _detect(self, params: Dict[str, Any]):
+        win = max(5, int(params["smoothing_window"]) | 1)
+        poly = min(int(params["smoothing_polyorder"]), win - 2)
+        pre_key = (win, poly, float(params["baseline_lambda"]), float(params["baseline_p"]))
+        I_smooth, I_corr = self._preprocess(pre_key)
+        idx = detect_peaks(I_corr, float(params["peak_min_prominence"]), int(params["peak_min_distance_pts"]),
+                           float(params["peak_min_height_rel"]))
+        return pre_key, I_smooth, I_corr, idx
+
+    def _common(self, I_smooth: np.ndarray, I_corr: np.ndarray, idx: np.ndarray, centers: np.ndarray) -> Dict[str, float]:
+        """Components that need no peak fits: snr, fidelity and (on the given centers) match."""
+        comps: Dict[str, float] = {}
+        snr = I_corr[idx] / self.sigma
+        comps["snr"] = float(np.mean(np.clip(np.log(np.maximum(snr, 1e-12) / 3.0) / np.log(100.0 / 3.0), 0.0, 1.0)))
+        excess = np.sqrt(np.mean((self.raw - I_smooth) ** 2)) / self.sigma
+        comps["fidelity"] = float(np.exp(-max(0.0, excess - 1.0)))
+        if len(self.refs):
+            d = np.abs(centers[:, None] - self.refs[None, :]) <= self.match_tol
+            precision = d.any(axis=1).mean()
+            recall = d.any(axis=0).mean()
+            comps["match"] = float(2 * precision * recall / (precision + recall)) if precision + recall > 0 else 0.0
+        return comps
+
+    def _total(self, comps: Dict[str, float], I_corr: np.ndarray, n_peaks: int) -> Tuple[float, Dict[str, float]]:
+        weights = {k: self.WEIGHTS[k] for k in comps}
+        score = sum(weights[k] * comps[k] for k in comps) / sum(weights.values())
+        clipped = float(np.mean(I_corr <= 0))
+        baseline_ok = float(np.clip(1.0 - 2.0 * max(0.0, clipped - 0.1), 0.0, 1.0))
+        comps.update({"baseline_ok": baseline_ok, "n_peaks": n_peaks})
+        return float(score * baseline_ok), comps
+
+    def detection_score(self, params: Dict[str, Any]) -> Tuple[float, Dict[str, float]]:
+        """
+        Cheap proxy of the full score without any Voigt fit: coverage is the
+        share of significant signal within half a fit window of a detected
+        peak, and match uses the detected peak positions.
+        """
+        _, I_smooth, I_corr, idx = self._detect(params)
+        if len(idx) == 0:
+            return 0.0, {"n_peaks": 0}
+        centers = self.theta[idx]
+        comps = self._common(I_smooth, I_corr, idx, centers)
+        signal = I_corr > 3 * self.sigma
+        total = float(I_corr[signal].sum())
+        if total > 0:
+            pos = np.searchsorted(centers, self.theta[signal])
+            left = np.abs(self.theta[signal] - centers[np.clip(pos - 1, 0, len(centers) - 1)])
+            right = np.abs(self.theta[signal] - centers[np.clip(pos, 0, len(centers) - 1)])
+            near = np.minimum(left, right) <= float(params["fit_window_deg"]) / 2.0
+            comps["coverage"] = float(I_corr[signal][near].sum() / total)
+        else:
+            comps["coverage"] = 0.0
+        return self._total(comps, I_corr, len(idx))
+
+    def __call__(self, params: Dict[str, Any], fit_budget: Optional[int] = None) -> Tuple[float, Dict[str, float]]:
+        """Full score; with `fit_budget`, only the strongest `fit_budget` peaks are fitted."""
+        pre_key, I_smooth, I_corr, idx = self._detect(params)
+        if len(idx) == 0:
+            return 0.0, {"n_peaks": 0}
+        n_fit = self.max_fit_peaks if fit_budget is None else min(self.max_fit_peaks, int(fit_budget))
+        if len(idx) > n_fit:
+            idx = np.sort(idx[np.argsort(I_corr[idx])[::-1][:n_fit]])
+
+        fit_win = float(params["fit_window_deg"])
+        # configurations with identical upstream outputs share one evaluation
+        eval_key = (pre_key, idx.tobytes(), round(fit_win, 4))
+        if eval_key in self._eval_cache:
+            score, comps = self._eval_cache[eval_key]
+            return score, dict(comps)
+
+        peaks = [pk for pk in (self._fit(pre_key, I_corr, int(i), fit_win) for i in idx) if pk is not None]
+        if not peaks:
+            self._eval_cache[eval_key] = (0.0, {"n_peaks": 0})
+            return 0.0, {"n_peaks": 0}
+
+        model = np.zeros_like(I_corr)
+        mask = np.zeros(len(I_corr), dtype=bool)
+        for pk in peaks:
+            # Voigt with sigma = gamma reproduces the fitted FWHM closely enough for scoring
+            w = pk["fwhm_deg"] / 3.6013
+            model += _voigt(self.theta, pk["intensity"], pk["two_theta"], w, w, 0.0)
+            mask |= np.abs(self.theta - pk["two_theta"]) <= fit_win / 2.0
+
+        comps = self._common(I_smooth, I_corr, idx, np.array([pk["two_theta"] for pk in peaks]))
+        denom = np.linalg.norm(I_corr[mask])
+        comps["fit"] = float(np.clip(1.0 - np.linalg.norm((I_corr - model)[mask]) / denom, 0.0, 1.0)) if denom > 0 else 0.0
+        signal = I_corr > 3 * self.sigma
+        total = float(I_corr[signal].sum())
+        comps["coverage"] = float(np.clip(np.minimum(model, I_corr)[signal].sum() / total, 0.0, 1.0)) if total > 0 else 0.0
+
+        _, wh, wh_diag = scherrer_wh(peaks, self.wavelength, self.instrument_fwhm)
+        r2 = (wh or {}).get("r2", (wh_diag or {}).get("r2"))
+        if r2 is not None and np.isfinite(r2):
+            comps["wh"] = float(np.clip(r2, 0.0, 1.0))
+
+        result = self._total(comps, I_corr, len(peaks))
+        self._eval_cache[eval_key] = (result[0], dict(result[1]))
+        return result
+
+
+def tpe_search(
+    objective: Callable[[Dict[str, Any]], Tuple[float, Dict[str, float]]],
+    space: List[Dim],
+    n_trials: int = 80,
+    n_startup: int = 16,
+    patience: int = 30,
+    min_improvement: float = 1e-3,
+    time_budget_s: Optional[float] = None,
+    initial: Sequence[Dict[str, Any]] = (),
+    seed: int = 0,
+    gamma: float = 0.25,
+    n_candidates: int = 32,
+) -> Dict[str, Any]:
+    """
+    Maximize `objective` with a Tree-structured Parzen Estimator over `space`.
+
+    The first trials are the `initial` configurations followed by uniform
+    random draws; afterwards every trial samples candidates from a Parzen
+    density around the best `gamma` fraction and takes the one maximizing
+    l(x)/g(x). Stops after `n_trials`, after `patience` trials without an
+    improvement of `min_improvement`, or when `time_budget_s` runs out.
+    Fully deterministic for a given seed.
+    """
+    rng = np.random.default_rng(seed)
+    d = len(space)
+    U: List[np.ndarray] = []
+    scores: List[float] = []
+    trials: List[Dict[str, Any]] = []
+    seen: Dict[Tuple, float] = {}
+    best, best_i, since_best = -np.inf, -1, 0
+    t0 = time.perf_counter()
+    stopped = "n_trials"
+
+    queue = [np.array([dim.encode(cfg[dim.name]) for dim in space]) for cfg in initial]
+    for t in range(n_trials):
+        if queue:
+            u = queue.pop(0)
+        elif len(U) < n_startup:
+            u = rng.random(d)
+        else:
+            u = _tpe_propose(np.array(U), np.array(scores), rng, gamma, n_candidates)
+
+        params = {dim.name: dim.decode(x) for dim, x in zip(space, u)}
+        key = tuple(params[dim.name] for dim in space)
+        if key in seen:
+            score, comps = seen[key], {"cached": 1.0}
+        else:
+            score, comps = objective(params)
+            seen[key] = score
+        U.append(u)
+        scores.append(score)
+        trials.append({"params": params, "score": score, "components": comps})
+
+        if score > best + min_improvement:
+            best, best_i, since_best = score, t, 0
+        else:
+            since_best += 1
+            if score > best:
+                best, best_i = score, t
+        if len(U) >= n_startup and since_best >= patience:
+            stopped = "early_stopping"
+            break
+        if time_budget_s is not None and time.perf_counter() - t0 > time_budget_s:
+            stopped = "time_budget"
+            break
+
+    return {
+        "best": trials[best_i],
+        "trials": trials,
+        "n_trials": len(trials),
+        "stopped": stopped,
+        "elapsed_s": time.perf_counter() - t0,
+    }
+
+
+def _tpe_propose(U: np.ndarray, scores: np.ndarray, rng: np.random.Generator, gamma: float, n_candidates: int) -> np.ndarray:
+    n, d = U.shape
+    n_good = max(2, int(np.ceil(gamma * n)))
+    order = np.argsort(-scores, kind="stable")
+    good, bad = U[order[:n_good]], U[order[n_good:]]
+    bw_good = np.maximum(0.05, good.std(axis=0) * len(good) ** -0.2)
+    bw_bad = np.maximum(0.05, bad.std(axis=0) * max(len(bad), 1) ** -0.2) if len(bad) else np.full(d, 0.5)
+
+    centers = good[rng.integers(0, len(good), n_candidates)]
+    cand = np.clip(centers + rng.normal(0.0, 1.0, (n_candidates, d)) * bw_good, 0.0, 1.0)
+
+    def log_density(X, pts, bw):
+        if len(pts) == 0:
+            return np.zeros(len(X))
+        z = (X[:, None, :] - pts[None, :, :]) / bw
+        # per-dimension mixture with a uniform prior component, dimensions independent
+        dens = (np.exp(-0.5 * z ** 2) / (bw * np.sqrt(2 * np.pi))).sum(axis=1) + 1.0
+        return np.log(dens / (len(pts) + 1)).sum(axis=1)
+
+    ratio = log_density(cand, good, bw_good) - log_density(cand, bad, bw_bad)
+    return cand[int(np.argmax(ratio))]
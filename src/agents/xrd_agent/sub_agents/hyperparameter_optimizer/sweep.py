@@ -0,0 +1,164 @@
+import itertools
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.agents.xrd_agent.sub_agents.hyperparameter_optimizer.search import PARAM_NAMES, PipelineObjective
+from src.data_store.shared_arrays import SHARED_ARRAYS, SharedArray, attach
+
+# prominence is given in units of the estimated noise sigma
+DEFAULT_GRID: Dict[str, Sequence[Any]] = {
+    "smoothing_window": (11, 21, 31, 51),
+    "smoothing_polyorder": (2, 3),
+    "baseline_lambda": (1e4, 1e5, 1e6, 1e7),
+    "baseline_p": (0.001, 0.01, 0.05),
+    "peak_min_prominence": (2.0, 5.0, 10.0, 20.0),
+    "peak_min_distance_pts": (5, 15, 25),
+    "peak_min_height_rel": (0.02, 0.05, 0.15),
+    "fit_window_deg": (0.4, 0.8),
+}
+
+# worker-process objective, built once per worker by _init_worker
+_WORKER_OBJECTIVE: Optional[PipelineObjective] = None
+
+
+def _init_worker(theta: SharedArray, intensity: SharedArray, kwargs: Dict[str, Any]) -> None:
+    global _WORKER_OBJECTIVE
+    _WORKER_OBJECTIVE = PipelineObjective(attach(theta), attach(intensity), **kwargs)
+
+
+def _score_group(configs: List[Dict[str, Any]], fit_budget: Optional[int], full: bool,
+                 objective: Optional[PipelineObjective] = None) -> List[Tuple[float, Dict[str, float]]]:
+    obj = objective or _WORKER_OBJECTIVE
+    if not full:
+        return [obj.detection_score(c) for c in configs]
+    return [obj(c, fit_budget=fit_budget) for c in configs]
+
+
+def _pre_key(cfg: Dict[str, Any]) -> Tuple:
+    return tuple(cfg[k] for k in ("smoothing_window", "smoothing_polyorder", "baseline_lambda", "baseline_p"))
+
+
+def expand_grid(grid: Dict[str, Sequence[Any]], sigma: float, prominence_in_sigma: bool = True) -> List[Dict[str, Any]]:
+    """Cartesian product of the grid; prominence values are multiplied by `sigma` when given in noise units."""
+    values = {k: list(grid.get(k, DEFAULT_GRID[k])) for k in PARAM_NAMES}
+    if prominence_in_sigma:
+        values["peak_min_prominence"] = [float(v) * sigma for v in values["peak_min_prominence"]]
+    configs = []
+    for combo in itertools.product(*(values[k] for k in PARAM_NAMES)):
+        cfg = dict(zip(PARAM_NAMES, combo))
+        cfg["smoothing_window"] = max(5, int(cfg["smoothing_window"]) | 1)
+        cfg["smoothing_polyorder"] = min(int(cfg["smoothing_polyorder"]), cfg["smoothing_window"] - 2)
+        configs.append(cfg)
+    # clamping can create duplicates
+    unique = {tuple(c[k] for k in PARAM_NAMES): c for c in configs}
+    return list(unique.values())
+
+
+def successive_halving(
+    theta: np.ndarray,
+    intensity: np.ndarray,
+    configs: List[Dict[str, Any]],
+    objective_kwargs: Optional[Dict[str, Any]] = None,
+    eta: int = 3,
+    min_final: int = 4,
+    fit_budgets: Sequence[Optional[int]] = (5, None),
+    max_workers: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Successive halving over `configs` on one pattern.
+
+    Rung 0 scores every configuration with the fit-free detection proxy
+    (smoothing, baseline and detection only); each following rung keeps the
+    top 1/eta and runs the full objective with a growing Voigt-fit budget
+    (`fit_budgets`, None = all peaks, including reference matching and WH).
+    Work is grouped by preprocessing settings so each worker computes a
+    smoothing/baseline pass once and reuses it (and identical detections)
+    for every configuration in the group. max_workers=0/1 runs in-process.
+    """
+    objective_kwargs = dict(objective_kwargs or {})
+    t0 = time.perf_counter()
+    max_workers = min(os.cpu_count() or 1, 4) if max_workers is None else int(max_workers)
+    local = PipelineObjective(theta, intensity, **objective_kwargs) if max_workers <= 1 else None
+    pool = None
+    shared: List[SharedArray] = []
+    if local is None:
+        # workers map the pattern from shared memory instead of unpickling a copy each
+        shared = [SHARED_ARRAYS.publish(np.asarray(a, dtype=float)) for a in (theta, intensity)]
+        pool = ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                   initargs=(*shared, objective_kwargs))
+
+    records = [{"id": i, "params": c, "rung": 0, "score": None, "components": None} for i, c in enumerate(configs)]
+    rungs = []
+    try:
+        alive = records
+        plan = [(False, None)] + [(True, b) for b in fit_budgets]
+        for r, (full, budget) in enumerate(plan):
+            groups: Dict[Tuple, List[Dict[str, Any]]] = defaultdict(list)
+            for rec in alive:
+                groups[_pre_key(rec["params"])].append(rec)
+            batches = list(groups.values())
+            if pool is None:
+                results = [_score_group([rec["params"] for rec in b], budget, full, local) for b in batches]
+            else:
+                futures = [pool.submit(_score_group, [rec["params"] for rec in b], budget, full) for b in batches]
+                results = [f.result() for f in futures]
+            for batch, res in zip(batches, results):
+                for rec, (score, comps) in zip(batch, res):
+                    rec.update(rung=r, score=float(score), components=comps)
+                    if r == 0:
+                        rec["detection_score"] = float(score)
+            rungs.append({"rung": r, "stage": "detection" if not full else f"fit(budget={budget or 'all'})",
+                          "n_configs": len(alive), "n_preprocess_groups": len(batches),
+                          "elapsed_s": round(time.perf_counter() - t0, 3)})
+
+            if r == len(plan) - 1:
+                break
+            keep = max(min_final, int(np.ceil(len(alive) / eta)))
+            alive = sorted(alive, key=lambda rec: -rec["score"])[:keep]
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        for ref in shared:
+            SHARED_ARRAYS.release(ref)
+
+    ranked = sorted(records, key=lambda rec: (-rec["rung"], -rec["score"]))
+    return {
+        "ranked": ranked,
+        "rungs": rungs,
+        "sensitivity": parameter_sensitivity(records),
+        "elapsed_s": time.perf_counter() - t0,
+    }
+
+
+def parameter_sensitivity(records: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """For every parameter value: best and mean detection (rung 0) score across all other settings."""
+    out = {}
+    for name in PARAM_NAMES:
+        by_value: Dict[Any, List[float]] = defaultdict(list)
+        for rec in records:
+            by_value[rec["params"][name]].append(rec["detection_score"])
+        out[name] = [
+            {"value": v, "best": round(max(s), 4), "mean": round(float(np.mean(s)), 4)}
+            for v, s in sorted(by_value.items(), key=lambda kv: kv[0])
+        ]
+    return out
+
+
+def leaderboard_table(ranked: List[Dict[str, Any]], top_k: int = 10) -> str:
+    """Markdown leaderboard of the best configurations."""
+    short = {"smoothing_window": "win", "smoothing_polyorder": "poly", "baseline_lambda": "lam",
+             "baseline_p": "p", "peak_min_prominence": "prom", "peak_min_distance_pts": "dist",
+             "peak_min_height_rel": "h_rel", "fit_window_deg": "fit_win"}
+    header = ["#", "score", "rung", "peaks"] + [short[k] for k in PARAM_NAMES]
+    lines = ["| " + " | ".join(header) + " |", "|" + "---|" * len(header)]
+    for i, rec in enumerate(ranked[:top_k], 1):
+        p = rec["params"]
+        cells = [str(i), f"{rec['score']:.3f}", str(rec["rung"]), str(int((rec["components"] or {}).get("n_peaks", 0)))]
+        cells += [f"{p[k]:.3g}" if isinstance(p[k], float) else str(p[k]) for k in PARAM_NAMES]
+        lines.append("| " + " | ".join(cells) + " |")
+    return "\n".join(lines)
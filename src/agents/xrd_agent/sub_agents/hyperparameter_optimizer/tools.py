@@ -1,13 +1,24 @@
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 import os
+import numpy as np
+from google.adk.tools import ToolContext
 from src.data_store.data_store import XRD_DATA_STORE
+from src.run_paths import current_run_paths
+from src.agents.xrd_agent.sub_agents.hyperparameter_optimizer.estimate import estimate_initial_parameters
+from src.agents.xrd_agent.sub_agents.hyperparameter_optimizer.search import (
+    DEFAULT_PARAMS, PARAM_NAMES, PipelineObjective, search_space, tpe_search,
+)
+from src.agents.xrd_agent.sub_agents.hyperparameter_optimizer.sweep import (
+    DEFAULT_GRID, expand_grid, leaderboard_table, successive_halving,
+)
+from src.agents.xrd_agent.sub_agents.reference_check.tools.fetch_mp_xrd import fetch_mp_xrd_lines
 
 def get_analysis_results(payload: Dict[str, Any]) -> Dict[str, Any]:
     """
     Returns the current XRD_DATA_STORE content for analysis.
     Excludes raw diffraction arrays to keep the payload compact.
     """
-    path = os.path.abspath(payload.get("path", ""))
+    path = current_run_paths().resolve(payload.get("path", ""))
     store = XRD_DATA_STORE[path]["loops"]
     if not store:
         return {"success": False, "message": f"No XRD data found for {path}"}
@@ -26,3 +37,236 @@ def get_analysis_results(payload: Dict[str, Any]) -> Dict[str, Any]:
         "results": results,
         "message": "Retrieved XRD analysis results for hyperparameter optimization."
     }
+
+
+def _reference_lines(path: str, payload: Dict[str, Any], loops: Dict[int, Any], theta) -> Optional[List[float]]:
+    """Reference 2θ lines for the match score: payload first, else the latest stored MP comparison."""
+    if payload.get("reference_two_theta"):
+        return [float(t) for t in payload["reference_two_theta"]]
+    for loop_idx in sorted(loops, reverse=True):
+        comp = loops[loop_idx].get("mp_comparison") or {}
+        if comp.get("material_id"):
+            ref = fetch_mp_xrd_lines(
+                comp["material_id"],
+                wavelength_angstrom=comp.get("wavelength_angstrom") or 1.5406,
+                two_theta_min=float(min(theta)),
+                two_theta_max=float(max(theta)),
+                top_n=int(payload.get("mp_top_n", 20)),
+            )
+            if "_error" not in ref:
+                return [p["two_theta"] for p in ref["peaks"]]
+    return None
+
+
+def estimate_parameters(payload: Dict[str, Any], tool_context: ToolContext) -> Dict[str, Any]:
+    """
+    Estimate all eight preprocessing/peak parameters directly from the raw
+    pattern (noise level, peak width and step size). The estimate, two
+    baseline-stiffness variants of it and the defaults are scored once with the
+    optimizer's objective and the best is kept (well under a second, no search).
+    The chosen values become the stored defaults for preprocess_xrd_data /
+    find_and_fit_peaks, so the first loop already runs with data-adapted values.
+    """
+    try:
+        path = payload["path"]
+        path = path if path in XRD_DATA_STORE else current_run_paths().resolve(path)
+        if path not in XRD_DATA_STORE:
+            return {"success": False, "path": path, "message": "No data found in store for given path."}
+
+        stored = XRD_DATA_STORE[path]
+        meta = stored["meta"]
+        params, diag = estimate_initial_parameters(stored["two_theta_deg"], stored["intensity"])
+        objective = PipelineObjective(
+            stored["two_theta_deg"], stored["intensity"],
+            wavelength_angstrom=meta.get("wavelength_angstrom", 1.5406),
+            instrument_fwhm_deg=meta.get("instrument_fwhm_deg"),
+            reference_two_theta=payload.get("reference_two_theta"),
+        )
+        candidates = {"estimate": params}
+        for label, factor in (("softer_baseline", 1 / 16), ("stiffer_baseline", 5.0)):
+            candidates[label] = {**params, "baseline_lambda": float(np.clip(params["baseline_lambda"] * factor, 1e2, 1e9))}
+        candidates["defaults"] = dict(DEFAULT_PARAMS)
+        scores = {label: objective(c)[0] for label, c in candidates.items()}
+        chosen = max(scores, key=scores.get)
+        params = candidates[chosen]
+
+        meta.update(params)
+        diag = {k: float(f"{v:.4g}") for k, v in diag.items()}
+        return {
+            "success": True,
+            "path": path,
+            "loop_iteration": tool_context.state.get("loop_iteration", 1),
+            **params,
+            "chosen": chosen,
+            "scores": {k: round(float(v), 4) for k, v in scores.items()},
+            "diagnostics": diag,
+            "message": (
+                f"Estimated from the data: noise sigma {diag['noise_sigma']}, peak FWHM ~{diag['fwhm_deg']}°, "
+                f"step {diag['step_deg']}°, SNR ~{diag['snr']}; using the {chosen.replace('_', ' ')} "
+                f"(score {scores[chosen]:.3f})."
+            ),
+        }
+    except Exception as e:
+        return {"success": False, "path": payload.get("path"), "message": f"Failed: {str(e)}"}
+
+
+def optimize_hyperparameters(payload: Dict[str, Any], tool_context: ToolContext) -> Dict[str, Any]:
+    """
+    Search the eight preprocessing/peak parameters in-process (TPE) against a
+    numeric score of fit residuals, peak SNR, smoothing fidelity, reference
+    match rate and WH R² (see search.PipelineObjective). No pipeline pass or
+    model call is needed per trial.
+    Optional payload keys: n_trials (default=80), patience (default=30),
+    time_budget_s (default=60), seed (default=0), reference_two_theta (list of
+    reference line positions; by default taken from the last MP comparison).
+    The best parameters are returned in HyperparameterOptimizerOutput form and
+    become the stored defaults for the next preprocessing / peak-finding pass.
+    """
+    try:
+        path = payload["path"]
+        path = path if path in XRD_DATA_STORE else current_run_paths().resolve(path)
+        if path not in XRD_DATA_STORE:
+            return {"success": False, "path": path, "message": "No data found in store for given path."}
+
+        loop_iter = tool_context.state.get("loop_iteration", 1)
+        stored = XRD_DATA_STORE[path]
+        meta = stored["meta"]
+        loops = stored.get("loops", {})
+        theta = np.asarray(stored["two_theta_deg"], dtype=float)
+
+        refs = None
+        if payload.get("use_reference", True):
+            try:
+                refs = _reference_lines(path, payload, loops, theta)
+            except Exception:
+                refs = None
+
+        objective = PipelineObjective(
+            theta, stored["intensity"],
+            wavelength_angstrom=meta.get("wavelength_angstrom", 1.5406),
+            instrument_fwhm_deg=meta.get("instrument_fwhm_deg"),
+            reference_two_theta=refs,
+        )
+        space = search_space(theta, objective.sigma)
+
+        # start from the defaults, the data-driven estimate and what previous loops used
+        initial = [DEFAULT_PARAMS, estimate_initial_parameters(theta, stored["intensity"])[0]]
+        for loop_idx in sorted(loops):
+            loop_meta = loops[loop_idx].get("meta", {})
+            if all(k in loop_meta for k in PARAM_NAMES):
+                initial.append({k: loop_meta[k] for k in PARAM_NAMES})
+
+        result = tpe_search(
+            objective, space,
+            n_trials=int(payload.get("n_trials", 80)),
+            patience=int(payload.get("patience", 30)),
+            time_budget_s=float(payload.get("time_budget_s", 60)),
+            initial=initial,
+            seed=int(payload.get("seed", 0)),
+        )
+        best = result["best"]
+        params = dict(best["params"])
+        params["smoothing_polyorder"] = min(params["smoothing_polyorder"], params["smoothing_window"] - 2)
+
+        # make them the defaults picked up by preprocess_xrd_data / find_and_fit_peaks
+        meta.update(params)
+        meta["optimizer_score"] = best["score"]
+
+        components = {k: round(float(v), 4) for k, v in best["components"].items()}
+        return {
+            "success": True,
+            "path": path,
+            "loop_iteration": loop_iter,
+            **params,
+            "score": round(float(best["score"]), 4),
+            "components": components,
+            "n_trials": result["n_trials"],
+            "stopped": result["stopped"],
+            "message": (
+                f"TPE search over {result['n_trials']} trials ({result['stopped']}, "
+                f"{result['elapsed_s']:.1f}s): best score {best['score']:.3f} with {components.get('n_peaks', 0)} peaks "
+                f"(fit={components.get('fit')}, coverage={components.get('coverage')}, snr={components.get('snr')}, "
+                f"match={components.get('match', 'n/a')}, wh_r2={components.get('wh', 'n/a')})."
+            ),
+        }
+    except Exception as e:
+        return {"success": False, "path": payload.get("path"), "message": f"Failed: {str(e)}"}
+
+
+def sweep_hyperparameters(payload: Dict[str, Any], tool_context: ToolContext) -> Dict[str, Any]:
+    """
+    Successive-halving sweep over a parameter grid for one pattern: every
+    configuration is scored on smoothing/baseline/detection alone, and only the
+    best 1/eta per rung pay for Voigt fitting and reference matching.
+    Optional payload keys:
+      - grid: {param: [values]} overriding the default grid (peak_min_prominence
+        in units of the noise sigma unless prominence_in_sigma=false),
+      - eta (default=3), top_k (default=10), max_workers (default: up to 4 processes; 1 = in-process),
+      - reference_two_theta / use_reference as for `optimize_hyperparameters`.
+    Returns a leaderboard (also written as CSV to xrd_outputs/) and per-parameter sensitivity.
+    """
+    try:
+        path = payload["path"]
+        path = path if path in XRD_DATA_STORE else current_run_paths().resolve(path)
+        if path not in XRD_DATA_STORE:
+            return {"success": False, "path": path, "message": "No data found in store for given path."}
+
+        loop_iter = tool_context.state.get("loop_iteration", 1)
+        stored = XRD_DATA_STORE[path]
+        meta = stored["meta"]
+        theta = np.asarray(stored["two_theta_deg"], dtype=float)
+        intensity = np.asarray(stored["intensity"], dtype=float)
+
+        refs = None
+        if payload.get("use_reference", True):
+            try:
+                refs = _reference_lines(path, payload, stored.get("loops", {}), theta)
+            except Exception:
+                refs = None
+        objective_kwargs = {
+            "wavelength_angstrom": meta.get("wavelength_angstrom", 1.5406),
+            "instrument_fwhm_deg": meta.get("instrument_fwhm_deg"),
+            "reference_two_theta": refs,
+        }
+
+        configs = expand_grid(
+            {**DEFAULT_GRID, **(payload.get("grid") or {})},
+            PipelineObjective(theta, intensity).sigma,
+            prominence_in_sigma=bool(payload.get("prominence_in_sigma", True)),
+        )
+        result = successive_halving(
+            theta, intensity, configs, objective_kwargs,
+            eta=int(payload.get("eta", 3)),
+            max_workers=payload.get("max_workers"),
+        )
+        top_k = int(payload.get("top_k", 10))
+        ranked = result["ranked"]
+
+        outdir = current_run_paths().outputs
+        os.makedirs(outdir, exist_ok=True)
+        csv_path = os.path.join(outdir, f"{meta.get('sample_name', 'sample')}_sweep_{loop_iter}.csv")
+        with open(csv_path, "w") as f:
+            f.write(",".join(["rank", "score", "rung", "detection_score", *PARAM_NAMES]) + "\n")
+            for i, rec in enumerate(ranked, 1):
+                f.write(",".join(str(v) for v in [i, rec["score"], rec["rung"], rec["detection_score"],
+                                                  *(rec["params"][k] for k in PARAM_NAMES)]) + "\n")
+
+        best = ranked[0]
+        return {
+            "success": True,
+            "path": path,
+            "best_params": best["params"],
+            "best_score": round(best["score"], 4),
+            "leaderboard": [
+                {"rank": i, "score": round(rec["score"], 4), "rung": rec["rung"], **rec["params"]}
+                for i, rec in enumerate(ranked[:top_k], 1)
+            ],
+            "leaderboard_table": leaderboard_table(ranked, top_k),
+            "rungs": result["rungs"],
+            "sensitivity": result["sensitivity"],
+            "csv_path": csv_path,
+            "message": f"Swept {len(configs)} configurations in {result['elapsed_s']:.1f}s; "
+                       f"{result['rungs'][-1]['n_configs']} reached full fitting.",
+        }
+    except Exception as e:
+        return {"success": False, "path": payload.get("path"), "message": f"Failed: {str(e)}"}
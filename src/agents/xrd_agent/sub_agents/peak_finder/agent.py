@@ -2,17 +2,21 @@ from google.adk.agents import Agent
 from google.adk.tools.agent_tool import AgentTool
 
 from src.schemas import schemas
+from src.agents.xrd_agent.checkpointing import checkpoint_stage, skip_completed_stage
 from src.agents.xrd_agent.sub_agents.peak_finder import prompts
 from src.agents.xrd_agent.sub_agents.peak_finder.tools import find_and_fit_peaks
+from src.agents.async_tools import offload
 
 peak_finder_agent = Agent(
     model="gemini-2.5-flash",
     name="peak_finder_agent",
     description="This agent finds and fits peaks in the XRD data.",
     instruction=prompts.PEAK_FINDER_INSTR,
-    tools=[find_and_fit_peaks],
+    tools=[offload(find_and_fit_peaks)],
     output_schema=schemas.PeakFinderOutput,
     output_key="peak_finder_output",
+    before_agent_callback=skip_completed_stage,
+    after_agent_callback=checkpoint_stage,
 )
 
 
@@ -1,4 +1,5 @@
 import numpy as np
+from typing import Optional
 from scipy.signal import find_peaks
 import lmfit
 from lmfit.lineshapes import voigt
@@ -7,7 +8,74 @@ from google.adk.tools import ToolContext
 from src.data_store.data_store import XRD_DATA_STORE
 
 def _voigt(x, amp, center, sigma, gamma, offset):
-    return amp * voigt(x - center, sigma, gamma) + offset
+    """Voigt profile with peak height `amp` (sigma: Gaussian sigma, gamma: Lorentzian HWHM)."""
+    peak = voigt(center, 1.0, center, sigma, gamma)
+    return amp * voigt(x, 1.0, center, sigma, gamma) / peak + offset
+
+def detect_peaks(I: np.ndarray, prominence: float = 0.1, distance: int = 25, height_rel: float = 0.15) -> np.ndarray:
+    """Indices of candidate peaks in a corrected pattern."""
+    h = height_rel * (I.max() if np.ptp(I) > 0 else 1.0)
+    peaks, _ = find_peaks(I, height=h, distance=distance, prominence=prominence)
+    return peaks
+
+
+def fit_peak(theta: np.ndarray, I: np.ndarray, p: int, fit_win: float = 0.8, max_nfev: Optional[int] = None) -> dict:
+    """
+    Voigt fit of the peak at index `p` within a window of `fit_win` degrees.
+    `max_nfev` caps the optimizer's function evaluations (lmfit default if None).
+    """
+    theta_p = float(theta[p])
+    halfwin = fit_win / 2.0
+    mask = np.abs(theta - theta_p) <= halfwin
+    if not np.any(mask):
+        left = max(0, p - 10); right = min(len(theta) - 1, p + 10)
+        x = theta[left:right+1]; y = I[left:right+1]
+    else:
+        x = theta[mask]; y = I[mask]
+
+    model = lmfit.Model(_voigt)
+    center0 = float(x[np.argmax(y)])
+    height0 = float(y.max() - np.median(y))
+    params = model.make_params(
+        amp=max(height0, 1.0),
+        center=center0,
+        sigma=0.05,
+        gamma=0.05,
+        offset=float(np.percentile(y, 5.0))
+    )
+
+    # bounds
+    x_min, x_max = float(x.min()), float(x.max())
+    window_width = max(1e-3, x_max - x_min)
+    params["center"].min = max(x_min, center0 - 0.12)
+    params["center"].max = min(x_max, center0 + 0.12)
+    params["sigma"].min, params["sigma"].max = 0.01, min(window_width, 0.20)
+    params["gamma"].min, params["gamma"].max = 0.01, min(window_width, 0.20)
+    params["amp"].min, params["amp"].max = 0, max(1.0, float(y.max()) * 10.0)
+    params["offset"].min = 0
+
+    out = model.fit(y, params, x=x, max_nfev=max_nfev)
+
+    # calculate FWHM (Olivero–Longbothum)
+    sigma = out.best_values["sigma"]
+    gamma = out.best_values["gamma"]
+    fwhm_val = 0.5346 * (2*gamma) + np.sqrt(0.2166*(2*gamma)**2 + (2.3548*sigma)**2)
+
+    area = np.trapz(out.best_fit, x)
+
+    return {
+        "two_theta": float(out.best_values["center"]),
+        "intensity": float(out.best_values["amp"]),
+        "fwhm_deg": float(fwhm_val),
+        "area": float(area),
+        "model": "voigt"
+    }
+
+
+def fit_peaks(theta: np.ndarray, I: np.ndarray, peaks: np.ndarray, fit_win: float = 0.8) -> list:
+    """Voigt fits of all detected peaks."""
+    return [fit_peak(theta, I, int(p), fit_win) for p in peaks]
+
 
 def find_and_fit_peaks(payload: dict, tool_context: ToolContext) -> dict:
     """
@@ -35,8 +103,8 @@ def find_and_fit_peaks(payload: dict, tool_context: ToolContext) -> dict:
                 "message": f"No preprocessed data found for loop {loop_iter}."
             }
         
-        theta = np.array(stored["two_theta_deg"])
-        I = np.array(loop_data.get("intensity_corr"))
+        theta = stored["two_theta_deg"]
+        I = loop_data["intensity_corr"]
         meta = loop_data.get("meta", {})
 
         # Parameters (payload > meta > defaults)
@@ -45,58 +113,8 @@ def find_and_fit_peaks(payload: dict, tool_context: ToolContext) -> dict:
         h_rel = float(payload.get("peak_min_height_rel", meta.get("peak_min_height_rel", 0.15)))
         fit_win = float(payload.get("fit_window_deg", meta.get("fit_window_deg", 0.8)))
 
-        # height threshold
-        h = h_rel * (I.max() if np.ptp(I) > 0 else 1.0)
-        peaks, _ = find_peaks(I, height=h, distance=dist, prominence=prom)
-
-        results = []
-        for p in peaks:
-            theta_p = float(theta[p])
-            halfwin = fit_win / 2.0
-            mask = np.abs(theta - theta_p) <= halfwin
-            if not np.any(mask):
-                left = max(0, p - 10); right = min(len(theta) - 1, p + 10)
-                x = theta[left:right+1]; y = I[left:right+1]
-            else:
-                x = theta[mask]; y = I[mask]
-
-            model = lmfit.Model(_voigt)
-            center0 = float(x[np.argmax(y)])
-            height0 = float(y.max() - np.median(y))
-            params = model.make_params(
-                amp=max(height0, 1.0),
-                center=center0,
-                sigma=0.05,
-                gamma=0.05,
-                offset=float(np.percentile(y, 5.0))
-            )
-
-            # bounds
-            x_min, x_max = float(x.min()), float(x.max())
-            window_width = max(1e-3, x_max - x_min)
-            params["center"].min = max(x_min, center0 - 0.12)
-            params["center"].max = min(x_max, center0 + 0.12)
-            params["sigma"].min, params["sigma"].max = 0.01, min(window_width, 0.20)
-            params["gamma"].min, params["gamma"].max = 0.01, min(window_width, 0.20)
-            params["amp"].min, params["amp"].max = 0, max(1.0, float(y.max()) * 10.0)
-            params["offset"].min = 0
-
-            out = model.fit(y, params, x=x)
-
-            # calculate FWHM (Olivero–Longbothum)
-            sigma = out.best_values["sigma"]
-            gamma = out.best_values["gamma"]
-            fwhm_val = 0.5346 * (2*gamma) + np.sqrt(0.2166*(2*gamma)**2 + (2.3548*sigma)**2)
-
-            area = np.trapz(out.best_fit, x)
-
-            results.append({
-                "two_theta": float(out.best_values["center"]),
-                "intensity": float(out.best_values["amp"]),
-                "fwhm_deg": float(fwhm_val),
-                "area": float(area),
-                "model": "voigt"
-            })
+        peaks = detect_peaks(I, prom, dist, h_rel)
+        results = fit_peaks(theta, I, peaks, fit_win)
 
         # update store
         loop_data.update({
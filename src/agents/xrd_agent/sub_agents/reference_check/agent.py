@@ -2,9 +2,13 @@ from google.adk.agents import Agent
 from google.adk.tools.agent_tool import AgentTool
 
 from src.schemas import schemas
+from src.agents.xrd_agent.checkpointing import checkpoint_stage, skip_completed_stage
 from src.agents.xrd_agent.sub_agents.reference_check import prompts
 from src.agents.xrd_agent.sub_agents.reference_check.tools.mp_identifier import mp_identifier
 from src.agents.xrd_agent.sub_agents.reference_check.tools.compare_with_mp import compare_with_mp
+from src.agents.xrd_agent.sub_agents.reference_check.tools.multiphase_match import multiphase_match
+from src.agents.xrd_agent.sub_agents.reference_check.tools.cluster_patterns import cluster_patterns
+from src.agents.async_tools import offload
 
 
 mp_identifier_agent = Agent(
@@ -12,7 +16,7 @@ mp_identifier_agent = Agent(
     name="mp_identifier_agent",
     description="This agent identifies the materials project identifier from the XRD data based on the formula.",
     instruction=prompts.MP_IDENTIFIER_INSTR,
-    tools=[mp_identifier],
+    tools=[offload(mp_identifier, kind="io")],
     output_schema=schemas.MPIdentifierOutput,
     output_key="mp_identifier_output",
 )
@@ -24,10 +28,14 @@ reference_check_agent = Agent(
     instruction=prompts.REFERENCE_CHECK_INSTR,
     tools=[
         AgentTool(agent=mp_identifier_agent),
-        compare_with_mp,
+        offload(compare_with_mp, kind="io"),
+        offload(multiphase_match, kind="io"),
+        offload(cluster_patterns),
         ],
     output_schema=schemas.ReferenceCheckOutput,
     output_key="reference_check_output",
+    before_agent_callback=skip_completed_stage,
+    after_agent_callback=checkpoint_stage,
 )
 
 
@@ -15,6 +15,19 @@ Steps:
    - Select the material whose pattern best matches the experimental data.
 3. Return the chosen `mp_identifier`, along with the candidate list and match confidence.
 
+Scoring:
+- By default candidates are scored by stick matching of peak positions.
+- If the pattern may carry a zero shift or sample displacement, or stick matching gives
+  low/ambiguous confidences, call `mp_identifier` with `confidence_metric="profile"`
+  to score by full-profile cross-correlation; it also returns each candidate's zero shift.
+
+Candidate prefiltering:
+- If the user restricts the chemistry (e.g. "only Mn and O", "no Li", "tetragonal phases"),
+  pass `allowed_elements`, `required_elements`, `forbidden_elements`, `crystal_systems`
+  or `space_groups` to `mp_identifier`; candidates are pruned before any simulation.
+- To search a whole chemical system rather than one formula, pass `chemsys` (e.g. "Mn-O")
+  together with element constraints to keep the candidate set small.
+
 Notes:
 - If no formula or mp_identifier is provided, return nothing with success=false.
 - Always include confidence (0-1) if multiple candidates were evaluated.
@@ -33,10 +46,27 @@ Steps:
    - Use the dataset's stored `two_theta_min` and `two_theta_max` for the range.
    - Choose how many reference peaks to fetch (`mp_top_n`), default 20.
    - Choose a minimum relative intensity threshold (`mp_min_intensity`), default 1.0.
-3. Return a structured JSON report including:
+3. If many experimental peaks stay unmatched, or the sample is known to be a mixture,
+   call the `multiphase_match` tool:
+   - Pass the candidate mp-ids to consider (`candidates`); by default it uses the candidates
+     evaluated by `mp_identifier`.
+   - Optionally set `max_phases` (default 3).
+   - It fits non-negative phase fractions over the full corrected profile and returns a
+     ranked phase combination with residuals. Do not tune peak thresholds to hide
+     peaks that belong to a second phase.
+4. Return a structured JSON report including:
    - The chosen mp_identifier and formula,
    - Experimental vs reference peak matches,
-   - Match statistics (matched_count vs total_ref_peaks).
+   - Match statistics (matched_count vs total_ref_peaks),
+   - The phase combination (`phases`) if `multiphase_match` was run.
+
+Libraries of patterns:
+- When many datasets are loaded (e.g. a composition-spread library), call `cluster_patterns`
+  before any identification. It groups the stored patterns by profile similarity and returns
+  one representative per cluster. Run the identifier and comparison only for representatives
+  and report the other members of a cluster as sharing the representative's phase.
+  It only sees the datasets of the current run; pass {"namespaces": "all"} to group the
+  datasets of every live run.
 
 Notes:
 - If no mp_identifier can be determined, return success=false with an explanation.
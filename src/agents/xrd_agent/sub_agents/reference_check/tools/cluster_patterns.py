@@ -0,0 +1,168 @@
+import numpy as np
+from typing import Any, Dict, List, Optional
+from google.adk.tools import ToolContext
+
+from src.data_store.data_store import XRD_DATA_STORE
+from src.run_paths import current_run_paths
+from src.data_store.pattern_index import DEFAULT_GRID, fingerprint_grid, pattern_fingerprint
+
+
+def blocked_similarity(X: np.ndarray, max_shift_bins: int = 0, block_size: int = 512) -> np.ndarray:
+    """
+    Pairwise similarity of unit-norm fingerprints X (N x L), computed in
+    block_size x block_size tiles so the working set stays bounded.
+
+    With max_shift_bins > 0 the score is the maximum dot product over relative
+    shifts of up to ±max_shift_bins grid points (a cross-correlation restricted
+    to small lags), which tolerates zero-shift / displacement errors.
+    """
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    n, L = X.shape
+    S = np.empty((n, n), dtype=np.float32)
+    for i0 in range(0, n, block_size):
+        A = X[i0:i0 + block_size]
+        for j0 in range(i0, n, block_size):
+            B = X[j0:j0 + block_size]
+            tile = A @ B.T
+            for s in range(1, max_shift_bins + 1):
+                np.maximum(tile, A[:, s:] @ B[:, :L - s].T, out=tile)
+                np.maximum(tile, A[:, :L - s] @ B[:, s:].T, out=tile)
+            S[i0:i0 + len(A), j0:j0 + len(B)] = tile
+            S[j0:j0 + len(B), i0:i0 + len(A)] = tile.T
+    np.clip(S, -1.0, 1.0, out=S)
+    return S
+
+
+def cluster_from_similarity(
+    S: np.ndarray,
+    X: Optional[np.ndarray] = None,
+    method: str = "hierarchical",
+    n_clusters: Optional[int] = None,
+    threshold: float = 0.8,
+    seed: int = 0,
+) -> np.ndarray:
+    """
+    Cluster labels (0..k-1). "hierarchical" uses average linkage on 1 - S and
+    cuts at n_clusters, or else where similarity drops below `threshold`.
+    "kmeans" runs k-means on the fingerprints X (n_clusters required).
+    """
+    n = len(S)
+    if n == 1:
+        return np.zeros(1, dtype=int)
+    if method == "hierarchical":
+        from scipy.cluster.hierarchy import fcluster, linkage
+        from scipy.spatial.distance import squareform
+
+        D = 1.0 - S.astype(np.float64)
+        np.fill_diagonal(D, 0.0)
+        Z = linkage(squareform(np.clip(D, 0.0, None), checks=False), method="average")
+        if n_clusters:
+            labels = fcluster(Z, t=int(n_clusters), criterion="maxclust")
+        else:
+            labels = fcluster(Z, t=1.0 - float(threshold), criterion="distance")
+        return labels - 1
+    if method == "kmeans":
+        from scipy.cluster.vq import kmeans2
+
+        if not n_clusters or X is None:
+            raise ValueError("kmeans clustering needs n_clusters.")
+        _, labels = kmeans2(np.asarray(X, dtype=np.float64), int(n_clusters), minit="++", seed=seed)
+        # relabel densely in case a centroid ended up empty
+        return np.unique(labels, return_inverse=True)[1]
+    raise ValueError(f"Unknown clustering method '{method}'.")
+
+
+def cluster_representatives(S: np.ndarray, labels: np.ndarray) -> List[Dict[str, Any]]:
+    """Per cluster: medoid (member with the highest mean similarity to the others), members, cohesion."""
+    clusters = []
+    for c in np.unique(labels):
+        members = np.flatnonzero(labels == c)
+        sub = S[np.ix_(members, members)]
+        mean_sim = sub.mean(axis=1)
+        clusters.append({
+            "cluster": int(c),
+            "representative": int(members[int(np.argmax(mean_sim))]),
+            "members": members.tolist(),
+            "mean_similarity": float(sub.mean()),
+        })
+    clusters.sort(key=lambda c: -len(c["members"]))
+    return clusters
+
+
+def _stored_pattern(path: str, loop_iter: Optional[int], namespace: Optional[str] = None):
+    base_store = XRD_DATA_STORE[path] if namespace is None else XRD_DATA_STORE.get_namespace(namespace)[path]
+    loops = base_store.get("loops", {})
+    if loop_iter not in loops:
+        loop_iter = max(loops) if loops else None
+    store = loops.get(loop_iter, {}) if loop_iter is not None else {}
+    y = store.get("intensity_corr", store.get("intensity_smooth", base_store["intensity"]))
+    return np.asarray(base_store["two_theta_deg"]), np.asarray(y)
+
+
+def cluster_patterns(payload: Dict[str, Any], tool_context: ToolContext) -> Dict[str, Any]:
+    """
+    Group stored patterns by similarity so that only cluster representatives
+    need a full reference check.
+    Optional payload keys:
+      - paths: datasets of the current run to cluster (default: all of them;
+        the store is namespaced per run, so other runs are not listed),
+      - namespaces: instead of paths, cluster every dataset of these runs
+        ("all" for every live run); members are then reported as "<run>::<path>",
+      - similarity: "xcorr" (default, shift tolerant) or "cosine",
+      - max_shift_deg (default=0.2) for "xcorr",
+      - method: "hierarchical" (default) or "kmeans",
+      - n_clusters (required for kmeans), threshold (default=0.8, hierarchical cut),
+      - two_theta_min / two_theta_max / grid_step_deg: fingerprint grid (default 5-90°, 0.05°),
+      - block_size (default=512): tile size of the similarity computation.
+    """
+    try:
+        namespaces = payload.get("namespaces")
+        if namespaces and not payload.get("paths"):
+            listing = XRD_DATA_STORE.namespace_keys(None if namespaces == "all" else namespaces)
+            entries = [(ns, k, f"{ns}::{k}") for ns, ks in listing.items() for k in ks]
+        else:
+            paths = payload.get("paths") or list(XRD_DATA_STORE.keys())
+            entries = [(None, k, k) for k in
+                       (p if p in XRD_DATA_STORE else current_run_paths().resolve(p) for p in paths)]
+        if not entries:
+            return {"success": False, "clusters": [], "message": "No stored patterns to cluster."}
+        loop_iter = tool_context.state.get("loop_iteration", 1)
+
+        step = float(payload.get("grid_step_deg", DEFAULT_GRID[2]))
+        grid = fingerprint_grid(
+            float(payload.get("two_theta_min", DEFAULT_GRID[0])),
+            float(payload.get("two_theta_max", DEFAULT_GRID[1])),
+            step,
+        )
+        keys, X = [], np.empty((len(entries), len(grid)), dtype=np.float32)
+        for i, (ns, key, label) in enumerate(entries):
+            X[i] = pattern_fingerprint(*_stored_pattern(key, loop_iter, ns), grid)
+            keys.append(label)
+
+        similarity = str(payload.get("similarity", "xcorr")).lower()
+        if similarity not in ("xcorr", "cosine"):
+            return {"success": False, "clusters": [], "message": f"Unknown similarity '{similarity}'."}
+        shift_bins = int(round(float(payload.get("max_shift_deg", 0.2)) / step)) if similarity == "xcorr" else 0
+
+        S = blocked_similarity(X, max_shift_bins=shift_bins, block_size=int(payload.get("block_size", 512)))
+        labels = cluster_from_similarity(
+            S, X,
+            method=str(payload.get("method", "hierarchical")).lower(),
+            n_clusters=payload.get("n_clusters"),
+            threshold=float(payload.get("threshold", 0.8)),
+        )
+        clusters = cluster_representatives(S, labels)
+        for c in clusters:
+            c["representative"] = keys[c["representative"]]
+            c["members"] = [keys[m] for m in c["members"]]
+            c["size"] = len(c["members"])
+
+        return {
+            "success": True,
+            "n_patterns": len(keys),
+            "n_clusters": len(clusters),
+            "clusters": clusters,
+            "message": f"Grouped {len(keys)} patterns into {len(clusters)} clusters."
+        }
+    except Exception as e:
+        return {"success": False, "clusters": [], "message": f"Failed: {str(e)}"}
@@ -5,6 +5,7 @@ from google.adk.tools import ToolContext
 
 from src.data_store.data_store import XRD_DATA_STORE
 from src.agents.xrd_agent.sub_agents.reference_check.tools.fetch_mp_xrd import fetch_mp_xrd_lines
+from src.agents.xrd_agent.sub_agents.reference_check.tools.prefetch import await_reference_prefetch
 
 
 def _two_theta_to_d_angstrom(two_theta_deg: float, wavelength_angstrom: float) -> float:
@@ -47,6 +48,7 @@ def compare_with_mp(payload: Dict[str, Any], tool_context: ToolContext) -> Dict[
         mp_min_intensity = float(payload.get("mp_min_intensity", meta.get("mp_min_intensity", 1.0)))
         lam = float(meta.get("wavelength_angstrom", 1.5406))
 
+        await_reference_prefetch(meta.get("reference_prefetch"))
         ref = fetch_mp_xrd_lines(
             identifier=mp_identifier,
             wavelength_angstrom=lam,
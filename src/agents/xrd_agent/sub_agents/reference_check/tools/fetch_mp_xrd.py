@@ -1,10 +1,105 @@
 import os
-from typing import Any, Dict, List, Optional
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
 
 import dotenv
 
+from src.agents.xrd_agent.sub_agents.reference_check.tools.providers import (
+    MPProvider,
+    ReferenceProvider,
+    get_reference_provider,
+)
+from src.agents.xrd_agent.sub_agents.reference_check.tools.simulate_pattern import simulate_pattern
+
 dotenv.load_dotenv()
 
+# Structures and candidate searches already fetched in this process, keyed by
+# the provider's data source (ReferenceProvider.cache_key) and kept in LRU
+# order up to these sizes. Filled on demand and by the load-time prefetch
+# (see prefetch.py).
+MAX_CACHED_STRUCTURES = 1024
+MAX_CACHED_SEARCHES = 256
+_STRUCTURE_CACHE: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()
+_SEARCH_CACHE: "OrderedDict[Tuple[str, str, str], List[Any]]" = OrderedDict()
+_CACHE_LOCK = threading.Lock()
+
+
+def _cache_get(cache: OrderedDict, key: Tuple) -> Any:
+    with _CACHE_LOCK:
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+        return value
+
+
+def _cache_put(cache: OrderedDict, key: Tuple, value: Any, limit: int) -> None:
+    # caller holds _CACHE_LOCK
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > limit:
+        cache.popitem(last=False)
+
+
+def _provider(api_key: Optional[str] = None) -> ReferenceProvider:
+    return MPProvider(api_key) if api_key else get_reference_provider()
+
+
+def fetch_mp_structure(identifier: str, api_key: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Fetch a structure by material_id or formula (lowest energy above hull)
+    from the configured reference provider (live MP by default, see
+    providers.py). Results are cached per identifier.
+
+    Returns {"structure", "material_id", "formula"} or {"_error": str}.
+    """
+    provider = _provider(api_key)
+    source = provider.cache_key
+    cached = _cache_get(_STRUCTURE_CACHE, (source, identifier))
+    if cached is not None:
+        return cached
+
+    result = provider.get_structure(identifier)
+    if "_error" in result:
+        return result
+
+    with _CACHE_LOCK:
+        _cache_put(_STRUCTURE_CACHE, (source, identifier), result, MAX_CACHED_STRUCTURES)
+        if result.get("material_id"):
+            _cache_put(_STRUCTURE_CACHE, (source, str(result["material_id"])), result, MAX_CACHED_STRUCTURES)
+    return result
+
+
+def search_mp_candidates(
+    formula: Optional[str] = None,
+    chemsys: Optional[str] = None,
+    api_key: Optional[str] = None,
+) -> List[Any]:
+    """
+    All reference entries for a formula or chemical system, with structure,
+    elements and symmetry. Cached per query; every returned structure is
+    also put into the structure cache. Raises on provider errors.
+    """
+    provider = _provider(api_key)
+    source = provider.cache_key
+    key = (source, "chemsys", chemsys) if chemsys else (source, "formula", formula)
+    cached = _cache_get(_SEARCH_CACHE, key)
+    if cached is not None:
+        return cached
+
+    results = provider.search(formula=formula, chemsys=chemsys)
+
+    with _CACHE_LOCK:
+        _cache_put(_SEARCH_CACHE, key, results, MAX_CACHED_SEARCHES)
+        for r in results:
+            if r.structure is not None:
+                _cache_put(_STRUCTURE_CACHE, (source, r.material_id), {
+                    "structure": r.structure,
+                    "material_id": r.material_id,
+                    "formula": r.formula_pretty,
+                }, MAX_CACHED_STRUCTURES)
+    return results
+
 
 def fetch_mp_xrd_lines(
     identifier: str,
@@ -16,119 +111,33 @@ def fetch_mp_xrd_lines(
     min_intensity: float = 1.0,               # relative intensity threshold (0-100)
 ) -> Dict[str, Any]:
     """
-    Fetch a structure from Materials Project (by material_id or formula),
-    simulate its powder XRD pattern with pymatgen, and return top-N peaks.
+    Fetch a structure from the reference provider (by material_id or formula),
+    simulate its powder XRD pattern (cached reflection table, see
+    simulate_pattern.py), and return top-N peaks.
 
     Returns a dict with keys: material_id, formula, wavelength_angstrom,
     two_theta_range, and peaks (list of dicts with two_theta, d_angstrom,
     intensity (relative %), hkls).
     """
-    api_key = api_key or os.getenv("MP_API_KEY")
-    if not api_key:
-        return {"_error": "Missing Materials Project API key. Set MP_API_KEY or pass api_key=."}
-
-    # --- 1) Get a pymatgen Structure from MP ---
-    structure = None
-    material_id: Optional[str] = None
-    formula_pretty: Optional[str] = None
-
-    # Prefer mp-api if present (new API)
-    try:
-        from mp_api.client import MPRester as MPClient  # type: ignore
-        with MPClient(api_key) as mpr:
-            if identifier.lower().startswith(("mp-", "mvc-", "mat-")):
-                material_id = identifier
-                try:
-                    s = mpr.get_structure_by_material_id(material_id)
-                except Exception as e:
-                    return {"_error": f"Failed to fetch structure for {material_id}: {e}"}
-                structure = s
-                try:
-                    sm = mpr.summary.get_data_by_id(material_id)
-                    if sm:
-                        formula_pretty = getattr(sm[0], "formula_pretty", None)
-                except Exception:
-                    pass
-            else:
-                results = mpr.summary.search(
-                    formula=identifier,
-                    fields=["material_id", "formula_pretty", "energy_above_hull", "structure"],
-                )
-                if not results:
-                    return {"_error": f"No MP entries found for formula '{identifier}'."}
-                results.sort(key=lambda r: (getattr(r, "energy_above_hull", float("inf")) or float("inf")))
-                best = results[0]
-                structure = best.structure
-                material_id = best.material_id
-                formula_pretty = best.formula_pretty
-    except Exception:
-        # Fallback to legacy pymatgen client
-        try:
-            from pymatgen.ext.matproj import MPRester  # type: ignore
-        except Exception as e:
-            return {"_error": f"Cannot import Materials Project client: {e}"}
-
-        with MPRester(api_key) as mpr:
-            if identifier.lower().startswith("mp-"):
-                material_id = identifier
-                try:
-                    structure = mpr.get_structure_by_material_id(material_id)
-                except Exception as e:
-                    return {"_error": f"Failed to fetch structure for {material_id}: {e}"}
-                try:
-                    doc = mpr.query(material_id=[material_id], properties=["pretty_formula"])
-                    if doc:
-                        formula_pretty = doc[0].get("pretty_formula")
-                except Exception:
-                    pass
-            else:
-                structs = mpr.get_structures(identifier)
-                if not structs:
-                    return {"_error": f"No structures found for formula '{identifier}'."}
-                structure = structs[0]
-                try:
-                    q = mpr.query(criteria={"formula_pretty": identifier}, properties=["material_id"])
-                    material_id = q[0]["material_id"] if q else None
-                    formula_pretty = identifier
-                except Exception:
-                    formula_pretty = identifier
-
-    if structure is None:
-        return {"_error": f"Could not obtain a structure for identifier '{identifier}'."}
-
-    # --- 2) Simulate XRD pattern with pymatgen ---
-    try:
-        from pymatgen.analysis.diffraction.xrd import XRDCalculator  # type: ignore
-    except Exception as e:
-        return {"_error": f"pymatgen not available or XRDCalculator import failed: {e}"}
+    ref = fetch_mp_structure(identifier, api_key=api_key)
+    if "_error" in ref:
+        return ref
+    structure = ref["structure"]
+    material_id = ref["material_id"]
+    formula_pretty = ref["formula"]
 
+    # Simulate XRD pattern from the cached reflection table
     try:
-        calc = XRDCalculator(wavelength=wavelength_angstrom)
-        patt = calc.get_pattern(structure, two_theta_range=(two_theta_min, two_theta_max))
+        patt = simulate_pattern(structure, wavelength_angstrom, two_theta_min, two_theta_max)
         rows: List[Dict[str, Any]] = []
-        for tth, inten, hkls in zip(patt.x, patt.y, patt.hkls):
+        for tth, d, inten, hkls in zip(patt["two_theta"], patt["d_angstrom"], patt["intensity"], patt["hkls"]):
             if inten < min_intensity:
                 continue
-            # Compute d-spacing from 2θ (degrees) using Bragg's law (n=1)
-            theta_rad = (tth / 2.0) * 3.141592653589793 / 180.0
-            s = __import__("math").sin(theta_rad)
-            d = float("nan") if s <= 0 else float(wavelength_angstrom / (2.0 * s))
-            hkls_fmt: List[Dict[str, Any]] = []
-            try:
-                for item in hkls:
-                    if isinstance(item, dict) and "hkl" in item:
-                        h, k, l = item["hkl"]
-                        hkls_fmt.append({"hkl": [int(h), int(k), int(l)], "multiplicity": int(item.get("multiplicity", 1))})
-                    else:
-                        h, k, l = item
-                        hkls_fmt.append({"hkl": [int(h), int(k), int(l)], "multiplicity": None})
-            except Exception:
-                hkls_fmt = []
             rows.append({
                 "two_theta": float(tth),
                 "d_angstrom": float(d),
                 "intensity": float(inten),
-                "hkls": hkls_fmt,
+                "hkls": hkls,
             })
 
         rows.sort(key=lambda r: r["intensity"], reverse=True)
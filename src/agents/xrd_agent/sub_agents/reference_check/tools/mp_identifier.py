@@ -1,14 +1,33 @@
 from typing import Dict, Any, List
+import numpy as np
 from google.adk.tools import ToolContext
 
 from src.data_store.data_store import XRD_DATA_STORE
-from src.agents.xrd_agent.sub_agents.reference_check.tools.fetch_mp_xrd import fetch_mp_xrd_lines
+from src.agents.xrd_agent.sub_agents.reference_check.tools.fetch_mp_xrd import fetch_mp_xrd_lines, search_mp_candidates
+from src.agents.xrd_agent.sub_agents.reference_check.tools.prefetch import await_reference_prefetch
+from src.agents.xrd_agent.sub_agents.reference_check.tools.reference_library import REFERENCE_LIBRARY
+from src.agents.xrd_agent.sub_agents.reference_check.tools.multiphase_match import build_profile_matrix
+from src.agents.xrd_agent.sub_agents.reference_check.tools.profile_similarity import (
+    cross_correlation_scores,
+    to_uniform_grid,
+)
 
 
 def mp_identifier(payload: Dict[str, Any], tool_context: ToolContext) -> Dict[str, Any]:
     """
     Resolves the most likely Materials Project identifier given either an mp-id
     or a chemical formula, by comparing simulated patterns to experimental data.
+
+    Optional candidate prefilters (applied before any pattern is simulated):
+      - chemsys (e.g. "Mn-O"): search a whole chemical system instead of one formula,
+      - allowed_elements / required_elements / forbidden_elements (lists of symbols),
+      - crystal_systems (e.g. ["tetragonal"]) / space_groups (list of numbers).
+
+    confidence_metric selects how candidates are scored:
+      - "peaks" (default): fraction of experimental peaks within 0.3° of a reference line,
+      - "profile": FFT cross-correlation of the corrected pattern with each broadened
+        reference over ±max_shift_deg (default 0.5), robust to zero shift; also
+        reports the optimal zero shift per candidate.
     """
     try:
         path = payload["path"]
@@ -32,60 +51,92 @@ def mp_identifier(payload: Dict[str, Any], tool_context: ToolContext) -> Dict[st
                 "message": "mp_identifier already provided."
             }
 
-        # Otherwise, look for formula
+        # Otherwise, look for chemical system or formula
+        chemsys = payload.get("chemsys") or meta.get("chemsys")
         formula = payload.get("formula") or meta.get("formula") or meta.get("sample_name")
-        if not formula:
+        if not chemsys and not formula:
             return {"success": False, "message": "No formula or mp_identifier provided."}
 
         two_theta_min = float(meta.get("two_theta_min", 5.0))
         two_theta_max = float(meta.get("two_theta_max", 90.0))
         lam = float(meta.get("wavelength_angstrom", 1.5406))
 
-        # Fetch candidates from MP
-        # NOTE: here we assume fetch_mp_xrd_lines can handle formula identifiers too
+        # Fetch candidates from MP (usually already cached by the load-time prefetch)
+        await_reference_prefetch(meta.get("reference_prefetch"))
         try:
-            from mp_api.client import MPRester as MPClient
-            import os
-            api_key = os.getenv("MP_API_KEY")
-            with MPClient(api_key) as mpr:
-                results = mpr.summary.search(
-                    formula=formula,
-                    fields=["material_id", "formula_pretty", "structure", "energy_above_hull"]
-                )
+            results = search_mp_candidates(formula=formula, chemsys=chemsys)
             if not results:
-                return {"success": False, "message": f"No MP entries found for formula '{formula}'."}
+                label = f"chemical system '{chemsys}'" if chemsys else f"formula '{formula}'"
+                return {"success": False, "message": f"No MP entries found for {label}."}
         except Exception as e:
             return {"success": False, "message": f"Failed to query MP: {e}"}
 
-        candidates = []
-        best_id = None
-        best_score = -1.0
-        print("Results:", results)
+        # Prune candidates by element set / symmetry before simulating anything
+        rows = REFERENCE_LIBRARY.add_docs(results)
+        keep = REFERENCE_LIBRARY.select(
+            rows=rows,
+            allowed_elements=payload.get("allowed_elements", meta.get("allowed_elements")),
+            required_elements=payload.get("required_elements", meta.get("required_elements")),
+            forbidden_elements=payload.get("forbidden_elements", meta.get("forbidden_elements")),
+            crystal_systems=payload.get("crystal_systems", meta.get("crystal_systems")),
+            space_groups=payload.get("space_groups", meta.get("space_groups")),
+        )
+        kept_ids = set(REFERENCE_LIBRARY.material_ids(keep))
+        results = [r for r in results if str(r.material_id) in kept_ids]
+        if not results:
+            return {"success": False, "message": "No MP candidates left after element/symmetry filtering."}
+
+        metric = payload.get("confidence_metric", meta.get("confidence_metric", "peaks"))
+        use_profile = metric == "profile"
+
+        refs = []
         for r in results:
-            # simulate pattern
+            # simulate pattern (all lines for full-profile scoring)
             ref = fetch_mp_xrd_lines(
                 identifier=r.material_id,
                 wavelength_angstrom=lam,
                 two_theta_min=two_theta_min,
                 two_theta_max=two_theta_max,
-                top_n=20,
-                min_intensity=1.0,
+                top_n=0 if use_profile else 20,
+                min_intensity=0.5 if use_profile else 1.0,
             )
             if "_error" in ref:
                 continue
+            refs.append((r, ref))
 
-            score = 0.0
-            if peaks:
-                exp_tths = [pk["two_theta"] for pk in peaks]
+        scores = [0.0] * len(refs)
+        shifts = [None] * len(refs)
+        if use_profile and refs:
+            # full-profile FFT cross-correlation of the corrected pattern vs all candidates at once
+            grid, y = to_uniform_grid(XRD_DATA_STORE[path]["two_theta_deg"], loop_data["intensity_corr"])
+            pos, inten, owner = [], [], []
+            for k, (_, ref) in enumerate(refs):
+                for rp in ref.get("peaks", []):
+                    pos.append(rp["two_theta"]); inten.append(rp["intensity"]); owner.append(k)
+            fwhm = float(np.median([p["fwhm_deg"] for p in peaks])) if peaks else 0.1
+            A = build_profile_matrix(grid, np.asarray(pos), np.asarray(inten), np.asarray(owner, dtype=np.intp),
+                                     len(refs), fwhm)
+            sh, sc = cross_correlation_scores(y, A.T, step_deg=float(grid[1] - grid[0]),
+                                              max_shift_deg=float(payload.get("max_shift_deg", 0.5)))
+            scores = [max(0.0, float(v)) for v in sc]
+            shifts = [float(v) for v in sh]
+        elif peaks:
+            exp_tths = [pk["two_theta"] for pk in peaks]
+            for k, (_, ref) in enumerate(refs):
                 ref_tths = [rp["two_theta"] for rp in ref.get("peaks", [])]
                 # crude score: fraction of exp peaks that have a nearby ref peak
                 matches = sum(any(abs(et - rt) < 0.3 for rt in ref_tths) for et in exp_tths)
-                score = matches / max(1, len(exp_tths))
+                scores[k] = matches / max(1, len(exp_tths))
 
+        candidates = []
+        best_id = None
+        best_score = -1.0
+        for (r, _), score, shift in zip(refs, scores, shifts):
             candidates.append({
                 "material_id": r.material_id,
                 "formula": r.formula_pretty,
                 "confidence": float(score),
+                "zero_shift_deg": shift,
             })
             if score > best_score:
                 best_id = r.material_id
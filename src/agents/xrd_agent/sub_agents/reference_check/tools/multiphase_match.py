@@ -0,0 +1,210 @@
+from typing import Dict, Any, List, Sequence, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.optimize import nnls
+from google.adk.tools import ToolContext
+
+from src.data_store.data_store import XRD_DATA_STORE
+from src.agents.xrd_agent.sub_agents.reference_check.tools.fetch_mp_xrd import fetch_mp_xrd_lines
+
+
+def build_profile_matrix(
+    theta: np.ndarray,
+    stick_positions: np.ndarray,
+    stick_intensities: np.ndarray,
+    stick_owner: np.ndarray,
+    n_candidates: int,
+    fwhm_deg: float,
+) -> np.ndarray:
+    """
+    Broaden the stick patterns of all candidates onto the grid `theta` in one pass.
+
+    Every stick gets a Gaussian of width `fwhm_deg`, evaluated only on the
+    ±3·FWHM neighbourhood of grid points around it; contributions are scattered
+    into an (n_points, n_candidates) matrix through a sparse COO sum.
+    Columns are normalized to unit maximum.
+    """
+    n = len(theta)
+    if n < 2 or len(stick_positions) == 0:
+        return np.zeros((n, n_candidates))
+
+    step = float(np.median(np.abs(np.diff(theta)))) or 1e-3
+    half = int(np.ceil(3.0 * fwhm_deg / step))
+    sigma = fwhm_deg / 2.3548
+
+    centers = np.searchsorted(theta, stick_positions)
+    idx = centers[:, None] + np.arange(-half, half + 1)[None, :]
+    valid = (idx >= 0) & (idx < n)
+    idx = np.clip(idx, 0, n - 1)
+    vals = stick_intensities[:, None] * np.exp(-0.5 * ((theta[idx] - stick_positions[:, None]) / sigma) ** 2)
+    vals[~valid] = 0.0
+    cols = np.broadcast_to(stick_owner[:, None], idx.shape)
+
+    A = sp.coo_matrix((vals.ravel(), (idx.ravel(), cols.ravel())), shape=(n, n_candidates)).toarray()
+    peak = A.max(axis=0)
+    A[:, peak > 0] /= peak[peak > 0]
+    return A
+
+
+def greedy_nnls(
+    A: np.ndarray,
+    y: np.ndarray,
+    max_phases: int = 3,
+    min_improvement: float = 0.02,
+) -> Tuple[List[int], np.ndarray, List[float]]:
+    """
+    Forward selection of columns of A explaining y under non-negative weights.
+
+    Each step adds the column that lowers the NNLS residual most; stops when the
+    relative residual improves by less than `min_improvement` or `max_phases`
+    columns are selected. Returns (selected columns, weights, residual history),
+    residuals expressed as ||y - Ax|| / ||y||.
+    """
+    y_norm = float(np.linalg.norm(y)) or 1.0
+    selected: List[int] = []
+    weights = np.zeros(0)
+    history: List[float] = [1.0]
+
+    # First step in closed form for all columns at once: x = max(0, a.y / a.a)
+    aa = np.einsum("ij,ij->j", A, A)
+    ay = A.T @ y
+    with np.errstate(divide="ignore", invalid="ignore"):
+        gain = np.where((aa > 0) & (ay > 0), ay ** 2 / aa, 0.0)
+    if not np.any(gain > 0):
+        return selected, weights, history
+    first = int(np.argmax(gain))
+    selected.append(first)
+    weights = np.array([ay[first] / aa[first]])
+    history.append(float(np.sqrt(max(y_norm ** 2 - gain[first], 0.0)) / y_norm))
+
+    while len(selected) < max_phases:
+        best = None
+        for j in range(A.shape[1]):
+            if j in selected or aa[j] == 0:
+                continue
+            x, rnorm = nnls(A[:, selected + [j]], y)
+            if x[-1] <= 0:
+                continue
+            if best is None or rnorm < best[1]:
+                best = (j, rnorm, x)
+        if best is None:
+            break
+        rel = best[1] / y_norm
+        if history[-1] - rel < min_improvement:
+            break
+        selected.append(best[0])
+        weights = best[2]
+        history.append(float(rel))
+
+    return selected, weights, history
+
+
+def multiphase_match(payload: Dict[str, Any], tool_context: ToolContext) -> Dict[str, Any]:
+    """
+    Multiphase search-match of the corrected pattern against MP reference profiles.
+    Expects payload to include:
+      - path
+      - candidates (list of mp-ids; defaults to the candidates found by mp_identifier)
+      - max_phases (default=3)
+      - min_improvement (relative residual gain needed to add a phase, default=0.02)
+      - profile_fwhm_deg (default: median fitted FWHM, else 0.1)
+    Returns the selected phases ranked by scale fraction, with residuals.
+    """
+    try:
+        path = payload["path"]
+        if path not in XRD_DATA_STORE:
+            return {"success": False, "path": path, "message": "No data found in store for given path."}
+
+        loop_iter = tool_context.state.get("loop_iteration", 1)
+
+        stored = XRD_DATA_STORE[path]
+        loop_data = stored["loops"][loop_iter]
+        meta = loop_data["meta"]
+
+        candidates: Sequence[str] = payload.get("candidates") or [
+            c["material_id"] for c in loop_data.get("mp_candidates", []) if c.get("material_id")
+        ]
+        if not candidates:
+            return {"success": False, "path": path, "sample_name": meta.get("sample_name"),
+                    "message": "No candidate phases given and none found by mp_identifier."}
+
+        theta = np.asarray(stored["two_theta_deg"], dtype=float)
+        y = np.asarray(loop_data["intensity_corr"], dtype=float)
+        order = np.argsort(theta)
+        theta, y = theta[order], y[order]
+
+        peaks = loop_data.get("peaks", [])
+        default_fwhm = float(np.median([p["fwhm_deg"] for p in peaks])) if peaks else 0.1
+        fwhm = float(payload.get("profile_fwhm_deg", default_fwhm))
+        max_phases = int(payload.get("max_phases", 3))
+        min_improvement = float(payload.get("min_improvement", 0.02))
+        lam = float(meta.get("wavelength_angstrom", 1.5406))
+
+        # Collect stick patterns of every candidate
+        ids: List[str] = []
+        formulas: List[Any] = []
+        pos, inten, owner = [], [], []
+        errors = {}
+        for cid in candidates:
+            ref = fetch_mp_xrd_lines(
+                identifier=cid,
+                wavelength_angstrom=lam,
+                two_theta_min=float(theta[0]),
+                two_theta_max=float(theta[-1]),
+                top_n=0,
+                min_intensity=0.5,
+            )
+            if "_error" in ref or not ref.get("peaks"):
+                errors[cid] = ref.get("_error", "no reflections in range")
+                continue
+            k = len(ids)
+            ids.append(ref.get("material_id") or cid)
+            formulas.append(ref.get("formula"))
+            for rp in ref["peaks"]:
+                pos.append(rp["two_theta"]); inten.append(rp["intensity"]); owner.append(k)
+
+        if not ids:
+            return {"success": False, "path": path, "sample_name": meta.get("sample_name"),
+                    "message": f"Could not simulate any candidate: {errors}"}
+
+        A = build_profile_matrix(theta, np.asarray(pos), np.asarray(inten), np.asarray(owner, dtype=np.intp),
+                                 len(ids), fwhm)
+        selected, weights, history = greedy_nnls(A, y, max_phases=max_phases, min_improvement=min_improvement)
+
+        # Integrated contribution of each selected phase, as a fraction of the fitted total
+        areas = weights * A[:, selected].sum(axis=0) if selected else np.zeros(0)
+        total = float(areas.sum()) or 1.0
+        phases = [
+            {
+                "material_id": ids[j],
+                "formula": formulas[j],
+                "scale": float(w),
+                "fraction": float(a / total),
+                "residual_after": history[i + 1],
+            }
+            for i, (j, w, a) in enumerate(zip(selected, weights, areas))
+        ]
+        phases.sort(key=lambda ph: ph["fraction"], reverse=True)
+
+        result = {
+            "phases": phases,
+            "residual": history[-1],
+            "residual_history": history,
+            "n_candidates": len(ids),
+            "profile_fwhm_deg": fwhm,
+            "skipped": errors,
+        }
+        loop_data["multiphase"] = result
+
+        return {
+            "success": True,
+            "path": path,
+            "sample_name": meta.get("sample_name"),
+            **result,
+            "message": f"Selected {len(phases)} phase(s) from {len(ids)} candidates; "
+                       f"relative residual {history[-1]:.3f} for loop {loop_iter}.",
+        }
+
+    except Exception as e:
+        return {"success": False, "path": payload.get("path"), "message": f"Failed: {str(e)}"}
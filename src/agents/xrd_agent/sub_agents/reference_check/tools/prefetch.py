@@ -0,0 +1,89 @@
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+from src.agents.xrd_agent.sub_agents.reference_check.tools.fetch_mp_xrd import fetch_mp_structure, search_mp_candidates
+from src.agents.xrd_agent.sub_agents.reference_check.tools.reference_library import REFERENCE_LIBRARY
+from src.agents.xrd_agent.sub_agents.reference_check.tools.simulate_pattern import get_reflection_table
+
+_MP_ID = re.compile(r"^(mp|mvc|mat)-\d+$", re.IGNORECASE)
+_FORMULA = re.compile(r"^(?:[A-Z][a-z]?\d*(?:\.\d+)?)+$")
+
+# finished prefetches nobody awaited are dropped once this many are held
+MAX_PREFETCHES = 64
+
+_EXECUTOR: Optional[ThreadPoolExecutor] = None
+_PREFETCHES: Dict[str, Future] = {}
+_LOCK = threading.Lock()
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        _EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="mp-prefetch")
+    return _EXECUTOR
+
+
+def _prefetch(identifier: str, wavelength_angstrom: float) -> Dict[str, Any]:
+    """Fetch structures for `identifier` and warm their reflection tables."""
+    g_max = 2.0 / wavelength_angstrom
+    if _MP_ID.match(identifier):
+        ref = fetch_mp_structure(identifier)
+        if "_error" in ref:
+            return ref
+        get_reflection_table(ref["structure"], g_max)
+        return {"material_ids": [ref["material_id"]]}
+
+    results = search_mp_candidates(formula=identifier)
+    REFERENCE_LIBRARY.add_docs(results)
+    for r in results:
+        if getattr(r, "structure", None) is not None:
+            get_reflection_table(r.structure, g_max)
+    return {"material_ids": [str(r.material_id) for r in results]}
+
+
+def start_reference_prefetch(identifier: Optional[str], wavelength_angstrom: float = 1.5406) -> Optional[str]:
+    """
+    Start fetching MP structures and simulating reflection tables for an mp-id
+    or formula in the background, so the reference check later finds them
+    cached. Returns the prefetch key (identifier and wavelength, since the
+    reflection tables depend on both), or None if `identifier` looks like
+    neither an mp-id nor a formula (e.g. a free-text sample name).
+    """
+    if not identifier:
+        return None
+    identifier = identifier.strip()
+    if not (_MP_ID.match(identifier) or _FORMULA.match(identifier)):
+        return None
+    wavelength_angstrom = float(wavelength_angstrom)
+    key = f"{identifier}@{wavelength_angstrom:.6g}"
+    with _LOCK:
+        if key not in _PREFETCHES:
+            if len(_PREFETCHES) >= MAX_PREFETCHES:
+                for k in [k for k, f in _PREFETCHES.items() if f.done()]:
+                    del _PREFETCHES[k]
+            _PREFETCHES[key] = _executor().submit(_prefetch, identifier, wavelength_angstrom)
+    return key
+
+
+def await_reference_prefetch(key: Optional[str], timeout: float = 120.0) -> Optional[Dict[str, Any]]:
+    """
+    Block until the prefetch started under `key` has finished. Errors and
+    timeouts are swallowed: the caller then fetches synchronously as usual.
+    A finished prefetch is forgotten (its data lives on in the MP caches),
+    so a later await returns None.
+    """
+    with _LOCK:
+        future = _PREFETCHES.get(key) if key else None
+    if future is None:
+        return None
+    try:
+        return future.result(timeout=timeout)
+    except Exception as e:
+        return {"_error": f"Reference prefetch failed: {e!r}"}
+    finally:
+        if future.done():
+            with _LOCK:
+                if _PREFETCHES.get(key) is future:
+                    del _PREFETCHES[key]
@@ -0,0 +1,67 @@
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+def to_uniform_grid(theta: np.ndarray, y: np.ndarray, step: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Resample (theta, y) onto an evenly spaced, ascending 2θ grid."""
+    order = np.argsort(theta)
+    theta, y = np.asarray(theta, dtype=float)[order], np.asarray(y, dtype=float)[order]
+    if step is None:
+        step = float(np.median(np.diff(theta)))
+    grid = np.arange(theta[0], theta[-1] + 0.5 * step, step)
+    return grid, np.interp(grid, theta, y)
+
+
+def cross_correlation_scores(
+    y: np.ndarray,
+    refs: np.ndarray,
+    step_deg: float,
+    max_shift_deg: float = 0.5,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Batched normalized cross-correlation of one pattern against many references.
+
+    y is (n,), refs is (m, n), both sampled on the same uniform grid with spacing
+    `step_deg`. All correlations are computed with a single real FFT over the
+    zero-padded batch, restricted to lags within ±max_shift_deg.
+
+    Returns (shifts_deg, scores), each (m,):
+      - shift > 0 means the experimental pattern sits at higher 2θ than the reference,
+      - score is the Pearson-style correlation (−1..1) at the best lag, refined
+        to sub-step precision by parabolic interpolation of the peak.
+    """
+    y = np.asarray(y, dtype=float)
+    refs = np.atleast_2d(np.asarray(refs, dtype=float))
+    n = y.shape[0]
+    max_lag = min(n - 1, int(round(max_shift_deg / step_deg)))
+
+    def _normalize(a):
+        a = a - a.mean(axis=-1, keepdims=True)
+        norm = np.linalg.norm(a, axis=-1, keepdims=True)
+        return np.divide(a, norm, out=np.zeros_like(a), where=norm > 0)
+
+    yn = _normalize(y)
+    rn = _normalize(refs)
+
+    nfft = 1 << int(np.ceil(np.log2(n + max_lag)))
+    spec = np.fft.rfft(yn, nfft)[None, :] * np.conj(np.fft.rfft(rn, nfft, axis=1))
+    full = np.fft.irfft(spec, nfft, axis=1)
+    # lags 0..max_lag are at the start, negative lags wrap around to the end
+    cc = np.concatenate([full[:, nfft - max_lag:], full[:, :max_lag + 1]], axis=1)
+    lags = np.arange(-max_lag, max_lag + 1)
+
+    best = np.argmax(cc, axis=1)
+    rows = np.arange(cc.shape[0])
+    scores = cc[rows, best]
+
+    # Parabolic refinement around the discrete maximum
+    left = cc[rows, np.clip(best - 1, 0, cc.shape[1] - 1)]
+    right = cc[rows, np.clip(best + 1, 0, cc.shape[1] - 1)]
+    denom = left - 2 * scores + right
+    interior = (best > 0) & (best < cc.shape[1] - 1) & (denom < 0)
+    frac = np.where(interior, 0.5 * (left - right) / np.where(denom == 0, 1, denom), 0.0)
+    shifts = (lags[best] + frac) * step_deg
+    scores = np.where(interior, scores - 0.25 * (left - right) * frac, scores)
+
+    return shifts, np.clip(scores, -1.0, 1.0)
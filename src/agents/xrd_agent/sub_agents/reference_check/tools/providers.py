@@ -0,0 +1,358 @@
+import json
+import os
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import dotenv
+
+from src.run_paths import current_run_paths
+
+dotenv.load_dotenv()
+
+
+@dataclass
+class ReferenceEntry:
+    """One reference phase, shaped like the MP summary docs the tools consume."""
+    material_id: str
+    formula_pretty: Optional[str]
+    structure: Any
+    energy_above_hull: Optional[float] = None
+    elements: List[str] = field(default_factory=list)
+    symmetry: Optional[Dict[str, Any]] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "material_id": self.material_id,
+            "formula_pretty": self.formula_pretty,
+            "structure": self.structure.as_dict() if self.structure is not None else None,
+            "energy_above_hull": self.energy_above_hull,
+            "elements": self.elements,
+            "symmetry": self.symmetry,
+        }
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "ReferenceEntry":
+        from pymatgen.core import Structure  # type: ignore
+        return cls(
+            material_id=d["material_id"],
+            formula_pretty=d.get("formula_pretty"),
+            structure=Structure.from_dict(d["structure"]) if d.get("structure") else None,
+            energy_above_hull=d.get("energy_above_hull"),
+            elements=list(d.get("elements") or []),
+            symmetry=d.get("symmetry"),
+        )
+
+
+def _entry_from_structure(material_id: str, structure, energy_above_hull: Optional[float] = None) -> ReferenceEntry:
+    """Build an entry from a bare structure, deriving formula, elements and symmetry."""
+    symmetry = None
+    try:
+        from pymatgen.symmetry.analyzer import SpacegroupAnalyzer  # type: ignore
+        sga = SpacegroupAnalyzer(structure)
+        symmetry = {"number": sga.get_space_group_number(), "symbol": sga.get_space_group_symbol(),
+                    "crystal_system": sga.get_crystal_system()}
+    except Exception:
+        pass
+    return ReferenceEntry(
+        material_id=material_id,
+        formula_pretty=structure.composition.reduced_formula,
+        structure=structure,
+        energy_above_hull=energy_above_hull,
+        elements=sorted(el.symbol for el in structure.composition.elements),
+        symmetry=symmetry,
+    )
+
+
+def _sort_by_hull(entries: List[ReferenceEntry]) -> List[ReferenceEntry]:
+    return sorted(entries, key=lambda e: e.energy_above_hull if e.energy_above_hull is not None else float("inf"))
+
+
+class ReferenceProvider(ABC):
+    """Source of reference structures for the reference-check tools."""
+
+    name: str = "base"
+
+    @property
+    def cache_key(self) -> str:
+        """Identity of the data source, for caches shared across provider instances."""
+        return self.name
+
+    @abstractmethod
+    def get_structure(self, identifier: str) -> Dict[str, Any]:
+        """
+        Structure for a material id or formula (lowest energy above hull).
+        Returns {"structure", "material_id", "formula"} or {"_error": str}.
+        """
+
+    @abstractmethod
+    def search(self, formula: Optional[str] = None, chemsys: Optional[str] = None) -> List[ReferenceEntry]:
+        """All entries with the given formula or chemical system. Raises on failure."""
+
+
+class MPProvider(ReferenceProvider):
+    """Live Materials Project client (mp-api, falling back to the legacy pymatgen client)."""
+
+    name = "mp"
+
+    def __init__(self, api_key: Optional[str] = None):
+        self.api_key = api_key or os.getenv("MP_API_KEY")
+
+    def get_structure(self, identifier: str) -> Dict[str, Any]:
+        api_key = self.api_key
+        if not api_key:
+            return {"_error": "Missing Materials Project API key. Set MP_API_KEY or pass api_key=."}
+
+        structure = None
+        material_id: Optional[str] = None
+        formula_pretty: Optional[str] = None
+
+        # Prefer mp-api if present (new API)
+        try:
+            from mp_api.client import MPRester as MPClient  # type: ignore
+            with MPClient(api_key) as mpr:
+                if identifier.lower().startswith(("mp-", "mvc-", "mat-")):
+                    material_id = identifier
+                    try:
+                        s = mpr.get_structure_by_material_id(material_id)
+                    except Exception as e:
+                        return {"_error": f"Failed to fetch structure for {material_id}: {e}"}
+                    structure = s
+                    try:
+                        sm = mpr.summary.get_data_by_id(material_id)
+                        if sm:
+                            formula_pretty = getattr(sm[0], "formula_pretty", None)
+                    except Exception:
+                        pass
+                else:
+                    results = mpr.summary.search(
+                        formula=identifier,
+                        fields=["material_id", "formula_pretty", "energy_above_hull", "structure"],
+                    )
+                    if not results:
+                        return {"_error": f"No MP entries found for formula '{identifier}'."}
+                    results.sort(key=lambda r: (getattr(r, "energy_above_hull", float("inf")) or float("inf")))
+                    best = results[0]
+                    structure = best.structure
+                    material_id = best.material_id
+                    formula_pretty = best.formula_pretty
+        except Exception:
+            # Fallback to legacy pymatgen client
+            try:
+                from pymatgen.ext.matproj import MPRester  # type: ignore
+            except Exception as e:
+                return {"_error": f"Cannot import Materials Project client: {e}"}
+
+            with MPRester(api_key) as mpr:
+                if identifier.lower().startswith("mp-"):
+                    material_id = identifier
+                    try:
+                        structure = mpr.get_structure_by_material_id(material_id)
+                    except Exception as e:
+                        return {"_error": f"Failed to fetch structure for {material_id}: {e}"}
+                    try:
+                        doc = mpr.query(material_id=[material_id], properties=["pretty_formula"])
+                        if doc:
+                            formula_pretty = doc[0].get("pretty_formula")
+                    except Exception:
+                        pass
+                else:
+                    structs = mpr.get_structures(identifier)
+                    if not structs:
+                        return {"_error": f"No structures found for formula '{identifier}'."}
+                    structure = structs[0]
+                    try:
+                        q = mpr.query(criteria={"formula_pretty": identifier}, properties=["material_id"])
+                        material_id = q[0]["material_id"] if q else None
+                        formula_pretty = identifier
+                    except Exception:
+                        formula_pretty = identifier
+
+        if structure is None:
+            return {"_error": f"Could not obtain a structure for identifier '{identifier}'."}
+        return {"structure": structure, "material_id": str(material_id) if material_id else None,
+                "formula": formula_pretty}
+
+    def search(self, formula: Optional[str] = None, chemsys: Optional[str] = None) -> List[ReferenceEntry]:
+        from mp_api.client import MPRester as MPClient  # type: ignore
+        query = {"chemsys": chemsys} if chemsys else {"formula": formula}
+        with MPClient(self.api_key) as mpr:
+            docs = mpr.summary.search(
+                **query,
+                fields=["material_id", "formula_pretty", "structure", "energy_above_hull",
+                        "elements", "symmetry"]
+            )
+        entries = []
+        for d in docs:
+            sym = getattr(d, "symmetry", None)
+            cs = getattr(sym, "crystal_system", None)
+            entries.append(ReferenceEntry(
+                material_id=str(d.material_id),
+                formula_pretty=d.formula_pretty,
+                structure=d.structure,
+                energy_above_hull=getattr(d, "energy_above_hull", None),
+                elements=[str(getattr(e, "symbol", e)) for e in (getattr(d, "elements", None) or [])],
+                symmetry={"number": getattr(sym, "number", None), "symbol": getattr(sym, "symbol", None),
+                          "crystal_system": str(getattr(cs, "value", cs)) if cs is not None else None}
+                if sym is not None else None,
+            ))
+        return entries
+
+
+class LocalProvider(ReferenceProvider):
+    """
+    Directory of CIF or pymatgen-JSON structures; the file stem is the material
+    id (e.g. `mp-149.cif`). An optional `energies.json` ({material_id: e_above_hull})
+    orders formula lookups the same way MP does.
+    """
+
+    name = "local"
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._entries: Optional[Dict[str, ReferenceEntry]] = None
+        self._lock = threading.Lock()
+
+    @property
+    def cache_key(self) -> str:
+        return f"local:{os.path.abspath(self.directory)}"
+
+    def _index(self) -> Dict[str, ReferenceEntry]:
+        if self._entries is not None:
+            return self._entries
+        with self._lock:
+            if self._entries is None:
+                from pymatgen.core import Structure  # type: ignore
+                energies = {}
+                epath = os.path.join(self.directory, "energies.json")
+                if os.path.exists(epath):
+                    with open(epath) as f:
+                        energies = json.load(f)
+                entries = {}
+                for fname in sorted(os.listdir(self.directory)):
+                    stem, ext = os.path.splitext(fname)
+                    if ext.lower() not in (".cif", ".json") or fname == "energies.json":
+                        continue
+                    structure = Structure.from_file(os.path.join(self.directory, fname))
+                    entries[stem] = _entry_from_structure(stem, structure, energies.get(stem))
+                self._entries = entries
+        return self._entries
+
+    def get_structure(self, identifier: str) -> Dict[str, Any]:
+        index = self._index()
+        entry = index.get(identifier)
+        if entry is None:
+            matches = _sort_by_hull([e for e in index.values() if e.formula_pretty == identifier])
+            if not matches:
+                return {"_error": f"No local reference found for '{identifier}' in {self.directory}."}
+            entry = matches[0]
+        return {"structure": entry.structure, "material_id": entry.material_id, "formula": entry.formula_pretty}
+
+    def search(self, formula: Optional[str] = None, chemsys: Optional[str] = None) -> List[ReferenceEntry]:
+        index = self._index()
+        if chemsys:
+            wanted = sorted(chemsys.split("-"))
+            return _sort_by_hull([e for e in index.values() if e.elements == wanted])
+        return _sort_by_hull([e for e in index.values() if e.formula_pretty == formula])
+
+
+class ReplayProvider(ReferenceProvider):
+    """
+    Serves responses from a JSON recording. With an `upstream` provider, misses
+    are forwarded to it and appended to the recording (record mode); without
+    one, misses are errors, which keeps regression runs hermetic.
+    """
+
+    name = "replay"
+
+    def __init__(self, recording_path: str, upstream: Optional[ReferenceProvider] = None):
+        self.recording_path = recording_path
+        self.upstream = upstream
+        self._lock = threading.Lock()
+        self._structures: Dict[str, Dict[str, Any]] = {}
+        self._searches: Dict[str, List[Dict[str, Any]]] = {}
+        if os.path.exists(recording_path):
+            with open(recording_path) as f:
+                data = json.load(f)
+            self._structures = data.get("structures", {})
+            self._searches = data.get("searches", {})
+
+    @property
+    def cache_key(self) -> str:
+        return f"replay:{os.path.abspath(self.recording_path)}"
+
+    def _save(self) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.recording_path)), exist_ok=True)
+        tmp = self.recording_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"structures": self._structures, "searches": self._searches}, f)
+        os.replace(tmp, self.recording_path)
+
+    def get_structure(self, identifier: str) -> Dict[str, Any]:
+        rec = self._structures.get(identifier)
+        if rec is None:
+            if self.upstream is None:
+                return {"_error": f"No recorded reference response for '{identifier}'."}
+            res = self.upstream.get_structure(identifier)
+            if "_error" in res:
+                return res
+            rec = {"structure": res["structure"].as_dict(), "material_id": res["material_id"],
+                   "formula": res["formula"]}
+            with self._lock:
+                self._structures[identifier] = rec
+                self._save()
+        from pymatgen.core import Structure  # type: ignore
+        return {"structure": Structure.from_dict(rec["structure"]), "material_id": rec["material_id"],
+                "formula": rec["formula"]}
+
+    def search(self, formula: Optional[str] = None, chemsys: Optional[str] = None) -> List[ReferenceEntry]:
+        key = f"chemsys:{chemsys}" if chemsys else f"formula:{formula}"
+        recs = self._searches.get(key)
+        if recs is None:
+            if self.upstream is None:
+                raise LookupError(f"No recorded reference search for {key}.")
+            entries = self.upstream.search(formula=formula, chemsys=chemsys)
+            with self._lock:
+                self._searches[key] = [e.to_dict() for e in entries]
+                self._save()
+            return entries
+        return [ReferenceEntry.from_dict(r) for r in recs]
+
+
+_PROVIDER: Optional[ReferenceProvider] = None
+
+
+def provider_from_config() -> ReferenceProvider:
+    """
+    Build the provider selected by environment:
+      - XRD_REFERENCE_PROVIDER = "mp" (default) | "local" | "replay" | "record"
+      - XRD_REFERENCE_DIR: structure directory for "local"
+      - XRD_REFERENCE_RECORDING: JSON recording for "replay" / "record"
+        ("record" forwards misses to live MP and appends them)
+    Relative paths resolve against the current run's root.
+    """
+    kind = os.getenv("XRD_REFERENCE_PROVIDER", "mp").lower()
+    paths = current_run_paths()
+    if kind == "local":
+        return LocalProvider(paths.resolve(os.getenv("XRD_REFERENCE_DIR", "reference_structures")))
+    if kind in ("replay", "record"):
+        path = paths.resolve(os.getenv("XRD_REFERENCE_RECORDING", "reference_structures/recording.json"))
+        return ReplayProvider(path, upstream=MPProvider() if kind == "record" else None)
+    if kind != "mp":
+        raise ValueError(f"Unknown XRD_REFERENCE_PROVIDER '{kind}'.")
+    return MPProvider()
+
+
+def get_reference_provider() -> ReferenceProvider:
+    """Process-wide provider, created from configuration on first use."""
+    global _PROVIDER
+    if _PROVIDER is None:
+        _PROVIDER = provider_from_config()
+    return _PROVIDER
+
+
+def set_reference_provider(provider: Optional[ReferenceProvider]) -> None:
+    """Override the provider (None re-reads the configuration on next use)."""
+    global _PROVIDER
+    _PROVIDER = provider
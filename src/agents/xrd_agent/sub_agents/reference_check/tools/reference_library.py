@@ -0,0 +1,230 @@
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+
+# Periodic table in Z order; bit (Z - 1) of a phase mask marks that element as present.
+ELEMENTS = (
+    "H", "He", "Li", "Be", "B", "C", "N", "O", "F", "Ne",
+    "Na", "Mg", "Al", "Si", "P", "S", "Cl", "Ar", "K", "Ca",
+    "Sc", "Ti", "V", "Cr", "Mn", "Fe", "Co", "Ni", "Cu", "Zn",
+    "Ga", "Ge", "As", "Se", "Br", "Kr", "Rb", "Sr", "Y", "Zr",
+    "Nb", "Mo", "Tc", "Ru", "Rh", "Pd", "Ag", "Cd", "In", "Sn",
+    "Sb", "Te", "I", "Xe", "Cs", "Ba", "La", "Ce", "Pr", "Nd",
+    "Pm", "Sm", "Eu", "Gd", "Tb", "Dy", "Ho", "Er", "Tm", "Yb",
+    "Lu", "Hf", "Ta", "W", "Re", "Os", "Ir", "Pt", "Au", "Hg",
+    "Tl", "Pb", "Bi", "Po", "At", "Rn", "Fr", "Ra", "Ac", "Th",
+    "Pa", "U", "Np", "Pu", "Am", "Cm", "Bk", "Cf", "Es", "Fm",
+    "Md", "No", "Lr", "Rf", "Db", "Sg", "Bh", "Hs", "Mt", "Ds",
+    "Rg", "Cn", "Nh", "Fl", "Mc", "Lv", "Ts", "Og",
+)
+_ELEMENT_INDEX = {sym: i for i, sym in enumerate(ELEMENTS)}
+_MASK_WORDS = 2  # 2 x 64 bits covers all 118 elements
+
+CRYSTAL_SYSTEMS = (
+    "triclinic", "monoclinic", "orthorhombic", "tetragonal",
+    "trigonal", "hexagonal", "cubic",
+)
+_CRYSTAL_SYSTEM_INDEX = {name: i for i, name in enumerate(CRYSTAL_SYSTEMS)}
+
+
+def element_mask(elements: Iterable[str]) -> np.ndarray:
+    """Pack a set of element symbols into a (2,) uint64 bitmask."""
+    mask = np.zeros(_MASK_WORDS, dtype=np.uint64)
+    for sym in elements:
+        idx = _ELEMENT_INDEX.get(str(sym).strip().capitalize())
+        if idx is None:
+            raise ValueError(f"Unknown element symbol '{sym}'.")
+        mask[idx // 64] |= np.uint64(1) << np.uint64(idx % 64)
+    return mask
+
+
+def mask_to_elements(mask: np.ndarray) -> List[str]:
+    """Inverse of `element_mask`."""
+    out = []
+    for idx, sym in enumerate(ELEMENTS):
+        if int(mask[idx // 64]) >> (idx % 64) & 1:
+            out.append(sym)
+    return out
+
+
+def crystal_system_from_space_group(number: Optional[int]) -> Optional[str]:
+    """Crystal system for an international space-group number (1-230)."""
+    if number is None or not 1 <= int(number) <= 230:
+        return None
+    for upper, name in ((2, "triclinic"), (15, "monoclinic"), (74, "orthorhombic"),
+                        (142, "tetragonal"), (167, "trigonal"), (194, "hexagonal"), (230, "cubic")):
+        if int(number) <= upper:
+            return name
+    return None
+
+
+def _doc_fields(doc: Any) -> Dict[str, Any]:
+    """Pull id, formula, elements and symmetry out of an MP summary doc or plain dict."""
+    get = doc.get if isinstance(doc, dict) else (lambda k, d=None: getattr(doc, k, d))
+
+    elements = get("elements")
+    if elements:
+        elements = [str(getattr(e, "symbol", e)) for e in elements]
+    elif get("chemsys"):
+        elements = str(get("chemsys")).split("-")
+    elif get("structure") is not None:
+        elements = [el.symbol for el in get("structure").composition.elements]
+    else:
+        elements = []
+
+    symmetry = get("symmetry")
+    sg_number, crystal_system = None, None
+    if symmetry is not None:
+        sget = symmetry.get if isinstance(symmetry, dict) else (lambda k, d=None: getattr(symmetry, k, d))
+        sg_number = sget("number")
+        cs = sget("crystal_system")
+        crystal_system = str(getattr(cs, "value", cs)).lower() if cs is not None else None
+    if sg_number is None:
+        sg_number = get("space_group_number")
+    if crystal_system is None:
+        crystal_system = crystal_system_from_space_group(sg_number)
+
+    return {
+        "material_id": str(get("material_id")),
+        "formula": get("formula_pretty") or get("formula"),
+        "elements": elements,
+        "space_group": int(sg_number) if sg_number is not None else None,
+        "crystal_system": crystal_system,
+    }
+
+
+class ReferenceLibrary:
+    """
+    Columnar index of reference phases used to prune candidates before any
+    pattern is simulated.
+
+    Each phase is one row: material id, formula, a 128-bit element mask,
+    space-group number (0 = unknown) and crystal-system code (-1 = unknown).
+    Filters are evaluated with vectorized bit operations over all rows.
+    Writers (prefetch thread, offloaded tools) serialize on one lock; `select`
+    filters a snapshot of the columns taken under it.
+    """
+
+    def __init__(self, capacity: int = 256):
+        self._n = 0
+        self._masks = np.zeros((capacity, _MASK_WORDS), dtype=np.uint64)
+        self._space_group = np.zeros(capacity, dtype=np.int16)
+        self._crystal_system = np.full(capacity, -1, dtype=np.int8)
+        self._material_ids: List[str] = []
+        self._formulas: List[Optional[str]] = []
+        self._row_by_id: Dict[str, int] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return self._n
+
+    def __contains__(self, material_id: str) -> bool:
+        return material_id in self._row_by_id
+
+    def _grow(self, needed: int) -> None:
+        cap = len(self._space_group)
+        if needed <= cap:
+            return
+        new_cap = max(needed, 2 * cap)
+        self._masks = np.resize(self._masks, (new_cap, _MASK_WORDS))
+        self._space_group = np.resize(self._space_group, new_cap)
+        self._crystal_system = np.resize(self._crystal_system, new_cap)
+
+    def add(
+        self,
+        material_id: str,
+        elements: Iterable[str],
+        formula: Optional[str] = None,
+        space_group: Optional[int] = None,
+        crystal_system: Optional[str] = None,
+    ) -> int:
+        """Insert or update one phase, returning its row index."""
+        mask = element_mask(elements)
+        if crystal_system is None:
+            crystal_system = crystal_system_from_space_group(space_group)
+        with self._lock:
+            row = self._row_by_id.get(material_id)
+            if row is None:
+                self._grow(self._n + 1)
+                row = self._n
+                self._n += 1
+                self._material_ids.append(material_id)
+                self._formulas.append(formula)
+                self._row_by_id[material_id] = row
+            else:
+                self._formulas[row] = formula or self._formulas[row]
+
+            self._masks[row] = mask
+            self._space_group[row] = int(space_group) if space_group else 0
+            self._crystal_system[row] = _CRYSTAL_SYSTEM_INDEX.get(crystal_system, -1) if crystal_system else -1
+            return row
+
+    def add_docs(self, docs: Iterable[Any]) -> np.ndarray:
+        """Add MP summary docs (objects or dicts); returns their row indices."""
+        fields = [_doc_fields(doc) for doc in docs]
+        with self._lock:
+            rows = [self.add(f["material_id"], f["elements"], formula=f["formula"],
+                             space_group=f["space_group"], crystal_system=f["crystal_system"]) for f in fields]
+        return np.asarray(rows, dtype=np.intp)
+
+    def select(
+        self,
+        rows: Optional[np.ndarray] = None,
+        allowed_elements: Optional[Iterable[str]] = None,
+        required_elements: Optional[Iterable[str]] = None,
+        forbidden_elements: Optional[Iterable[str]] = None,
+        crystal_systems: Optional[Iterable[str]] = None,
+        space_groups: Optional[Iterable[int]] = None,
+    ) -> np.ndarray:
+        """
+        Return the row indices (subset of `rows`, default all) that satisfy every
+        given constraint:
+          - allowed_elements: phase contains no element outside this set,
+          - required_elements: phase contains all of these,
+          - forbidden_elements: phase contains none of these,
+          - crystal_systems / space_groups: symmetry must be one of these.
+        Rows with unknown symmetry are dropped when a symmetry filter is set.
+        """
+        with self._lock:
+            n, all_masks = self._n, self._masks
+            space_group, crystal_system = self._space_group, self._crystal_system
+        rows = np.arange(n, dtype=np.intp) if rows is None else np.asarray(rows, dtype=np.intp)
+        masks = all_masks[rows]
+        keep = np.ones(len(rows), dtype=bool)
+
+        if allowed_elements is not None:
+            outside = ~element_mask(allowed_elements)
+            keep &= ~np.any(masks & outside, axis=1)
+        if required_elements is not None:
+            req = element_mask(required_elements)
+            keep &= np.all((masks & req) == req, axis=1)
+        if forbidden_elements is not None:
+            keep &= ~np.any(masks & element_mask(forbidden_elements), axis=1)
+        if crystal_systems is not None:
+            codes = [_CRYSTAL_SYSTEM_INDEX[c.lower()] for c in crystal_systems if c.lower() in _CRYSTAL_SYSTEM_INDEX]
+            keep &= np.isin(crystal_system[rows], codes)
+        if space_groups is not None:
+            keep &= np.isin(space_group[rows], [int(s) for s in space_groups])
+
+        return rows[keep]
+
+    def row(self, index: int) -> Dict[str, Any]:
+        """Plain-dict view of a single row."""
+        with self._lock:
+            cs = int(self._crystal_system[index])
+            return {
+                "material_id": self._material_ids[index],
+                "formula": self._formulas[index],
+                "elements": mask_to_elements(self._masks[index]),
+                "space_group": int(self._space_group[index]) or None,
+                "crystal_system": CRYSTAL_SYSTEMS[cs] if cs >= 0 else None,
+            }
+
+    def material_ids(self, rows: np.ndarray) -> List[str]:
+        return [self._material_ids[i] for i in rows]
+
+
+# Process-wide library, filled as MP candidates are fetched.
+REFERENCE_LIBRARY = ReferenceLibrary()
@@ -0,0 +1,193 @@
+import hashlib
+import math
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# Matches pymatgen's XRDCalculator tolerances
+_G_MERGE_TOL = 1e-7          # Å^-1; reflections closer than this in 1/d are one line
+_SCALED_INTENSITY_TOL = 1e-3  # % of the strongest line
+# Build tables at least out to the Cu Kα limiting sphere so the common case never rebuilds
+_DEFAULT_G_MAX = 2.0 / 1.5406
+
+
+@dataclass
+class ReflectionTable:
+    """
+    Wavelength-independent reflection list of one structure.
+
+    One entry per distinct d-spacing (ascending g = 1/d): summed |F|² of all
+    reflections at that spacing, their count, and the hkl families with
+    multiplicities. Any wavelength / 2θ window is derived from it by
+    evaluating Bragg's law and the Lorentz-polarization factor.
+    """
+    g: np.ndarray
+    f2: np.ndarray
+    multiplicity: np.ndarray
+    hkls: List[List[Dict[str, Any]]]
+    g_max: float
+
+
+# least recently used tables beyond this many are dropped (prefetches build one per search result)
+MAX_CACHED_TABLES = 512
+_TABLE_CACHE: "OrderedDict[str, ReflectionTable]" = OrderedDict()
+_CACHE_LOCK = threading.Lock()
+
+
+def structure_hash(structure) -> str:
+    """Content hash of a pymatgen Structure (lattice, species, occupancies, positions)."""
+    h = hashlib.sha1()
+    h.update(np.round(structure.lattice.matrix, 6).tobytes())
+    for site in structure:
+        h.update(np.round(np.mod(site.frac_coords, 1.0), 6).tobytes())
+        for sp, occu in sorted(site.species.items(), key=lambda kv: str(kv[0])):
+            h.update(f"{sp}:{occu:.6f};".encode())
+    return h.hexdigest()
+
+
+def _unique_families(hkls: np.ndarray) -> List[Dict[str, Any]]:
+    """Group hkls that are permutations of each other (up to sign), as pymatgen does."""
+    families: Dict[tuple, List[tuple]] = {}
+    for hkl in map(tuple, hkls.tolist()):
+        families.setdefault(tuple(sorted(abs(i) for i in hkl)), []).append(hkl)
+    return [{"hkl": list(max(members)), "multiplicity": len(members)} for members in families.values()]
+
+
+def build_reflection_table(structure, g_max: float) -> ReflectionTable:
+    """Enumerate all reflections with 0 < 1/d <= g_max and compute their |F|²."""
+    from pymatgen.analysis.diffraction.xrd import ATOMIC_SCATTERING_PARAMS  # type: ignore
+
+    zs, coeffs, frac_coords, occus = [], [], [], []
+    for site in structure:
+        for sp, occu in site.species.items():
+            try:
+                coeffs.append(ATOMIC_SCATTERING_PARAMS[sp.symbol])
+            except KeyError:
+                raise ValueError(f"No atomic scattering coefficients for {sp.symbol}.")
+            zs.append(sp.Z)
+            frac_coords.append(site.frac_coords)
+            occus.append(occu)
+    zs = np.asarray(zs, dtype=float)
+    coeffs = np.asarray(coeffs, dtype=float)
+    frac_coords = np.asarray(frac_coords, dtype=float)
+    occus = np.asarray(occus, dtype=float)
+
+    # All integer hkl inside the sphere |g| <= g_max; |h| <= g_max * |a| bounds each index
+    recip = structure.lattice.reciprocal_lattice_crystallographic.matrix
+    bounds = np.ceil(g_max * np.linalg.norm(structure.lattice.matrix, axis=1)).astype(int)
+    grids = np.meshgrid(*(np.arange(-b, b + 1) for b in bounds), indexing="ij")
+    hkl = np.stack([g.ravel() for g in grids], axis=1)
+    g = np.linalg.norm(hkl @ recip, axis=1)
+    inside = (g > 0) & (g <= g_max)
+    hkl, g = hkl[inside], g[inside]
+
+    order = np.lexsort((-hkl[:, 2], -hkl[:, 1], -hkl[:, 0], g))
+    hkl, g = hkl[order], g[order]
+
+    # Atomic scattering factors f(s), s = 1 / 2d, for every (reflection, atom)
+    s2 = (g / 2.0) ** 2
+    fs = zs[None, :] - 41.78214 * s2[:, None] * np.sum(
+        coeffs[None, :, :, 0] * np.exp(-coeffs[None, :, :, 1] * s2[:, None, None]), axis=2
+    )
+    phase = np.exp(2j * np.pi * (hkl @ frac_coords.T))
+    f_hkl = np.sum(fs * occus[None, :] * phase, axis=1)
+    f2 = (f_hkl * f_hkl.conj()).real
+
+    # Merge reflections sharing a d-spacing
+    starts = np.flatnonzero(np.r_[True, np.diff(g) >= _G_MERGE_TOL])
+    ends = np.r_[starts[1:], len(g)]
+    return ReflectionTable(
+        g=g[starts],
+        f2=np.add.reduceat(f2, starts),
+        multiplicity=ends - starts,
+        hkls=[_unique_families(hkl[a:b]) for a, b in zip(starts, ends)],
+        g_max=float(g_max),
+    )
+
+
+def get_reflection_table(structure, g_max: float = _DEFAULT_G_MAX) -> ReflectionTable:
+    """Cached reflection table for `structure` covering at least 1/d <= g_max."""
+    key = structure_hash(structure)
+    with _CACHE_LOCK:
+        table = _TABLE_CACHE.get(key)
+        if table is not None:
+            _TABLE_CACHE.move_to_end(key)
+    if table is not None and table.g_max >= g_max:
+        return table
+    table = build_reflection_table(structure, max(g_max, _DEFAULT_G_MAX))
+    with _CACHE_LOCK:
+        current = _TABLE_CACHE.get(key)
+        if current is None or current.g_max < table.g_max:
+            _TABLE_CACHE[key] = table
+        _TABLE_CACHE.move_to_end(key)
+        while len(_TABLE_CACHE) > MAX_CACHED_TABLES:
+            _TABLE_CACHE.popitem(last=False)
+    return table
+
+
+def pattern_from_table(
+    table: ReflectionTable,
+    wavelength_angstrom: float,
+    two_theta_min: float = 0.0,
+    two_theta_max: float = 90.0,
+    scaled: bool = True,
+) -> Dict[str, Any]:
+    """
+    Evaluate Bragg angles and Lorentz-polarization weighted intensities for one
+    wavelength and 2θ window. Returns arrays two_theta, d_angstrom, intensity
+    (max = 100 if scaled) plus the per-line hkl families.
+    """
+    lam = float(wavelength_angstrom)
+    g_lo = 2.0 * math.sin(math.radians(two_theta_min / 2.0)) / lam
+    g_hi = 2.0 * math.sin(math.radians(min(two_theta_max, 180.0) / 2.0)) / lam
+    lo, hi = np.searchsorted(table.g, [g_lo, g_hi + 1e-12])
+    if g_lo <= 0:
+        lo = 0
+    g = table.g[lo:hi]
+
+    theta = np.arcsin(np.clip(lam * g / 2.0, -1.0, 1.0))
+    lorentz = (1 + np.cos(2 * theta) ** 2) / (np.sin(theta) ** 2 * np.cos(theta))
+    intensity = table.f2[lo:hi] * lorentz
+
+    idx = np.arange(lo, hi)
+    if len(intensity):
+        keep = intensity / intensity.max() * 100 > _SCALED_INTENSITY_TOL
+        idx, g, theta, intensity = idx[keep], g[keep], theta[keep], intensity[keep]
+        if scaled and len(intensity):
+            intensity = intensity / intensity.max() * 100.0
+
+    return {
+        "two_theta": np.degrees(2 * theta),
+        "d_angstrom": 1.0 / g,
+        "intensity": intensity,
+        "hkls": [table.hkls[i] for i in idx],
+    }
+
+
+def simulate_pattern(
+    structure,
+    wavelength_angstrom: float = 1.5406,
+    two_theta_min: float = 0.0,
+    two_theta_max: float = 90.0,
+    scaled: bool = True,
+) -> Dict[str, Any]:
+    """
+    Powder pattern of `structure`, equivalent to pymatgen's
+    XRDCalculator(wavelength).get_pattern(structure, two_theta_range=(min, max))
+    but computed from a cached reflection table.
+    """
+    g_needed = 2.0 * math.sin(math.radians(min(two_theta_max, 180.0) / 2.0)) / float(wavelength_angstrom)
+    table = get_reflection_table(structure, g_needed)
+    return pattern_from_table(table, wavelength_angstrom, two_theta_min, two_theta_max, scaled=scaled)
+
+
+def clear_reflection_cache(key: Optional[str] = None) -> None:
+    """Drop one cached table (by structure hash) or all of them."""
+    with _CACHE_LOCK:
+        if key is None:
+            _TABLE_CACHE.clear()
+        else:
+            _TABLE_CACHE.pop(key, None)
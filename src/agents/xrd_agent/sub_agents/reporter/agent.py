@@ -2,9 +2,12 @@ from google.adk.agents import Agent
 from google.adk.tools.agent_tool import AgentTool
 
 from src.schemas import schemas
+from src.agents.xrd_agent.checkpointing import checkpoint_stage, skip_completed_stage
 from src.agents.xrd_agent.sub_agents.reporter import prompts
 from src.agents.xrd_agent.sub_agents.reporter.tools.analyzer import get_results, save_analysis, save_results
 from src.agents.xrd_agent.sub_agents.reporter.tools.plotter import plot_results
+from src.agents.xrd_agent.sub_agents.reporter.tools.similarity_search import index_pattern, find_similar_patterns
+from src.agents.async_tools import offload
 
 analyzer_agent = Agent(
     model="gemini-2.5-flash",
@@ -23,11 +26,15 @@ reporter_agent = Agent(
     instruction=prompts.REPORTER_INSTR,
     tools=[
         AgentTool(agent=analyzer_agent),
-        save_results,
-        plot_results,
+        offload(save_results, kind="io"),
+        offload(plot_results),
+        offload(find_similar_patterns),
+        offload(index_pattern),
         ],
     output_schema=schemas.ReporterOutput,
     output_key="reporter_output",
+    before_agent_callback=skip_completed_stage,
+    after_agent_callback=checkpoint_stage,
 )
 
 # ------------- Testing -------------
@@ -27,8 +27,13 @@ Your job is to generate the final outputs for a given dataset by working with yo
    - It will generate a clear 1-2 paragraph analysis text and save it back into the data store as `analysis`.
 
 2. Once analysis is available, you must:
-   - Call the `save_results` tool to persist the complete XRD data store (including the analysis) as a JSON file.
+   - Call the `save_results` tool to persist the complete XRD data store (including the analysis) as a compact JSON file with an `.npz` array sidecar.
+   - Call `find_similar_patterns` to look up the most similar previously measured scans, then
+     `index_pattern` so this scan can be found by later runs. Call both before `plot_results`,
+     which advances the loop counter.
    - Call the `plot_results` tool to generate an interactive plot of the XRD pattern (raw, smoothed, corrected, peaks).
+     The static PNG is rendered with the fast raster backend by default. For intermediate optimizer
+     loops pass `static_backend="none"` (HTML only) or `defer_static=true` (PNG rendered in the background).
    - Ensure the plot and JSON report are saved into the same output folder.
 
 3. Return a structured report containing:
@@ -36,6 +41,7 @@ Your job is to generate the final outputs for a given dataset by working with yo
    - Sample name (if known),
    - Paths to the saved plot(s),
    - Path to the saved JSON report,
+   - The similar historical patterns returned by `find_similar_patterns` (if any),
    - A success flag and a short message describing what was done.
 
 Important notes:
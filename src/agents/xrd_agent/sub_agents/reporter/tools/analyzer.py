@@ -1,15 +1,17 @@
 import os
 import numpy as np
-import json
 from typing import Dict, Any
 from google.adk.tools import ToolContext
 from src.data_store.data_store import XRD_DATA_STORE
+from src.run_paths import current_run_paths
+from src.data_store.warehouse import get_warehouse
+from src.agents.xrd_agent.sub_agents.reporter.tools.report_io import write_report
 
 def get_results(payload: Dict[str, Any], tool_context: ToolContext) -> Dict[str, Any]:
     """
     Retrieve results (excluding raw/smooth/corrected arrays).
     """
-    path = os.path.abspath(payload["path"])
+    path = current_run_paths().resolve(payload["path"])
     loop_iter = tool_context.state.get("loop_iteration", 1)
     store = XRD_DATA_STORE[path]["loops"][loop_iter]
     if not store:
@@ -34,7 +36,7 @@ def save_analysis(payload: Dict[str, Any], tool_context: ToolContext) -> Dict[st
     """
     Save agent-generated analysis into XRD_DATA_STORE.
     """
-    path = os.path.abspath(payload["path"])
+    path = current_run_paths().resolve(payload["path"])
     loop_iter = tool_context.state.get("loop_iteration", 1)
     store = XRD_DATA_STORE[path]["loops"][loop_iter]
     if not store:
@@ -54,31 +56,24 @@ def save_analysis(payload: Dict[str, Any], tool_context: ToolContext) -> Dict[st
 
 def save_results(payload: Dict[str, Any], tool_context: ToolContext) -> Dict[str, Any]:
     """
-    Save the entire XRD data store for this path into a JSON file.
+    Save the XRD data store for this path as a compact JSON report, with the
+    intensity arrays in an `.npz` sidecar next to it (see report_io.load_report).
+    Optional: compress (default=False) to deflate the sidecar.
     """
-    path = os.path.abspath(payload["path"])
+    path = current_run_paths().resolve(payload["path"])
     loop_iter = tool_context.state.get("loop_iteration", 1)
     store = XRD_DATA_STORE[path]["loops"][loop_iter]
     if not store:
         return {"success": False, "message": f"No data found in XRD store for {path}"}
 
-    outdir = os.path.join(os.getcwd(), "xrd_outputs")
+    outdir = current_run_paths().outputs
     os.makedirs(outdir, exist_ok=True)
     base = store["meta"].get("sample_name", "sample")
     jpath = os.path.join(outdir, f"{base}_report_{loop_iter}.json")
 
-    clean_store = _safe_convert(store)
+    report = {"two_theta_deg": np.asarray(XRD_DATA_STORE[path]["two_theta_deg"]), **store}
+    jpath, npz_path = write_report(report, jpath, compress=bool(payload.get("compress", False)))
+    run_id = get_warehouse().record(path, loop_iter, store, report_path=jpath)
 
-    with open(jpath, "w") as f:
-        json.dump(clean_store, f, indent=2, default=str)
-
-    return {"success": True, "json_path": jpath, "message": f"Results saved to JSON for loop {loop_iter}."}
-
-def _safe_convert(obj):
-    if isinstance(obj, np.ndarray):
-        return obj.tolist()
-    if isinstance(obj, dict):
-        return {k: _safe_convert(v) for k, v in obj.items()}
-    if isinstance(obj, list):
-        return [_safe_convert(v) for v in obj]
-    return obj
\ No newline at end of file
+    return {"success": True, "json_path": jpath, "arrays_path": npz_path, "run_id": run_id,
+            "message": f"Results saved to JSON and results warehouse for loop {loop_iter}."}
@@ -0,0 +1,90 @@
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: indices of `n_out` points that best keep the
+    visual shape of (x, y). First and last points are always kept.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.intp)  # n_out - 2 inner buckets
+    # Mean of every bucket, used as the third triangle vertex for the bucket before it
+    sums_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1)
+    counts = np.diff(edges)
+    avg_x = np.append(sums_x / counts, x[-1])
+    avg_y = np.append(sums_y / counts, y[-1])
+
+    out = np.empty(n_out, dtype=np.intp)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for b in range(n_out - 2):
+        lo, hi = edges[b], edges[b + 1]
+        cx, cy = avg_x[b + 1], avg_y[b + 1]
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        out[b + 1] = a
+    return out
+
+
+def minmax_indices(y: np.ndarray, n_out: int) -> np.ndarray:
+    """Min/max envelope: the lowest and highest point of each of n_out/2 buckets."""
+    n = len(y)
+    if n_out >= n or n_out < 2:
+        return np.arange(n)
+
+    n_buckets = max(1, n_out // 2)
+    size = int(np.ceil(n / n_buckets))
+    padded = np.full(n_buckets * size, np.nan)
+    padded[:n] = y
+    blocks = padded.reshape(n_buckets, size)
+    valid = ~np.all(np.isnan(blocks), axis=1)
+    base = np.arange(n_buckets)[valid] * size
+    lo = base + np.nanargmin(blocks[valid], axis=1)
+    hi = base + np.nanargmax(blocks[valid], axis=1)
+    return np.unique(np.concatenate([[0, n - 1], lo, hi]))
+
+
+def decimate_trace(
+    x: np.ndarray,
+    y: np.ndarray,
+    max_points: int = 5000,
+    method: str = "lttb",
+    keep_x: Optional[Iterable[float]] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Reduce (x, y) to about `max_points` points for plotting.
+
+    `method` is "lttb", "minmax" or "none". The sample nearest to every value
+    in `keep_x` (e.g. fitted peak centers) is always kept, together with the
+    local maximum within two samples of it, so peak apexes survive decimation.
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if method == "none" or len(x) <= max_points:
+        return x, y
+
+    if method == "lttb":
+        idx = lttb_indices(x, y, max_points)
+    elif method == "minmax":
+        idx = minmax_indices(y, max_points)
+    else:
+        raise ValueError(f"Unknown decimation method '{method}'.")
+
+    if keep_x is not None:
+        keep_x = np.asarray(list(keep_x), dtype=float)
+        if keep_x.size:
+            order = np.argsort(x)
+            pos = np.clip(np.searchsorted(x[order], keep_x), 1, len(x) - 1)
+            left, right = order[pos - 1], order[pos]
+            nearest = np.where(np.abs(x[left] - keep_x) <= np.abs(x[right] - keep_x), left, right)
+            window = np.clip(nearest[:, None] + np.arange(-2, 3)[None, :], 0, len(x) - 1)
+            apex = window[np.arange(len(window)), np.argmax(y[window], axis=1)]
+            idx = np.union1d(idx, np.concatenate([nearest, apex]))
+
+    return x[idx], y[idx]
@@ -1,57 +1,168 @@
+import logging
 import os
 import re
+import threading
 import numpy as np
 import plotly.graph_objects as go
-from typing import Dict, Any
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import Dict, Any, List, Optional, Tuple
 from google.adk.tools import ToolContext
 from src.data_store.data_store import XRD_DATA_STORE
+from src.run_paths import current_run_paths
+from src.agents.xrd_agent.sub_agents.reporter.tools.decimate import decimate_trace
+
+logger = logging.getLogger(__name__)
+
+# Background PNG exports (static_backend rendering with defer_static=True);
+# an export leaves _PENDING_STATIC as soon as it finishes
+_STATIC_EXECUTOR: Optional[ThreadPoolExecutor] = None
+_PENDING_STATIC: Dict[str, Future] = {}
+_PENDING_LOCK = threading.Lock()
+
+
+def _static_executor() -> ThreadPoolExecutor:
+    global _STATIC_EXECUTOR
+    if _STATIC_EXECUTOR is None:
+        _STATIC_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="png-export")
+    return _STATIC_EXECUTOR
+
+
+def _render_png_agg(
+    png_path: str,
+    traces: List[Tuple[str, np.ndarray, np.ndarray]],
+    peaks_xy: Optional[Tuple[List[float], List[float]]],
+    title: str,
+) -> str:
+    """Rasterize the traces straight to PNG with matplotlib's Agg canvas (no browser, no pyplot state)."""
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    fig = Figure(figsize=(7, 5), dpi=200)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(111)
+    for name, x, y in traces:
+        ax.plot(x, y, linewidth=0.8, label=name)
+    if peaks_xy:
+        ax.plot(peaks_xy[0], peaks_xy[1], linestyle="none", marker="x", color="red", markersize=6, label="Peaks")
+    ax.set_title(title)
+    ax.set_xlabel("2θ (°)")
+    ax.set_ylabel("Intensity (a.u.)")
+    ax.grid(alpha=0.3)
+    ax.legend(loc="upper right", fontsize=8)
+    fig.tight_layout()
+    fig.savefig(png_path)
+    return png_path
+
+
+def _render_png_kaleido(fig: "go.Figure", png_path: str) -> str:
+    fig.write_image(png_path, scale=2)
+    return png_path
+
+
+def _static_export_done(png_path: str, fut: Future) -> None:
+    with _PENDING_LOCK:
+        if _PENDING_STATIC.get(png_path) is fut:
+            del _PENDING_STATIC[png_path]
+    if not fut.cancelled() and fut.exception() is not None:
+        logger.warning("Static export of %s failed: %s", png_path, fut.exception())
+
 
 def plot_results(payload: Dict[str, Any], tool_context: ToolContext) -> Dict[str, Any]:
     """
-    Generate interactive + static plots with Plotly.
+    Generate interactive + static plots.
+    Optional payload keys:
+      - static_backend: "agg" (default, matplotlib raster), "kaleido" (Plotly
+        image export via headless browser) or "none" (HTML only, e.g. for
+        intermediate optimizer loops),
+      - defer_static (default=False): render the PNG on a background worker
+        and return immediately; the path is reported under `deferred_figures`,
+      - max_points (default=5000): point budget per trace,
+      - decimation: "lttb" (default), "minmax" or "none". Fitted peak apexes
+        are always kept.
     """
-    path = os.path.abspath(payload["path"])
+    path = current_run_paths().resolve(payload["path"])
     loop_iter = tool_context.state.get("loop_iteration", 1)
     base_store = XRD_DATA_STORE[path]
     store = base_store["loops"][loop_iter]
     if not store:
         return {"success": False, "message": f"No data found in XRD store for {path}"}
 
-    theta = np.array(base_store["two_theta_deg"])
-    raw = np.array(base_store["intensity"])
-    smooth = np.array(store.get("intensity_smooth", raw))
-    corr = np.array(store.get("intensity_corr", smooth))
+    static_backend = str(payload.get("static_backend", "agg")).lower()
+    defer_static = bool(payload.get("defer_static", False))
+    if static_backend not in ("agg", "kaleido", "none"):
+        return {"success": False, "message": f"Unknown static_backend '{static_backend}'."}
+    max_points = int(payload.get("max_points", 5000))
+    decimation = str(payload.get("decimation", "lttb")).lower()
+
+    # read-only views of the stored arrays; nothing below modifies them
+    theta = np.asarray(base_store["two_theta_deg"])
+    raw = np.asarray(base_store["intensity"])
+    smooth = np.asarray(store.get("intensity_smooth", raw))
+    corr = np.asarray(store.get("intensity_corr", smooth))
     peaks = store.get("peaks", [])
     tmin, tmax = float(theta.min()), float(theta.max())
     peaks_in_range = [p for p in peaks if tmin <= float(p["two_theta"]) <= tmax]
+    peaks_xy = None
+    if peaks_in_range:
+        peaks_xy = (
+            [p["two_theta"] for p in peaks_in_range],
+            [float(corr[np.argmin(np.abs(theta - p["two_theta"]))]) for p in peaks_in_range],
+        )
+    title = f"XRD Pattern - {store['meta'].get('sample_name','Sample')}"
+
+    # Bound figure size regardless of scan length
+    keep = peaks_xy[0] if peaks_xy else None
+    traces = [
+        (name, *decimate_trace(theta, y, max_points=max_points, method=decimation, keep_x=keep))
+        for name, y in (("Raw", raw), ("Smoothed", smooth), ("Corrected", corr))
+    ]
 
     fig = go.Figure()
-    fig.add_trace(go.Scatter(x=theta, y=raw, mode="lines", name="Raw"))
-    fig.add_trace(go.Scatter(x=theta, y=smooth, mode="lines", name="Smoothed"))
-    fig.add_trace(go.Scatter(x=theta, y=corr, mode="lines", name="Corrected"))
-    if peaks_in_range:
+    for name, x, y in traces:
+        fig.add_trace(go.Scatter(x=x, y=y, mode="lines", name=name))
+    if peaks_xy:
         fig.add_trace(go.Scatter(
-            x=[p["two_theta"] for p in peaks_in_range],
-            y=[corr[np.argmin(np.abs(theta - p["two_theta"]))] for p in peaks_in_range],
+            x=peaks_xy[0],
+            y=peaks_xy[1],
             mode="markers", marker=dict(color="red", size=8, symbol="x"),
             name="Peaks"
         ))
     fig.update_layout(
-        title=f"XRD Pattern - {store['meta'].get('sample_name','Sample')}",
+        title=title,
         xaxis_title="2θ (°)",
         yaxis_title="Intensity (a.u.)",
         template="plotly_white"
     )
 
-    outdir = os.path.join(os.getcwd(), "xrd_outputs")
+    outdir = current_run_paths().outputs
     os.makedirs(outdir, exist_ok=True)
     base = store["meta"].get("sample_name", "sample")
     html_path = os.path.join(outdir, f"{base}_pattern_{loop_iter}.html")
     png_path = os.path.join(outdir, f"{base}_pattern_{loop_iter}.png")
     fig.write_html(html_path)
-    fig.write_image(png_path, scale=2)
+
+    figures = [html_path]
+    deferred = []
+    if static_backend != "none":
+        if static_backend == "agg":
+            render = partial(_render_png_agg, png_path, traces, peaks_xy, title)
+        else:
+            render = partial(_render_png_kaleido, fig, png_path)
+        if defer_static:
+            fut = _static_executor().submit(render)
+            with _PENDING_LOCK:
+                _PENDING_STATIC[png_path] = fut
+            fut.add_done_callback(partial(_static_export_done, png_path))
+            deferred.append(png_path)
+        else:
+            render()
+            figures.append(png_path)
 
     loop_iter += 1
     tool_context.state["loop_iteration"] = loop_iter
 
-    return {"success": True, "figures": [html_path, png_path], "message": f"Plots generated for loop {loop_iter}."}
+    result = {"success": True, "figures": figures, "message": f"Plots generated for loop {loop_iter}."}
+    if deferred:
+        result["deferred_figures"] = deferred
+    return result
@@ -0,0 +1,130 @@
+import json
+import os
+import zipfile
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+ARRAY_REF = "__array__"
+
+
+def _split_arrays(obj: Any, arrays: Dict[str, np.ndarray], prefix: str = "") -> Any:
+    """Replace every ndarray in a nested dict/list with a reference into `arrays`."""
+    if isinstance(obj, np.ndarray):
+        key = prefix or f"array_{len(arrays)}"
+        arrays[key] = obj
+        return {ARRAY_REF: key, "dtype": str(obj.dtype), "shape": list(obj.shape)}
+    if isinstance(obj, Mapping):
+        return {k: _split_arrays(v, arrays, f"{prefix}.{k}" if prefix else str(k)) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_split_arrays(v, arrays, f"{prefix}.{i}") for i, v in enumerate(obj)]
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return obj
+
+
+def _dump_json(obj: Any, path: str) -> None:
+    """Compact JSON, through orjson when it is installed."""
+    try:
+        import orjson  # type: ignore
+        data = orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+        with open(path, "wb") as f:
+            f.write(data)
+    except ImportError:
+        with open(path, "w") as f:
+            json.dump(obj, f, separators=(",", ":"), default=str)
+
+
+def write_report(obj: Dict[str, Any], json_path: str, compress: bool = False) -> Tuple[str, Optional[str]]:
+    """
+    Write `obj` as a compact JSON summary plus an `.npz` sidecar holding all
+    NumPy arrays. Arrays are replaced in the JSON by
+    {"__array__": key, "dtype": ..., "shape": ...}.
+
+    The sidecar is stored uncompressed by default so `load_report` can
+    memory-map each array; compress=True trades that for smaller files.
+    Returns (json_path, npz_path or None if there were no arrays).
+    """
+    arrays: Dict[str, np.ndarray] = {}
+    summary = _split_arrays(obj, arrays)
+    npz_path = None
+    if arrays:
+        npz_path = os.path.splitext(json_path)[0] + ".npz"
+        (np.savez_compressed if compress else np.savez)(npz_path, **arrays)
+        summary = {"arrays_file": os.path.basename(npz_path), **summary}
+    _dump_json(summary, json_path)
+    return json_path, npz_path
+
+
+class ReportArrays(Mapping):
+    """
+    Lazy read-only view of a report's `.npz` sidecar. Arrays are loaded on
+    first access; members stored uncompressed are memory-mapped straight
+    from the archive instead of being read into memory.
+    """
+
+    def __init__(self, npz_path: str, mmap: bool = True):
+        self.npz_path = npz_path
+        self.mmap = mmap
+        self._cache: Dict[str, np.ndarray] = {}
+        with zipfile.ZipFile(npz_path) as zf:
+            self._infos = {info.filename[:-4]: info for info in zf.infolist() if info.filename.endswith(".npy")}
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._infos)
+
+    def __len__(self) -> int:
+        return len(self._infos)
+
+    def __getitem__(self, key: str) -> np.ndarray:
+        if key in self._cache:
+            return self._cache[key]
+        info = self._infos[key]
+        if self.mmap and info.compress_type == zipfile.ZIP_STORED:
+            arr = self._memmap_member(info)
+        else:
+            with np.load(self.npz_path, allow_pickle=False) as npz:
+                arr = npz[key]
+        self._cache[key] = arr
+        return arr
+
+    def _memmap_member(self, info: zipfile.ZipInfo) -> np.ndarray:
+        with open(self.npz_path, "rb") as f:
+            # Local file header: 30 fixed bytes + file name + extra field
+            f.seek(info.header_offset + 26)
+            name_len, extra_len = np.frombuffer(f.read(4), dtype="<u2")
+            f.seek(info.header_offset + 30 + int(name_len) + int(extra_len))
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+            offset = f.tell()
+        if dtype.hasobject or int(np.prod(shape)) == 0:
+            with np.load(self.npz_path, allow_pickle=False) as npz:
+                return npz[info.filename[:-4]]
+        return np.memmap(self.npz_path, dtype=dtype, mode="r", offset=offset, shape=shape,
+                         order="F" if fortran else "C")
+
+
+def load_report(json_path: str, mmap: bool = True) -> Dict[str, Any]:
+    """
+    Read a report written by `write_report`. The JSON summary is returned as a
+    dict; array references stay in place and the arrays themselves are
+    available lazily under the "arrays" key (a ReportArrays mapping).
+    Legacy reports with inline lists load unchanged.
+    """
+    with open(json_path) as f:
+        summary = json.load(f)
+    arrays_file = summary.get("arrays_file")
+    if arrays_file:
+        summary["arrays"] = ReportArrays(os.path.join(os.path.dirname(json_path), arrays_file), mmap=mmap)
+    return summary
+
+
+def resolve_array(report: Dict[str, Any], ref: Any) -> Any:
+    """Turn an {"__array__": key} reference from a loaded report into its array."""
+    if isinstance(ref, dict) and ARRAY_REF in ref:
+        return report["arrays"][ref[ARRAY_REF]]
+    return ref
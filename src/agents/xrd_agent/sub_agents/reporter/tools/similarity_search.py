@@ -0,0 +1,60 @@
+import numpy as np
+from typing import Dict, Any
+from google.adk.tools import ToolContext
+from src.data_store.data_store import XRD_DATA_STORE
+from src.run_paths import current_run_paths
+from src.data_store.pattern_index import get_pattern_index
+
+
+def _pattern_key(path: str, loop_iter: int) -> str:
+    return f"{path}::{loop_iter}"
+
+
+def _corrected_pattern(path: str, loop_iter: int):
+    base_store = XRD_DATA_STORE[path]
+    store = base_store["loops"][loop_iter]
+    theta = np.asarray(base_store["two_theta_deg"])
+    y = store.get("intensity_corr", store.get("intensity_smooth", base_store["intensity"]))
+    return theta, np.asarray(y), store
+
+
+def index_pattern(payload: Dict[str, Any], tool_context: ToolContext) -> Dict[str, Any]:
+    """
+    Add the corrected pattern of this dataset/loop to the historical
+    pattern-fingerprint index so later scans can find it with `find_similar_patterns`.
+    Optional: loop (default=current loop).
+    """
+    try:
+        path = current_run_paths().resolve(payload["path"])
+        loop_iter = int(payload.get("loop", tool_context.state.get("loop_iteration", 1)))
+        theta, y, store = _corrected_pattern(path, loop_iter)
+        meta = store.get("meta", {})
+        n = get_pattern_index().add(
+            _pattern_key(path, loop_iter), theta, y,
+            meta={"path": path, "loop": loop_iter, "sample_name": meta.get("sample_name"),
+                  "material_id": store.get("mp_identifier")},
+        )
+        return {"success": True, "path": path, "n_indexed": n,
+                "message": f"Indexed pattern for loop {loop_iter} ({n} patterns in index)."}
+    except Exception as e:
+        return {"success": False, "path": payload.get("path"), "message": f"Failed: {str(e)}"}
+
+
+def find_similar_patterns(payload: Dict[str, Any], tool_context: ToolContext) -> Dict[str, Any]:
+    """
+    Nearest historical scans to this dataset's corrected pattern (cosine
+    similarity of fingerprints, 1 = identical shape). The dataset itself is excluded.
+    Optional: k (default=5), loop (default=current loop).
+    """
+    try:
+        path = current_run_paths().resolve(payload["path"])
+        loop_iter = int(payload.get("loop", tool_context.state.get("loop_iteration", 1)))
+        k = int(payload.get("k", 5))
+        theta, y, _ = _corrected_pattern(path, loop_iter)
+        matches = get_pattern_index().search(theta, y, k=k, exclude_key=_pattern_key(path, loop_iter))
+        for m in matches:
+            m.pop("key", None)
+        return {"success": True, "path": path, "matches": matches,
+                "message": f"Found {len(matches)} similar historical patterns."}
+    except Exception as e:
+        return {"success": False, "path": payload.get("path"), "matches": [], "message": f"Failed: {str(e)}"}
@@ -2,17 +2,21 @@ from google.adk.agents import Agent
 from google.adk.tools.agent_tool import AgentTool
 
 from src.schemas import schemas
+from src.agents.xrd_agent.checkpointing import checkpoint_stage, skip_completed_stage
 from src.agents.xrd_agent.sub_agents.scherrer_and_wh import prompts
 from src.agents.xrd_agent.sub_agents.scherrer_and_wh.tools import scherrer_and_wh
+from src.agents.async_tools import offload
 
 scherrer_and_wh_agent = Agent(
     model="gemini-2.5-flash",
     name="scherrer_and_wh_agent",
     description="This agent calculates the Scherrer and Williamson-Hall parameters.",
     instruction=prompts.SCHERRER_AND_WH_INSTR,
-    tools=[scherrer_and_wh],
+    tools=[offload(scherrer_and_wh)],
     output_schema=schemas.ScherrerAndWHOutput,
     output_key="scherrer_and_wh_output",
+    before_agent_callback=skip_completed_stage,
+    after_agent_callback=checkpoint_stage,
 )
 
 
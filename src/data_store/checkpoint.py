@@ -0,0 +1,314 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from src.data_store.data_store import StoreNode, XRDDataStore, _content_hash
+from src.run_paths import current_run_paths
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    input TEXT,
+    options_json TEXT,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS stages (
+    run_id TEXT NOT NULL REFERENCES runs(run_id),
+    stage TEXT NOT NULL,
+    completed_at REAL NOT NULL,
+    PRIMARY KEY (run_id, stage)
+);
+CREATE TABLE IF NOT EXISTS session_state (
+    run_id TEXT PRIMARY KEY REFERENCES runs(run_id),
+    state_json TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    run_id TEXT NOT NULL REFERENCES runs(run_id),
+    path TEXT NOT NULL,
+    loop INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    value_json TEXT,
+    array_hash TEXT,
+    PRIMARY KEY (run_id, path, loop, key)
+);
+"""
+
+# loop number used for the base entry (raw arrays and meta)
+_BASE = -1
+_SKIP = object()
+
+
+def _json_value(v: Any) -> Any:
+    """JSON-compatible copy of v; values that cannot be represented are dropped (_SKIP)."""
+    if isinstance(v, (str, bool, type(None))):
+        return v
+    if isinstance(v, (int, float, np.integer, np.floating)):
+        return v.item() if isinstance(v, np.generic) else v
+    if isinstance(v, dict) or isinstance(v, StoreNode):
+        out = {}
+        for k, x in v.items():
+            x = _json_value(x)
+            if x is not _SKIP:
+                out[str(k)] = x
+        return out
+    if isinstance(v, (list, tuple)):
+        return [x for x in (_json_value(x) for x in v) if x is not _SKIP]
+    if isinstance(v, np.ndarray) and v.size <= 64:
+        # small arrays nested in results (e.g. fit covariances)
+        return v.tolist()
+    return _SKIP
+
+
+class CheckpointStore:
+    """
+    Durable checkpoints of agent runs: SQLite holds run status, completed
+    stages, the session state and every non-array value of the run's store
+    entries; arrays go to content-addressed .npy files (written once, shared
+    by all runs and loops holding the same data) and are memory-mapped back
+    on restore. Array files no entry refers to any more are swept by
+    `collect_garbage`; `prune` applies the retention policy to finished runs.
+    """
+
+    def __init__(self, directory: str, retention_s: Optional[float] = None, max_runs: Optional[int] = None,
+                 gc_grace_s: float = 600.0):
+        self.directory = directory
+        self.db_path = os.path.join(directory, "checkpoints.sqlite")
+        self.array_dir = os.path.join(directory, "arrays")
+        self.retention_s = retention_s
+        self.max_runs = max_runs
+        self.gc_grace_s = float(gc_grace_s)
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    @contextmanager
+    def _connect(self):
+        os.makedirs(self.array_dir, exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._initialized = True
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    # --- runs ----------------------------------------------------------------
+    def start_run(self, run_id: str, user_input: Optional[str] = None, options: Optional[Dict[str, Any]] = None) -> None:
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT INTO runs (run_id, input, options_json, status, created_at, updated_at) VALUES (?, ?, ?, 'running', ?, ?)"
+                " ON CONFLICT(run_id) DO UPDATE SET status='running', updated_at=excluded.updated_at",
+                (run_id, user_input, json.dumps(options, default=str), now, now),
+            )
+
+    def set_status(self, run_id: str, status: str) -> None:
+        with self._lock, self._connect() as conn:
+            conn.execute("UPDATE runs SET status=?, updated_at=? WHERE run_id=?", (status, time.time(), run_id))
+
+    def runs(self) -> List[Dict[str, Any]]:
+        """All checkpointed runs, newest first, with their completed stages."""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT * FROM runs ORDER BY created_at DESC").fetchall()
+            stages = conn.execute("SELECT run_id, stage FROM stages ORDER BY completed_at").fetchall()
+        by_run: Dict[str, List[str]] = {}
+        for s in stages:
+            by_run.setdefault(s["run_id"], []).append(s["stage"])
+        return [{
+            "run_id": r["run_id"],
+            "input": r["input"],
+            "options": json.loads(r["options_json"]) if r["options_json"] else None,
+            "status": r["status"],
+            "created_at": r["created_at"],
+            "updated_at": r["updated_at"],
+            "completed_stages": by_run.get(r["run_id"], []),
+        } for r in rows]
+
+    # --- saving ----------------------------------------------------------------
+    def _write_array(self, node: StoreNode, key: Any) -> str:
+        digest = node.digest(key)
+        array = node[key]
+        digest = (digest or _content_hash(np.ascontiguousarray(array))).hex()
+        path = os.path.join(self.array_dir, f"{digest}.npy")
+        try:
+            # a reused file counts as freshly written, so a concurrent sweep leaves it alone
+            os.utime(path)
+        except FileNotFoundError:
+            # write then rename, so a crash never leaves a truncated array behind
+            tmp = os.path.join(self.array_dir, f".{digest}.{os.getpid()}.{threading.get_ident()}.npy")
+            np.save(tmp, np.ascontiguousarray(array))
+            os.replace(tmp, path)
+        return digest
+
+    def _rows(self, run_id: str, path: str, loop: int, node: StoreNode) -> List[tuple]:
+        rows = []
+        for key in node:
+            if loop == _BASE and key == "loops":
+                continue
+            value = node[key]
+            if isinstance(value, np.ndarray):
+                rows.append((run_id, path, loop, str(key), None, self._write_array(node, key)))
+                continue
+            value = _json_value(value)
+            if value is not _SKIP:
+                rows.append((run_id, path, loop, str(key), json.dumps(value), None))
+        return rows
+
+    def save(self, run_id: str, store: XRDDataStore, state: Optional[Dict[str, Any]] = None,
+             stage: Optional[str] = None) -> None:
+        """
+        Persist the run's store entries and session state, and mark `stage`
+        completed. Unchanged arrays are not rewritten (content addressing).
+        """
+        os.makedirs(self.array_dir, exist_ok=True)
+        rows = []
+        for path in store:
+            entry = store[path]
+            rows += self._rows(run_id, path, _BASE, entry)
+            for loop, loop_data in (entry.get("loops") or {}).items():
+                rows += self._rows(run_id, path, int(loop), loop_data)
+        state_json = json.dumps(_json_value(dict(state or {})))
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT INTO runs (run_id, status, created_at, updated_at) VALUES (?, 'running', ?, ?)"
+                " ON CONFLICT(run_id) DO UPDATE SET updated_at=excluded.updated_at",
+                (run_id, now, now),
+            )
+            conn.execute("DELETE FROM entries WHERE run_id=?", (run_id,))
+            conn.executemany(
+                "INSERT INTO entries (run_id, path, loop, key, value_json, array_hash) VALUES (?, ?, ?, ?, ?, ?)", rows,
+            )
+            conn.execute(
+                "INSERT INTO session_state (run_id, state_json) VALUES (?, ?)"
+                " ON CONFLICT(run_id) DO UPDATE SET state_json=excluded.state_json",
+                (run_id, state_json),
+            )
+            if stage:
+                conn.execute("INSERT OR REPLACE INTO stages (run_id, stage, completed_at) VALUES (?, ?, ?)",
+                             (run_id, stage, now))
+
+    # --- restoring -------------------------------------------------------------
+    def restore(self, run_id: str, store: XRDDataStore) -> Optional[Dict[str, Any]]:
+        """
+        Rebuild the run's entries in `store` (arrays memory-mapped read-only)
+        and return {"state", "completed_stages", "status"}, or None if unknown.
+        """
+        with self._connect() as conn:
+            run = conn.execute("SELECT status FROM runs WHERE run_id=?", (run_id,)).fetchone()
+            if run is None:
+                return None
+            rows = conn.execute("SELECT path, loop, key, value_json, array_hash FROM entries WHERE run_id=?",
+                                (run_id,)).fetchall()
+            state = conn.execute("SELECT state_json FROM session_state WHERE run_id=?", (run_id,)).fetchone()
+            stages = conn.execute("SELECT stage FROM stages WHERE run_id=? ORDER BY completed_at", (run_id,)).fetchall()
+
+        entries: Dict[str, Dict[int, Dict[str, Any]]] = {}
+        for r in rows:
+            if r["array_hash"]:
+                value = np.load(os.path.join(self.array_dir, f"{r['array_hash']}.npy"), mmap_mode="r")
+            else:
+                value = json.loads(r["value_json"])
+            entries.setdefault(r["path"], {}).setdefault(r["loop"], {})[r["key"]] = value
+        for path, loops in entries.items():
+            base = loops.pop(_BASE, {})
+            base["loops"] = {loop: data for loop, data in sorted(loops.items())}
+            store[path] = base
+        return {
+            "state": json.loads(state["state_json"]) if state else {},
+            "completed_stages": [s["stage"] for s in stages],
+            "status": run["status"],
+        }
+
+    # --- cleanup -------------------------------------------------------------
+    def _forget(self, run_ids: List[str]) -> None:
+        with self._lock, self._connect() as conn:
+            for table in ("entries", "stages", "session_state", "runs"):
+                conn.executemany(f"DELETE FROM {table} WHERE run_id=?", [(r,) for r in run_ids])
+
+    def delete(self, run_id: str) -> None:
+        """Forget a run and remove the array files no other run shares."""
+        self._forget([run_id])
+        self.collect_garbage()
+
+    def collect_garbage(self, grace_s: Optional[float] = None) -> int:
+        """
+        Mark and sweep: remove the array files (and leftover temporary files)
+        that no entry refers to. Files touched within grace_s are kept, since
+        a save writes its arrays before the entries that reference them.
+        Returns the number of files removed.
+        """
+        cutoff = time.time() - (self.gc_grace_s if grace_s is None else float(grace_s))
+        removed = 0
+        with self._lock, self._connect() as conn:
+            live = {r[0] for r in conn.execute("SELECT DISTINCT array_hash FROM entries WHERE array_hash IS NOT NULL")}
+            for name in os.listdir(self.array_dir):
+                if not name.startswith(".") and name[:-len(".npy")] in live:
+                    continue
+                path = os.path.join(self.array_dir, name)
+                try:
+                    if os.path.getmtime(path) <= cutoff:
+                        os.remove(path)
+                        removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
+
+    def prune(self, max_age_s: Optional[float] = None, max_runs: Optional[int] = None) -> List[str]:
+        """
+        Retention policy: forget finished runs (every status but "running")
+        last updated more than max_age_s ago, and all but the newest max_runs
+        of them (defaults: the store's retention_s / max_runs; None keeps
+        all), then sweep unreferenced arrays. Returns the forgotten run ids.
+        """
+        max_age_s = self.retention_s if max_age_s is None else max_age_s
+        max_runs = self.max_runs if max_runs is None else max_runs
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT run_id, updated_at FROM runs WHERE status != 'running' ORDER BY updated_at DESC"
+            ).fetchall()
+        now = time.time()
+        expired = [
+            r["run_id"] for i, r in enumerate(rows)
+            if (max_runs is not None and i >= max_runs) or (max_age_s is not None and now - r["updated_at"] > max_age_s)
+        ]
+        if expired:
+            self._forget(expired)
+        self.collect_garbage()
+        return expired
+
+
+_CHECKPOINTS: Optional[CheckpointStore] = None
+
+
+def get_checkpoint_store() -> Optional[CheckpointStore]:
+    """
+    Process-wide checkpoint store at XRD_CHECKPOINT_DIR (default checkpoints/
+    in the run's outputs); None when XRD_CHECKPOINTS=0. Finished runs are
+    kept XRD_CHECKPOINT_RETENTION_DAYS (default 30, 0 = forever), at most
+    XRD_CHECKPOINT_MAX_RUNS of them if set.
+    """
+    global _CHECKPOINTS
+    if os.getenv("XRD_CHECKPOINTS", "1").lower() in ("0", "false", "no"):
+        return None
+    directory = os.getenv("XRD_CHECKPOINT_DIR") or current_run_paths().output("checkpoints")
+    if _CHECKPOINTS is None or _CHECKPOINTS.directory != directory:
+        retention_days = float(os.getenv("XRD_CHECKPOINT_RETENTION_DAYS", "30"))
+        max_runs = os.getenv("XRD_CHECKPOINT_MAX_RUNS")
+        _CHECKPOINTS = CheckpointStore(
+            directory,
+            retention_s=retention_days * 86400 if retention_days > 0 else None,
+            max_runs=int(max_runs) if max_runs else None,
+        )
+    return _CHECKPOINTS
@@ -1 +1,471 @@
-XRD_DATA_STORE = {}
\ No newline at end of file
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+from collections.abc import Mapping, MutableMapping
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from src.run_paths import current_run_paths
+
+
+def canonical_key(path: Any) -> str:
+    """
+    Store key of a dataset path: absolute (relative paths are taken from the
+    current run's root), symlinks resolved, case-normalized where the OS is.
+    """
+    return os.path.normcase(os.path.realpath(current_run_paths().resolve(path)))
+
+
+def _writable_base(array: np.ndarray) -> bool:
+    """Whether the memory behind a view can still be written through another array or buffer."""
+    base = array.base
+    while isinstance(base, np.ndarray):
+        if base.flags.writeable:
+            return True
+        base = base.base
+    return base is not None and array.flags.writeable
+
+
+def _freeze(array: np.ndarray) -> np.ndarray:
+    """
+    Make a stored array immutable, copying only when needed: arrays that own
+    their data just get their write flag cleared; non-contiguous arrays and
+    views of writable memory (e.g. `df[col].to_numpy()`) are copied once.
+    """
+    if not array.flags.c_contiguous or _writable_base(array):
+        array = np.array(array, order="C")
+    array.flags.writeable = False
+    return array
+
+
+def _content_hash(array: np.ndarray) -> bytes:
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{array.dtype.str}{array.shape}".encode())
+    h.update(memoryview(array).cast("B"))
+    return h.digest()
+
+
+class _ArraySlot:
+    """
+    One stored ndarray, shared by every node holding identical content. It is
+    either resident (in process memory), or spilled to a .npy file and mapped
+    back read-only on the next access. The spill file is removed when the slot
+    is garbage collected.
+    """
+
+    __slots__ = ("array", "file", "nbytes", "resident", "digest", "refs", "__weakref__")
+
+    def __init__(self, array: np.ndarray, digest: bytes):
+        self.array = array
+        self.file: Optional[str] = None
+        self.nbytes = int(array.nbytes)
+        self.resident = True
+        self.digest = digest
+        self.refs = 1
+
+    def spill(self, directory: str) -> None:
+        if self.file is None:
+            self.file = os.path.join(directory, f"{uuid.uuid4().hex}.npy")
+            np.save(self.file, self.array)
+            weakref.finalize(self, _remove_file, self.file)
+        # file-backed pages can be dropped by the OS, so they do not count as resident
+        self.array = None
+        self.resident = False
+
+    def get(self) -> np.ndarray:
+        if self.array is None:
+            self.array = np.load(self.file, mmap_mode="r")
+        return self.array
+
+
+def _remove_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class StoreNode(MutableMapping):
+    """
+    Dict-like node of the store. ndarrays put into a node become read-only,
+    are deduplicated by content, accounted for and may be spilled to disk;
+    reads return the stored array itself (no copy). Stages that need to modify
+    an array must copy it first. Entries, their
+    `loops` mapping and each loop's dict are nodes; anything below that (meta,
+    peaks, diagnostics, ...) stays plain Python data.
+    """
+
+    def __init__(self, store: "XRDDataStore", kind: str, data: Optional[Mapping] = None):
+        self._store = store
+        self._kind = kind
+        self._data: Dict[Any, Any] = {}
+        for k, v in (data or {}).items():
+            self[k] = v
+
+    def _child_kind(self, key: Any) -> Optional[str]:
+        if self._kind == "entry" and key == "loops":
+            return "loops"
+        if self._kind == "loops":
+            return "loop"
+        return None
+
+    def __getitem__(self, key: Any) -> Any:
+        value = self._data[key]
+        if isinstance(value, _ArraySlot):
+            return self._store._touch(value)
+        return value
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        kind = self._child_kind(key)
+        if isinstance(value, np.ndarray) and not isinstance(value, np.memmap):
+            value = self._store._register(value)
+        elif kind is not None and isinstance(value, Mapping) and not isinstance(value, StoreNode):
+            value = StoreNode(self._store, kind, value)
+        old = self._data.get(key)
+        self._data[key] = value
+        # identical content resolves to the slot already stored here, which _register has referenced again
+        if old is not None and (old is not value or isinstance(value, _ArraySlot)):
+            self._store._release(old)
+        self._store._enforce_budget()
+
+    def __delitem__(self, key: Any) -> None:
+        self._store._release(self._data.pop(key))
+
+    def __iter__(self) -> Iterator:
+        return iter(self._data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self._data
+
+    def __repr__(self) -> str:
+        return f"StoreNode({self._kind}, keys={list(self._data)})"
+
+    def setdefault(self, key: Any, default: Any = None) -> Any:
+        if key not in self._data:
+            self[key] = default
+        return self[key]
+
+    def digest(self, key: Any) -> Optional[bytes]:
+        """Content hash of a stored array (None for other values)."""
+        value = self._data[key]
+        return value.digest if isinstance(value, _ArraySlot) else None
+
+    def slots(self) -> Iterator[_ArraySlot]:
+        for value in self._data.values():
+            if isinstance(value, _ArraySlot):
+                yield value
+            elif isinstance(value, StoreNode):
+                yield from value.slots()
+
+    def to_dict(self) -> Dict[Any, Any]:
+        """Plain nested dict copy (arrays are loaded)."""
+        return {k: v.to_dict() if isinstance(v, StoreNode) else self[k] for k, v in self._data.items()}
+
+
+class XRDDataStore(MutableMapping):
+    """
+    Store of loaded patterns and per-loop results, keyed by canonical path
+    (`canonical_key`), so raw and absolute spellings of a path hit the same entry.
+
+    Behaves like the plain dict it replaces (`store[path]["loops"][loop]["intensity_corr"]`),
+    but keeps the ndarrays it holds within `memory_budget_bytes`: when the
+    budget is exceeded, the least recently used arrays of at least
+    `min_spill_bytes` are written to `spill_dir` and memory-mapped back
+    read-only when next accessed. Identical arrays (same dtype, shape and
+    bytes) are stored once; deleting or overwriting an entry drops its
+    references, and arrays no longer referenced are freed with their spill files.
+    """
+
+    def __init__(self, memory_budget_bytes: int = 512 << 20, spill_dir: Optional[str] = None,
+                 min_spill_bytes: int = 16 << 10):
+        self.memory_budget_bytes = int(memory_budget_bytes)
+        self.min_spill_bytes = int(min_spill_bytes)
+        self._spill_root = spill_dir
+        self._spill_dir: Optional[str] = None
+        self._entries: Dict[str, StoreNode] = {}
+        self._lru: "OrderedDict[int, _ArraySlot]" = OrderedDict()
+        self._by_hash: Dict[bytes, _ArraySlot] = {}
+        self._resident_bytes = 0
+        self._lock = threading.RLock()
+
+    # --- mapping interface -------------------------------------------------
+    def __getitem__(self, key: str) -> StoreNode:
+        return self._entries[canonical_key(key)]
+
+    def __setitem__(self, key: str, value: Mapping) -> None:
+        key = canonical_key(key)
+        node = value if isinstance(value, StoreNode) else StoreNode(self, "entry", value)
+        with self._lock:
+            old = self._entries.get(key)
+            self._entries[key] = node
+            if old is not None and old is not node:
+                self._release(old)
+
+    def __delitem__(self, key: str) -> None:
+        with self._lock:
+            self._release(self._entries.pop(canonical_key(key)))
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._entries))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Any) -> bool:
+        return canonical_key(key) in self._entries
+
+    # --- accounting --------------------------------------------------------
+    def _register(self, array: np.ndarray) -> _ArraySlot:
+        array = _freeze(array)
+        digest = _content_hash(array)
+        with self._lock:
+            slot = self._by_hash.get(digest)
+            if slot is not None:
+                slot.refs += 1
+                self._lru.move_to_end(id(slot))
+                return slot
+            slot = _ArraySlot(array, digest)
+            self._by_hash[digest] = slot
+            self._lru[id(slot)] = slot
+            self._resident_bytes += slot.nbytes
+        return slot
+
+    def _touch(self, slot: _ArraySlot) -> np.ndarray:
+        with self._lock:
+            if id(slot) in self._lru:
+                self._lru.move_to_end(id(slot))
+            return slot.get()
+
+    def _release(self, value: Any) -> None:
+        slots = [value] if isinstance(value, _ArraySlot) else list(value.slots()) if isinstance(value, StoreNode) else []
+        with self._lock:
+            for slot in slots:
+                slot.refs -= 1
+                if slot.refs > 0 or self._lru.pop(id(slot), None) is None:
+                    continue
+                self._by_hash.pop(slot.digest, None)
+                if slot.resident:
+                    self._resident_bytes -= slot.nbytes
+
+    def _enforce_budget(self) -> None:
+        with self._lock:
+            if self._resident_bytes <= self.memory_budget_bytes:
+                return
+            for slot in list(self._lru.values()):
+                if self._resident_bytes <= self.memory_budget_bytes:
+                    break
+                if slot.resident and slot.nbytes >= self.min_spill_bytes:
+                    slot.spill(self._ensure_spill_dir())
+                    self._resident_bytes -= slot.nbytes
+
+    def _ensure_spill_dir(self) -> str:
+        if self._spill_dir is None:
+            root = self._spill_root or tempfile.gettempdir()
+            os.makedirs(root, exist_ok=True)
+            self._spill_dir = tempfile.mkdtemp(prefix="xrd_store_", dir=root)
+            weakref.finalize(self, shutil.rmtree, self._spill_dir, True)
+        return self._spill_dir
+
+    def spill(self, key: Optional[str] = None) -> int:
+        """Spill every resident array (of one entry, or all); returns the bytes freed."""
+        freed = 0
+        with self._lock:
+            nodes = [self[key]] if key is not None else list(self._entries.values())
+            for node in nodes:
+                for slot in node.slots():
+                    if slot.resident and id(slot) in self._lru:
+                        slot.spill(self._ensure_spill_dir())
+                        self._resident_bytes -= slot.nbytes
+                        freed += slot.nbytes
+        return freed
+
+    def entry_size(self, key: str) -> Dict[str, int]:
+        """Resident and spilled array bytes of one entry (shared arrays count for every entry holding them)."""
+        resident = spilled = 0
+        for slot in self[key].slots():
+            if slot.resident:
+                resident += slot.nbytes
+            else:
+                spilled += slot.nbytes
+        return {"resident_bytes": resident, "spilled_bytes": spilled}
+
+    def memory_usage(self) -> Dict[str, Any]:
+        """Store-wide accounting plus per-entry sizes."""
+        with self._lock:
+            entries = {key: self.entry_size(key) for key in self._entries}
+            return {
+                "budget_bytes": self.memory_budget_bytes,
+                "resident_bytes": self._resident_bytes,
+                "spilled_bytes": sum(e["spilled_bytes"] for e in entries.values()),
+                "n_arrays": len(self._lru),
+                "entries": entries,
+            }
+
+
+DEFAULT_NAMESPACE = "default"
+
+
+class NamespacedDataStore(MutableMapping):
+    """
+    XRD_DATA_STORE: one XRDDataStore per session/run namespace.
+
+    The mapping interface acts on the namespace active in the current context
+    (see `namespace`), so tools keep using `XRD_DATA_STORE[path]` while two
+    runs on the same file never see each other's entries. Each namespace has
+    its own lock and memory quota (its store's budget); the default namespace,
+    used outside of any run, gets the process-wide budget. A namespace whose
+    run has ended is dropped `ttl_s` seconds later, which leaves time for
+    viewers to fetch its traces.
+    """
+
+    def __init__(self, default_budget_bytes: int = 512 << 20, session_quota_bytes: int = 256 << 20,
+                 spill_dir: Optional[str] = None, min_spill_bytes: int = 16 << 10, ttl_s: float = 600.0):
+        self.session_quota_bytes = int(session_quota_bytes)
+        self.ttl_s = float(ttl_s)
+        self._store_kwargs = {"spill_dir": spill_dir, "min_spill_bytes": int(min_spill_bytes)}
+        self._namespaces: Dict[str, XRDDataStore] = {
+            DEFAULT_NAMESPACE: XRDDataStore(int(default_budget_bytes), **self._store_kwargs),
+        }
+        self._ended: Dict[str, float] = {}
+        self._drop_callbacks: List[Callable[[str], None]] = []
+        self._current: ContextVar[str] = ContextVar("xrd_store_namespace", default=DEFAULT_NAMESPACE)
+        self._lock = threading.Lock()
+
+    # --- namespaces --------------------------------------------------------
+    def current(self) -> XRDDataStore:
+        """Store of the namespace active in this context."""
+        return self.get_namespace(self._current.get(), create=True)
+
+    def current_name(self) -> str:
+        return self._current.get()
+
+    def get_namespace(self, name: str, create: bool = False, quota_bytes: Optional[int] = None) -> Optional[XRDDataStore]:
+        with self._lock:
+            store = self._namespaces.get(name)
+            if store is None and create:
+                store = XRDDataStore(int(quota_bytes or self.session_quota_bytes), **self._store_kwargs)
+                self._namespaces[name] = store
+            return store
+
+    @contextmanager
+    def namespace(self, name: str, quota_bytes: Optional[int] = None, end_on_exit: bool = True):
+        """
+        Make `name` the active namespace for the enclosed code (and the tasks
+        it starts). With end_on_exit the namespace expires `ttl_s` after the block.
+        """
+        self._expire()
+        store = self.get_namespace(name, create=True, quota_bytes=quota_bytes)
+        with self._lock:
+            self._ended.pop(name, None)
+        token = self._current.set(name)
+        try:
+            yield store
+        finally:
+            try:
+                self._current.reset(token)
+            except ValueError:
+                # generator finalized from another context; nothing to restore there
+                pass
+            if end_on_exit and name != DEFAULT_NAMESPACE:
+                self.end_namespace(name)
+
+    def end_namespace(self, name: str) -> None:
+        """Mark a run as finished; its namespace is dropped after `ttl_s` (immediately if ttl_s <= 0)."""
+        with self._lock:
+            self._ended[name] = time.monotonic()
+        self._expire()
+
+    def drop_namespace(self, name: str) -> None:
+        """Free every entry of a namespace right away."""
+        with self._lock:
+            store = self._namespaces.pop(name, None) if name != DEFAULT_NAMESPACE else None
+            self._ended.pop(name, None)
+        if store is not None:
+            store.clear()
+            for callback in self._drop_callbacks:
+                callback(name)
+
+    def namespace_keys(self, names: Optional[Iterable[str]] = None) -> Dict[str, List[str]]:
+        """Dataset keys of each live namespace (or of `names` only), for cross-run listings."""
+        self._expire()
+        wanted = None if names is None else set(names)
+        with self._lock:
+            stores = {n: s for n, s in self._namespaces.items() if wanted is None or n in wanted}
+        return {name: list(store.keys()) for name, store in stores.items()}
+
+    def on_drop(self, callback: Callable[[str], None]) -> None:
+        """Register `callback(namespace)` to run when a namespace is dropped (e.g. to free caches)."""
+        self._drop_callbacks.append(callback)
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            expired = [n for n, t in self._ended.items() if now - t >= self.ttl_s]
+        for name in expired:
+            self.drop_namespace(name)
+
+    # --- mapping interface (current namespace) ----------------------------
+    def __getitem__(self, key: str) -> StoreNode:
+        return self.current()[key]
+
+    def __setitem__(self, key: str, value: Mapping) -> None:
+        self.current()[key] = value
+
+    def __delitem__(self, key: str) -> None:
+        del self.current()[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.current())
+
+    def __len__(self) -> int:
+        return len(self.current())
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self.current()
+
+    def spill(self, key: Optional[str] = None) -> int:
+        return self.current().spill(key)
+
+    def entry_size(self, key: str) -> Dict[str, int]:
+        return self.current().entry_size(key)
+
+    def memory_usage(self) -> Dict[str, Any]:
+        """Per-namespace accounting (see XRDDataStore.memory_usage) plus totals."""
+        self._expire()
+        with self._lock:
+            namespaces = dict(self._namespaces)
+            ended = dict(self._ended)
+        usage = {name: store.memory_usage() for name, store in namespaces.items()}
+        for name, u in usage.items():
+            u["ended"] = name in ended
+        return {
+            "resident_bytes": sum(u["resident_bytes"] for u in usage.values()),
+            "spilled_bytes": sum(u["spilled_bytes"] for u in usage.values()),
+            "namespaces": usage,
+        }
+
+
+def _store_from_env() -> NamespacedDataStore:
+    budget_mb = float(os.getenv("XRD_STORE_MEMORY_MB", "512"))
+    return NamespacedDataStore(
+        default_budget_bytes=int(budget_mb * (1 << 20)),
+        session_quota_bytes=int(float(os.getenv("XRD_STORE_SESSION_QUOTA_MB", str(budget_mb / 2))) * (1 << 20)),
+        spill_dir=os.getenv("XRD_STORE_SPILL_DIR") or None,
+        min_spill_bytes=int(float(os.getenv("XRD_STORE_MIN_SPILL_KB", "16")) * (1 << 10)),
+        ttl_s=float(os.getenv("XRD_STORE_NAMESPACE_TTL_S", "600")),
+    )
+
+
+XRD_DATA_STORE = _store_from_env()
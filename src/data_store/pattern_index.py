@@ -0,0 +1,221 @@
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.run_paths import current_run_paths
+
+DEFAULT_GRID = (5.0, 90.0, 0.05)
+
+
+def fingerprint_grid(tt_min: float = DEFAULT_GRID[0], tt_max: float = DEFAULT_GRID[1], step: float = DEFAULT_GRID[2]) -> np.ndarray:
+    return np.round(np.arange(tt_min, tt_max + 0.5 * step, step), 6)
+
+
+def pattern_fingerprint(theta: np.ndarray, y: np.ndarray, grid: np.ndarray, smooth_deg: float = 0.1) -> np.ndarray:
+    """
+    Fixed-length, unit-norm fingerprint of a (corrected) pattern on `grid`.
+
+    Each grid bin takes the maximum of the samples falling into it, so sharp
+    peaks survive when the scan is finer than the grid; bins without samples
+    are interpolated and bins outside the scan are zero. A Gaussian of
+    `smooth_deg` FWHM makes the fingerprint tolerant to small peak shifts.
+    """
+    theta = np.asarray(theta, dtype=float)
+    y = np.clip(np.nan_to_num(np.asarray(y, dtype=float)), 0.0, None)
+    order = np.argsort(theta, kind="stable")
+    theta, y = theta[order], y[order]
+    step = float(grid[1] - grid[0])
+
+    fp = np.interp(grid, theta, y, left=0.0, right=0.0)
+    bins = np.rint((theta - grid[0]) / step).astype(np.intp)
+    inside = (bins >= 0) & (bins < len(grid))
+    if inside.any():
+        b = bins[inside]
+        starts = np.flatnonzero(np.r_[True, b[1:] != b[:-1]])
+        fp[b[starts]] = np.maximum.reduceat(y[inside], starts)
+
+    if smooth_deg and smooth_deg > 0:
+        sigma = smooth_deg / 2.3548 / step
+        half = int(np.ceil(3 * sigma))
+        if half > 0:
+            k = np.exp(-0.5 * (np.arange(-half, half + 1) / sigma) ** 2)
+            fp = np.convolve(fp, k / k.sum(), mode="same")
+
+    norm = np.linalg.norm(fp)
+    return (fp / norm if norm > 0 else fp).astype(np.float32)
+
+
+class PatternIndex:
+    """
+    Persistent FAISS index of pattern fingerprints for nearest-neighbour search
+    over historical scans (cosine similarity).
+
+    Storage in `directory` is append-only: `fingerprints.f32` holds the indexed
+    vectors, `fingerprints.jsonl` one metadata record per vector, and
+    `config.json` the grid / PCA settings. Re-adding the same key (path, loop)
+    supersedes the older vector. The FAISS index itself is rebuilt from these
+    files on open, which for a flat index is a single memcpy.
+
+    With `pca_dim`, the first `pca_train_size` fingerprints are kept at full
+    resolution (searched exactly) until a faiss PCAMatrix is trained on them;
+    from then on all vectors are stored reduced and re-normalized.
+    """
+
+    def __init__(self, directory: str, grid: Tuple[float, float, float] = DEFAULT_GRID,
+                 pca_dim: Optional[int] = None, pca_train_size: int = 1000, smooth_deg: float = 0.1):
+        import faiss
+
+        self._faiss = faiss
+        self.directory = directory
+        self._lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+
+        cfg_path = os.path.join(directory, "config.json")
+        if os.path.exists(cfg_path):
+            with open(cfg_path) as f:
+                cfg = json.load(f)
+        else:
+            cfg = {"grid": list(grid), "pca_dim": pca_dim, "pca_train_size": pca_train_size, "smooth_deg": smooth_deg}
+            with open(cfg_path, "w") as f:
+                json.dump(cfg, f)
+        self.config = cfg
+        self.grid = fingerprint_grid(*cfg["grid"])
+        self.pca_dim = cfg["pca_dim"]
+
+        self._pca = None
+        pca_path = os.path.join(directory, "pca.faiss")
+        if self.pca_dim and os.path.exists(pca_path):
+            self._pca = faiss.read_VectorTransform(pca_path)
+
+        self._records: List[Dict[str, Any]] = []
+        self._key_to_id: Dict[str, int] = {}
+        self._pending: List[Tuple[str, np.ndarray, Dict[str, Any]]] = []
+        self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(self.dim))
+        self._load()
+
+    @property
+    def dim(self) -> int:
+        return int(self.pca_dim) if self.pca_dim else len(self.grid)
+
+    @property
+    def trained(self) -> bool:
+        return not self.pca_dim or self._pca is not None
+
+    def __len__(self) -> int:
+        return len(self._key_to_id) + len(self._pending)
+
+    # ---------- persistence ----------
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _load(self) -> None:
+        if os.path.exists(self._file("fingerprints.jsonl")):
+            with open(self._file("fingerprints.jsonl")) as f:
+                self._records = [json.loads(line) for line in f if line.strip()]
+            vecs = np.fromfile(self._file("fingerprints.f32"), dtype=np.float32)
+            vecs = vecs[: len(self._records) * self.dim].reshape(-1, self.dim)
+            self._records = self._records[: len(vecs)]
+            for i, rec in enumerate(self._records):
+                self._key_to_id[rec["key"]] = i
+            ids = np.fromiter(self._key_to_id.values(), dtype=np.int64)
+            if len(ids):
+                ids.sort()
+                self._index.add_with_ids(np.ascontiguousarray(vecs[ids]), ids)
+        if os.path.exists(self._file("pending.jsonl")):
+            with open(self._file("pending.jsonl")) as f:
+                recs = [json.loads(line) for line in f if line.strip()]
+            vecs = np.fromfile(self._file("pending.f32"), dtype=np.float32).reshape(-1, len(self.grid))
+            latest = {r["key"]: (r["key"], v, r) for r, v in zip(recs, vecs)}
+            self._pending = list(latest.values())
+
+    def _append(self, prefix: str, vecs: np.ndarray, records: List[Dict[str, Any]]) -> None:
+        with open(self._file(f"{prefix}.f32"), "ab") as f:
+            f.write(np.ascontiguousarray(vecs, dtype=np.float32).tobytes())
+        with open(self._file(f"{prefix}.jsonl"), "a") as f:
+            for rec in records:
+                f.write(json.dumps(rec, default=str) + "\n")
+
+    # ---------- vectors ----------
+
+    def _reduce(self, vecs: np.ndarray) -> np.ndarray:
+        vecs = np.ascontiguousarray(vecs, dtype=np.float32)
+        if self._pca is None:
+            return vecs
+        out = self._pca.apply_py(vecs)
+        self._faiss.normalize_L2(out)
+        return out
+
+    def _train_pca(self) -> None:
+        full = np.stack([v for _, v, _ in self._pending])
+        pca = self._faiss.PCAMatrix(len(self.grid), int(self.pca_dim))
+        pca.train(full)
+        self._faiss.write_VectorTransform(pca, self._file("pca.faiss"))
+        self._pca = pca
+        pending, self._pending = self._pending, []
+        self._add_indexed([k for k, _, _ in pending], self._reduce(full), [r for _, _, r in pending])
+        for name in ("pending.f32", "pending.jsonl"):
+            os.remove(self._file(name))
+
+    def _add_indexed(self, keys: List[str], vecs: np.ndarray, metas: List[Dict[str, Any]]) -> None:
+        start = len(self._records)
+        ids = np.arange(start, start + len(keys), dtype=np.int64)
+        records = [{**m, "key": k} for k, m in zip(keys, metas)]
+        stale = np.array([self._key_to_id[k] for k in keys if k in self._key_to_id], dtype=np.int64)
+        if len(stale):
+            self._index.remove_ids(stale)
+        self._append("fingerprints", vecs, records)
+        self._records.extend(records)
+        for k, i in zip(keys, ids):
+            self._key_to_id[k] = int(i)
+        self._index.add_with_ids(vecs, ids)
+
+    def add(self, key: str, theta: np.ndarray, y: np.ndarray, meta: Optional[Dict[str, Any]] = None) -> int:
+        """Fingerprint and add one pattern; returns the number of indexed patterns."""
+        fp = pattern_fingerprint(theta, y, self.grid, self.config.get("smooth_deg", 0.1))
+        meta = dict(meta or {})
+        with self._lock:
+            if self.trained:
+                self._add_indexed([key], self._reduce(fp[None, :]), [meta])
+            else:
+                self._pending = [p for p in self._pending if p[0] != key]
+                self._pending.append((key, fp, {**meta, "key": key}))
+                self._append("pending", fp[None, :], [{**meta, "key": key}])
+                if len(self._pending) >= int(self.config["pca_train_size"]):
+                    self._train_pca()
+            return len(self)
+
+    def search(self, theta: np.ndarray, y: np.ndarray, k: int = 5, exclude_key: Optional[str] = None) -> List[Dict[str, Any]]:
+        """The k most similar indexed patterns, best first, as metadata + similarity."""
+        fp = pattern_fingerprint(theta, y, self.grid, self.config.get("smooth_deg", 0.1))[None, :]
+        extra = 1 if exclude_key else 0
+        hits: List[Tuple[float, Dict[str, Any]]] = []
+        with self._lock:
+            if self._index.ntotal:
+                scores, ids = self._index.search(self._reduce(fp), min(k + extra, self._index.ntotal))
+                hits += [(float(s), self._records[i]) for s, i in zip(scores[0], ids[0]) if i >= 0]
+            if self._pending:
+                full = np.stack([v for _, v, _ in self._pending])
+                sims = full @ fp[0]
+                hits += [(float(s), r) for s, (_, _, r) in zip(sims, self._pending)]
+        hits = [h for h in hits if h[1]["key"] != exclude_key]
+        hits.sort(key=lambda h: -h[0])
+        return [{**rec, "similarity": round(s, 6)} for s, rec in hits[:k]]
+
+
+_INDEX: Optional[PatternIndex] = None
+_INDEX_LOCK = threading.Lock()
+
+
+def get_pattern_index() -> PatternIndex:
+    """Process-wide index at XRD_PATTERN_INDEX_DIR (default pattern_index/ in the run's outputs)."""
+    global _INDEX
+    directory = os.getenv("XRD_PATTERN_INDEX_DIR") or current_run_paths().output("pattern_index")
+    with _INDEX_LOCK:
+        if _INDEX is None or _INDEX.directory != directory:
+            pca = os.getenv("XRD_PATTERN_INDEX_PCA_DIM")
+            _INDEX = PatternIndex(directory, pca_dim=int(pca) if pca else None)
+        return _INDEX
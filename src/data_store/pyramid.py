@@ -0,0 +1,109 @@
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+
+class ViewportPyramid:
+    """
+    Multi-resolution min/max pyramid over one (2θ, intensity) trace.
+
+    Level k holds, for every bucket of 2**k consecutive samples, the indices of
+    its minimum and maximum. A viewport query picks the coarsest level that
+    still yields about `points` samples inside [xmin, xmax], so the cost and the
+    response size depend on the requested resolution, not on scan length.
+
+    Only the indices are kept: queries take the trace's current arrays (e.g.
+    memory-mapped from the store's spill file), so a cached pyramid does not
+    pin the trace in memory.
+    """
+
+    MIN_LEVEL_SIZE = 256
+
+    def __init__(self, x: np.ndarray, y: np.ndarray):
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        self.n = len(y)
+        index_dtype = np.int32 if self.n < 2 ** 31 else np.int64
+        # permutation to ascending 2θ, only for the rare unsorted scan
+        self.order = None
+        if len(x) > 1 and np.any(np.diff(x) < 0):
+            self.order = np.argsort(x, kind="stable").astype(index_dtype)
+            y = y[self.order]
+        # level 0 is the full-resolution trace itself
+        self.levels = [None]
+
+        lo = hi = np.arange(self.n, dtype=index_dtype)
+        while len(lo) > self.MIN_LEVEL_SIZE:
+            if len(lo) % 2:
+                lo, hi = np.append(lo, lo[-1]), np.append(hi, hi[-1])
+            a_lo, b_lo = lo[0::2], lo[1::2]
+            a_hi, b_hi = hi[0::2], hi[1::2]
+            lo = np.where(y[a_lo] <= y[b_lo], a_lo, b_lo)
+            hi = np.where(y[a_hi] >= y[b_hi], a_hi, b_hi)
+            self.levels.append((lo, hi))
+
+    def __len__(self) -> int:
+        return self.n
+
+    def query(self, x: np.ndarray, y: np.ndarray, xmin: Optional[float] = None, xmax: Optional[float] = None,
+              points: int = 2000) -> Tuple[np.ndarray, np.ndarray, int]:
+        """Return (x, y, level) for the viewport of the trace (x, y), with at most ~`points` samples."""
+        if len(y) != self.n:
+            raise ValueError(f"Pyramid built for {self.n} samples, got {len(y)}")
+        if self.order is not None:
+            x, y = x[self.order], y[self.order]
+        xmin = x[0] if xmin is None else xmin
+        xmax = x[-1] if xmax is None else xmax
+        i0, i1 = np.searchsorted(x, [xmin, xmax], side="left")
+        i1 = min(len(x), i1 + 1)
+        i0 = max(0, i0 - 1)
+        n_vis = i1 - i0
+        if n_vis <= 0:
+            return np.asarray(x[:0]), np.asarray(y[:0]), 0
+        if n_vis <= points or len(self.levels) == 1:
+            return np.asarray(x[i0:i1]), np.asarray(y[i0:i1]), 0
+
+        # each bucket contributes two samples (its min and max)
+        level = int(np.ceil(np.log2(2.0 * n_vis / max(points, 2))))
+        level = max(1, min(level, len(self.levels) - 1))
+        lo, hi = self.levels[level]
+        b0, b1 = i0 >> level, min(len(lo), ((i1 - 1) >> level) + 1)
+        idx = np.sort(np.stack([lo[b0:b1], hi[b0:b1]], axis=1), axis=1).ravel()
+        idx = idx[np.r_[True, np.diff(idx) != 0]]
+        return x[idx], y[idx], level
+
+
+_PYRAMIDS: Dict[Tuple, Tuple[Any, ViewportPyramid]] = {}
+_LOCK = threading.Lock()
+
+
+def get_pyramid(key: Tuple, x: np.ndarray, y: np.ndarray, version: Any = None) -> ViewportPyramid:
+    """
+    Cached pyramid for a key such as ([run_id,] path, loop, trace). It is
+    rebuilt when `version` changes (e.g. the store's content digests of x and
+    y; by default the identity of the y array).
+    """
+    version = id(y) if version is None else version
+    cached = _PYRAMIDS.get(key)
+    if cached is not None and cached[0] == version and len(cached[1]) == len(y):
+        return cached[1]
+    pyramid = ViewportPyramid(x, y)
+    with _LOCK:
+        _PYRAMIDS[key] = (version, pyramid)
+    return pyramid
+
+
+def drop_pyramids(owner: str) -> None:
+    """Forget every cached pyramid whose key starts with `owner` (a dataset path or run id)."""
+    with _LOCK:
+        for key in [k for k in _PYRAMIDS if k[0] == owner]:
+            _PYRAMIDS.pop(key, None)
+
+
+def encode_viewport(x: np.ndarray, y: np.ndarray) -> bytes:
+    """Compact binary payload: uint32 count, then float32 x[], then float32 y[] (little-endian)."""
+    n = len(x)
+    return (np.array([n], dtype="<u4").tobytes()
+            + np.asarray(x, dtype="<f4").tobytes()
+            + np.asarray(y, dtype="<f4").tobytes())
@@ -0,0 +1,191 @@
+import atexit
+import threading
+from collections import Counter
+from collections.abc import Mapping
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from src.data_store.data_store import XRD_DATA_STORE, _content_hash, canonical_key
+
+# arrays below this size are cheaper to pickle than to map
+MIN_SHARED_BYTES = 64 << 10
+
+
+@dataclass(frozen=True)
+class SharedArray:
+    """Picklable reference to an array published in shared memory (a few bytes on the wire)."""
+
+    name: str
+    shape: Tuple[int, ...]
+    dtype: str
+
+    def attach(self) -> np.ndarray:
+        return attach(self)
+
+
+def _open_segment(name: str) -> shared_memory.SharedMemory:
+    try:
+        # Python >= 3.13: attaching processes must not register the segment for cleanup
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+class SharedArrayRegistry:
+    """
+    Arrays published once to POSIX/Windows shared memory for worker processes.
+
+    The publishing process owns the segments: each is created once per
+    distinct content (same content hash as the data store's deduplication),
+    reference counted per owner (by default the current data store namespace,
+    i.e. the run) and unlinked when its last owner releases it. Owners are
+    released automatically when their store namespace is dropped, and
+    everything is unlinked at interpreter exit.
+    """
+
+    def __init__(self, min_bytes: int = MIN_SHARED_BYTES):
+        self.min_bytes = int(min_bytes)
+        self._lock = threading.Lock()
+        self._segments: Dict[bytes, Tuple[shared_memory.SharedMemory, SharedArray]] = {}
+        self._by_name: Dict[str, bytes] = {}
+        self._refs: Counter = Counter()
+        self._owners: Dict[str, Counter] = {}
+
+    def publish(self, array: np.ndarray, owner: Optional[str] = None, digest: Optional[bytes] = None) -> SharedArray:
+        """Copy `array` into shared memory (once per content) and return its reference."""
+        array = np.ascontiguousarray(array)
+        if array.nbytes == 0:
+            raise ValueError("Cannot share an empty array")
+        digest = digest or _content_hash(array)
+        owner = owner or XRD_DATA_STORE.current_name()
+        with self._lock:
+            if digest not in self._segments:
+                shm = shared_memory.SharedMemory(create=True, size=array.nbytes)
+                np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+                ref = SharedArray(shm.name, tuple(array.shape), array.dtype.str)
+                self._segments[digest] = (shm, ref)
+                self._by_name[shm.name] = digest
+            ref = self._segments[digest][1]
+            self._refs[digest] += 1
+            self._owners.setdefault(owner, Counter())[digest] += 1
+            return ref
+
+    def publish_entry(self, path: str, keys: Optional[Any] = None, loop: Optional[int] = None,
+                      owner: Optional[str] = None) -> Dict[str, SharedArray]:
+        """
+        Publish the arrays of a store entry (or of one of its loops) of the
+        current namespace; the store's content hashes are reused.
+        """
+        node = XRD_DATA_STORE[canonical_key(path)]
+        if loop is not None:
+            node = node["loops"][loop]
+        out = {}
+        for key in (keys or list(node)):
+            value = node[key]
+            if isinstance(value, np.ndarray) and value.nbytes:
+                out[key] = self.publish(value, owner=owner, digest=node.digest(key))
+        return out
+
+    def release(self, ref: SharedArray, owner: Optional[str] = None) -> None:
+        owner = owner or XRD_DATA_STORE.current_name()
+        with self._lock:
+            digest = self._by_name.get(ref.name)
+            held = self._owners.get(owner)
+            if digest is None or not held or not held[digest]:
+                return
+            held[digest] -= 1
+            self._decref(digest, 1)
+
+    def release_owner(self, owner: str) -> None:
+        """Drop every reference held by `owner` (called when its store namespace is dropped)."""
+        with self._lock:
+            for digest, n in (self._owners.pop(owner, None) or {}).items():
+                self._decref(digest, n)
+
+    def _decref(self, digest: bytes, n: int) -> None:
+        self._refs[digest] -= n
+        if self._refs[digest] <= 0:
+            del self._refs[digest]
+            shm, ref = self._segments.pop(digest)
+            del self._by_name[ref.name]
+            shm.close()
+            shm.unlink()
+
+    def close(self) -> None:
+        """Unlink every segment (at exit; workers still attached keep their mappings)."""
+        with self._lock:
+            for shm, _ in self._segments.values():
+                shm.close()
+                try:
+                    shm.unlink()
+                except FileNotFoundError:
+                    pass
+            self._segments.clear()
+            self._by_name.clear()
+            self._refs.clear()
+            self._owners.clear()
+
+    def usage(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "segments": len(self._segments),
+                "shared_bytes": sum(shm.size for shm, _ in self._segments.values()),
+                "owners": {o: sum(c.values()) for o, c in self._owners.items() if sum(c.values())},
+            }
+
+    def share(self, obj: Any, owner: Optional[str] = None) -> Any:
+        """Copy of a task payload with every large ndarray (nested in dicts/lists) replaced by a SharedArray."""
+        if isinstance(obj, np.ndarray):
+            return self.publish(obj, owner=owner) if obj.nbytes >= self.min_bytes else obj
+        if isinstance(obj, Mapping):
+            return {k: self.share(v, owner) for k, v in obj.items()}
+        if isinstance(obj, (list, tuple)):
+            return type(obj)(self.share(v, owner) for v in obj)
+        return obj
+
+
+# worker side: segments stay mapped for the life of the process (views may outlive any one task)
+_ATTACHED: Dict[str, Tuple[shared_memory.SharedMemory, np.ndarray]] = {}
+_ATTACH_LOCK = threading.Lock()
+
+
+def attach(ref: SharedArray) -> np.ndarray:
+    """Read-only zero-copy view of a published array; repeated attaches reuse the mapping."""
+    with _ATTACH_LOCK:
+        if ref.name not in _ATTACHED:
+            shm = _open_segment(ref.name)
+            array = np.ndarray(ref.shape, dtype=np.dtype(ref.dtype), buffer=shm.buf)
+            array.flags.writeable = False
+            _ATTACHED[ref.name] = (shm, array)
+        return _ATTACHED[ref.name][1]
+
+
+def attach_all(obj: Any) -> Any:
+    """Inverse of `SharedArrayRegistry.share`: SharedArray references become attached views."""
+    if isinstance(obj, SharedArray):
+        return attach(obj)
+    if isinstance(obj, Mapping):
+        return {k: attach_all(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(attach_all(v) for v in obj)
+    return obj
+
+
+def detach_all() -> None:
+    """Close this process's mappings (views handed out before become invalid)."""
+    with _ATTACH_LOCK:
+        for shm, _ in _ATTACHED.values():
+            try:
+                shm.close()
+            except BufferError:
+                # a view is still referenced; the mapping goes away with the process
+                pass
+        _ATTACHED.clear()
+
+
+SHARED_ARRAYS = SharedArrayRegistry()
+XRD_DATA_STORE.on_drop(SHARED_ARRAYS.release_owner)
+atexit.register(SHARED_ARRAYS.close)
@@ -0,0 +1,218 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from src.run_paths import current_run_paths
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    path TEXT NOT NULL,
+    sample_name TEXT,
+    loop INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    wavelength_angstrom REAL,
+    n_peaks INTEGER,
+    mean_size_nm REAL,
+    wh_strain REAL,
+    wh_intercept REAL,
+    wh_r2 REAL,
+    material_id TEXT,
+    report_path TEXT,
+    meta_json TEXT
+);
+CREATE TABLE IF NOT EXISTS peaks (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    two_theta REAL NOT NULL,
+    intensity REAL,
+    fwhm_deg REAL,
+    area REAL,
+    size_nm REAL
+);
+CREATE TABLE IF NOT EXISTS phases (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    material_id TEXT NOT NULL,
+    formula TEXT,
+    source TEXT NOT NULL,
+    confidence REAL,
+    fraction REAL
+);
+CREATE INDEX IF NOT EXISTS idx_peaks_two_theta ON peaks(two_theta, run_id);
+CREATE INDEX IF NOT EXISTS idx_peaks_run ON peaks(run_id);
+CREATE INDEX IF NOT EXISTS idx_runs_path_loop ON runs(path, loop, run_id);
+CREATE INDEX IF NOT EXISTS idx_runs_sample ON runs(sample_name, loop);
+CREATE INDEX IF NOT EXISTS idx_runs_size ON runs(mean_size_nm);
+CREATE INDEX IF NOT EXISTS idx_phases_material ON phases(material_id, run_id);
+"""
+
+_META_SKIP = ("reference_prefetch",)
+
+
+def _num(v: Any) -> Optional[float]:
+    try:
+        v = float(v)
+    except (TypeError, ValueError):
+        return None
+    return v if np.isfinite(v) else None
+
+
+class ResultsWarehouse:
+    """
+    Append-only SQLite store of per-loop analysis results (runs, fitted peaks
+    with their Scherrer sizes, and reference/phase matches).
+
+    Every `record` call adds a new run row, so re-analysing a sample never
+    overwrites history. Peak positions are indexed so 2θ interval queries are
+    answered by an index range scan rather than by reading every report.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.RLock()
+        self._initialized = False
+        # an in-memory database lives only as long as its connection, so one is kept open and shared
+        self._memory_conn: Optional[sqlite3.Connection] = None
+
+    @contextmanager
+    def _connect(self):
+        if self.db_path == ":memory:":
+            with self._lock:
+                if self._memory_conn is None:
+                    self._memory_conn = sqlite3.connect(":memory:", check_same_thread=False)
+                    self._memory_conn.row_factory = sqlite3.Row
+                    self._memory_conn.executescript(_SCHEMA)
+                    self._initialized = True
+                with self._memory_conn as conn:
+                    yield conn
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._initialized = True
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def record(self, path: str, loop: int, loop_data: Dict[str, Any], report_path: Optional[str] = None) -> int:
+        """Append one analysis loop of a dataset; returns the new run_id."""
+        meta = loop_data.get("meta", {}) or {}
+        peaks = loop_data.get("peaks", []) or []
+        scherrer = loop_data.get("scherrer", []) or []
+        wh = loop_data.get("williamson_hall") or {}
+
+        # Scherrer rows carry the peak position they were computed from
+        sizes = {round(float(s["two_theta"]), 6): _num(s.get("L_nm")) for s in scherrer}
+        valid_sizes = [v for v in sizes.values() if v is not None]
+        mean_size = float(np.mean(valid_sizes)) if valid_sizes else None
+
+        phases = []
+        for c in loop_data.get("mp_candidates", []) or []:
+            phases.append((c.get("material_id"), c.get("formula"), "identifier", _num(c.get("confidence")), None))
+        for p in (loop_data.get("multiphase") or {}).get("phases", []) or []:
+            phases.append((p.get("material_id"), p.get("formula"), "multiphase", None, _num(p.get("fraction"))))
+        material_id = loop_data.get("mp_identifier") or (loop_data.get("mp_comparison") or {}).get("material_id")
+
+        meta_json = json.dumps({k: v for k, v in meta.items() if k not in _META_SKIP}, default=str)
+        with self._lock, self._connect() as conn:
+            cur = conn.execute(
+                "INSERT INTO runs (path, sample_name, loop, created_at, wavelength_angstrom, n_peaks, mean_size_nm,"
+                " wh_strain, wh_intercept, wh_r2, material_id, report_path, meta_json)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (path, meta.get("sample_name"), int(loop), time.time(), _num(meta.get("wavelength_angstrom")),
+                 len(peaks), mean_size, _num(wh.get("slope_strain")), _num(wh.get("intercept_size")),
+                 _num(wh.get("r2")), material_id, report_path, meta_json),
+            )
+            run_id = cur.lastrowid
+            conn.executemany(
+                "INSERT INTO peaks (run_id, two_theta, intensity, fwhm_deg, area, size_nm) VALUES (?, ?, ?, ?, ?, ?)",
+                [(run_id, float(p["two_theta"]), _num(p.get("intensity")), _num(p.get("fwhm_deg")),
+                  _num(p.get("area")), sizes.get(round(float(p["two_theta"]), 6))) for p in peaks],
+            )
+            conn.executemany(
+                "INSERT INTO phases (run_id, material_id, formula, source, confidence, fraction) VALUES (?, ?, ?, ?, ?, ?)",
+                [(run_id, *row) for row in phases if row[0]],
+            )
+        return run_id
+
+    def query(
+        self,
+        two_theta_min: Optional[float] = None,
+        two_theta_max: Optional[float] = None,
+        min_size_nm: Optional[float] = None,
+        max_size_nm: Optional[float] = None,
+        sample_name: Optional[str] = None,
+        material_id: Optional[str] = None,
+        latest_only: bool = True,
+        limit: int = 100,
+    ) -> List[Dict[str, Any]]:
+        """
+        Runs matching every given filter. With a 2θ interval, only runs having
+        a peak inside it are returned, and the matching peaks are listed.
+        Size filters apply to the run's mean Scherrer size. latest_only keeps
+        the most recent record of each (path, loop).
+        """
+        where, args = [], []
+        has_interval = two_theta_min is not None or two_theta_max is not None
+        if has_interval:
+            lo = -np.inf if two_theta_min is None else float(two_theta_min)
+            hi = np.inf if two_theta_max is None else float(two_theta_max)
+            where.append("r.run_id IN (SELECT run_id FROM peaks WHERE two_theta BETWEEN ? AND ?)")
+            args += [lo, hi]
+        if min_size_nm is not None:
+            where.append("r.mean_size_nm >= ?")
+            args.append(float(min_size_nm))
+        if max_size_nm is not None:
+            where.append("r.mean_size_nm <= ?")
+            args.append(float(max_size_nm))
+        if sample_name:
+            where.append("r.sample_name = ?")
+            args.append(sample_name)
+        if material_id:
+            where.append("(r.material_id = ? OR r.run_id IN (SELECT run_id FROM phases WHERE material_id = ?))")
+            args += [material_id, material_id]
+        if latest_only:
+            where.append("r.run_id = (SELECT MAX(run_id) FROM runs r2 WHERE r2.path = r.path AND r2.loop = r.loop)")
+
+        sql = "SELECT * FROM runs r"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY r.run_id DESC LIMIT ?"
+        args.append(int(limit))
+
+        with self._connect() as conn:
+            runs = [dict(r) for r in conn.execute(sql, args)]
+            for run in runs:
+                run["meta"] = json.loads(run.pop("meta_json") or "{}")
+                peak_sql = "SELECT two_theta, intensity, fwhm_deg, area, size_nm FROM peaks WHERE run_id = ?"
+                peak_args: List[Any] = [run["run_id"]]
+                if has_interval:
+                    peak_sql += " AND two_theta BETWEEN ? AND ?"
+                    peak_args += [lo, hi]
+                run["peaks"] = [dict(p) for p in conn.execute(peak_sql + " ORDER BY two_theta", peak_args)]
+                run["phases"] = [dict(p) for p in conn.execute(
+                    "SELECT material_id, formula, source, confidence, fraction FROM phases WHERE run_id = ?",
+                    (run["run_id"],))]
+        return runs
+
+
+_WAREHOUSE: Optional[ResultsWarehouse] = None
+
+
+def get_warehouse() -> ResultsWarehouse:
+    """Process-wide warehouse at XRD_WAREHOUSE_PATH (default results.sqlite in the run's outputs)."""
+    global _WAREHOUSE
+    db_path = os.getenv("XRD_WAREHOUSE_PATH") or current_run_paths().output("results.sqlite")
+    if _WAREHOUSE is None or _WAREHOUSE.db_path != db_path:
+        _WAREHOUSE = ResultsWarehouse(db_path)
+    return _WAREHOUSE
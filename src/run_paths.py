@@ -0,0 +1,56 @@
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+
+@dataclass(frozen=True)
+class RunPaths:
+    """
+    Where a run reads and writes files: relative input paths resolve against
+    `root`, reports/plots/indexes go to `outputs` and the research agents'
+    PDFs, extracted texts and vector store live under `papers`.
+    """
+
+    root: str
+    outputs: str
+    papers: str
+
+    @classmethod
+    def under(cls, root: str, outputs: Optional[str] = None, papers: Optional[str] = None) -> "RunPaths":
+        """Paths below `root`; `outputs`/`papers` may be relative to it or absolute."""
+        root = os.path.abspath(root)
+        return cls(root, os.path.join(root, outputs or "xrd_outputs"), os.path.join(root, papers or "papers"))
+
+    def resolve(self, path: str) -> str:
+        """Absolute form of an input path (absolute paths are returned unchanged)."""
+        return os.path.normpath(os.path.join(self.root, os.path.expanduser(str(path))))
+
+    def output(self, *parts: str) -> str:
+        return os.path.join(self.outputs, *parts)
+
+    def paper(self, *parts: str) -> str:
+        return os.path.join(self.papers, *parts)
+
+
+_RUN_PATHS: ContextVar[Optional[RunPaths]] = ContextVar("run_paths", default=None)
+
+
+def current_run_paths() -> RunPaths:
+    """Paths of the current run; outside of one (CLI, scripts, tests) relative to the working directory."""
+    return _RUN_PATHS.get() or RunPaths.under(os.getcwd())
+
+
+@contextmanager
+def use_run_paths(paths: RunPaths) -> Iterator[RunPaths]:
+    """Make `paths` current for the enclosed code and every task or tool thread it starts."""
+    token = _RUN_PATHS.set(paths)
+    try:
+        yield paths
+    finally:
+        try:
+            _RUN_PATHS.reset(token)
+        except ValueError:
+            # an async generator finalized from another context; that context goes away with it
+            pass
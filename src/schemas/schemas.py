@@ -71,6 +71,7 @@ class MPIdentifierCandidate(BaseModel):
     material_id: str = Field(description="Candidate MP material id.")
     formula: Optional[str] = Field(default=None, description="Chemical formula of the candidate.")
     confidence: float = Field(description="Confidence (0-1) that this candidate matches the data.")
+    zero_shift_deg: Optional[float] = Field(default=None, description="Optimal 2θ zero shift from full-profile scoring, if used.")
 
 class MPIdentifierOutput(BaseModel):
     success: bool = Field(description="Whether identifier resolution succeeded.")
@@ -89,6 +90,13 @@ class ReferenceMatch(BaseModel):
     ref_intensity: float = Field(description="Relative intensity of the reference peak (%).")
     hkls: Optional[List[dict]] = Field(default=None, description="Miller indices for the reference peak.")
 
+class PhaseFraction(BaseModel):
+    material_id: str = Field(description="MP material id of the phase.")
+    formula: Optional[str] = Field(default=None, description="Chemical formula of the phase.")
+    scale: float = Field(description="Non-negative NNLS scale factor of the broadened reference profile.")
+    fraction: float = Field(description="Fraction (0-1) of the fitted integrated intensity from this phase.")
+    residual_after: float = Field(description="Relative residual ||y - Ax|| / ||y|| after this phase was added.")
+
 class ReferenceCheckOutput(BaseModel):
     success: bool = Field(description="Whether the reference check succeeded.")
     path: str = Field(description="Path of the dataset processed.")
@@ -96,6 +104,7 @@ class ReferenceCheckOutput(BaseModel):
     mp_identifier: Optional[str] = Field(default=None, description="Materials project identifier.")
     params: dict = Field(description="Parameters used for the comparison (identifier, range, top_n, intensity threshold).")
     matches: List[ReferenceMatch] = Field(description="List of matched peaks.")
+    phases: Optional[List[PhaseFraction]] = Field(default=None, description="Phase combination from multiphase search-match, if run.")
     message: Optional[str] = Field(default=None, description="Additional info about the process.")
 
 class AnalyzerOutput(BaseModel):
@@ -105,12 +114,20 @@ class AnalyzerOutput(BaseModel):
     message: str = Field(..., description="Diagnostic or explanatory message about the analysis process")
 
 
+class SimilarPattern(BaseModel):
+    path: str = Field(..., description="Dataset path of the historical scan")
+    loop: int = Field(..., description="Analysis loop the indexed pattern came from")
+    sample_name: Optional[str] = Field(None, description="Sample name of the historical scan")
+    material_id: Optional[str] = Field(None, description="Reference phase identified for that scan, if any")
+    similarity: float = Field(..., description="Cosine similarity of the pattern fingerprints (1 = identical)")
+
 class ReporterOutput(BaseModel):
     success: bool = Field(..., description="Whether report generation was successful")
     path: str = Field(..., description="File path of the XRD dataset")
     sample_name: Optional[str] = Field(None, description="Sample name if available from metadata")
     figures: List[str] = Field(default_factory=list, description="Paths to generated plots (PNG, HTML, etc.)")
     report_path: Optional[str] = Field(None, description="Path to the saved JSON report")
+    similar_patterns: List[SimilarPattern] = Field(default_factory=list, description="Most similar historical scans, if searched")
     message: str = Field(..., description="Status or diagnostic message about the report generation")
 
 class HyperparameterOptimizerOutput(BaseModel):
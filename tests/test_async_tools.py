@@ -0,0 +1,42 @@
+import asyncio
+import inspect
+import time
+
+from google.adk.tools import FunctionTool
+
+from src.agents.async_tools import offload
+from src.agents.xrd_agent.sub_agents.data_preprocessor.tools import preprocess_xrd_data
+from src.data_store.data_store import XRD_DATA_STORE
+
+
+def test_offloaded_tool_is_declared_like_the_original():
+    tool = offload(preprocess_xrd_data)
+    assert inspect.iscoroutinefunction(tool)
+    assert FunctionTool(tool)._get_declaration() == FunctionTool(preprocess_xrd_data)._get_declaration()
+
+
+def test_blocking_tool_does_not_stall_the_event_loop():
+    def slow_tool(payload):
+        time.sleep(0.3)
+        return {"success": True, "namespace": XRD_DATA_STORE.current_name()}
+
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        with XRD_DATA_STORE.namespace("async-run", end_on_exit=False):
+            result = await offload(slow_tool)({})
+        task.cancel()
+        XRD_DATA_STORE.drop_namespace("async-run")
+        return result, ticks
+
+    result, ticks = asyncio.run(main())
+    # the run's store namespace follows the tool onto the worker thread
+    assert result == {"success": True, "namespace": "async-run"}
+    assert ticks >= 10
@@ -0,0 +1,18 @@
+import numpy as np
+import scipy.sparse as sp
+import scipy.sparse.linalg as spla
+
+from src.agents.xrd_agent.sub_agents.data_preprocessor.tools import _als_baseline
+
+
+def test_banded_als_matches_sparse_solve():
+    rng = np.random.default_rng(0)
+    x = np.linspace(10, 80, 3501)
+    y = rng.poisson(200 + 2 * x + 3000 * np.exp(-0.5 * ((x - 28.44) / 0.05) ** 2)).astype(float)
+    L = len(y)
+    D = sp.diags([1, -2, 1], [0, 1, 2], shape=(L - 2, L))
+    w = np.ones(L)
+    for _ in range(10):
+        z = spla.spsolve((sp.diags(w, 0) + 1e5 * (D.T @ D)).tocsc(), w * y)
+        w = 0.01 * (y > z) + 0.99 * (y < z)
+    np.testing.assert_allclose(_als_baseline(y, 1e5, 0.01), z, rtol=1e-6, atol=1e-6)
@@ -0,0 +1,54 @@
+import os
+
+import numpy as np
+
+from src.agents.xrd_agent.batch import discover, read_summary, run_batch
+from src.agents.xrd_agent.sub_agents.peak_finder.tools import _voigt
+
+
+def _write_pattern(path, centers=(28.44, 47.30, 56.12), seed=0):
+    x = np.linspace(10, 80, 3501)
+    y = 200 + sum(_voigt(x, 2000, c, 0.05, 0.04, 0) for c in centers)
+    y = np.random.default_rng(seed).poisson(y).astype(float)
+    np.savetxt(path, np.column_stack([x, y]), delimiter=",", header="two_theta,intensity", comments="")
+
+
+def test_batch_summarizes_and_resumes(tmp_path):
+    data = tmp_path / "scans"
+    (data / "day2").mkdir(parents=True)
+    _write_pattern(data / "a.csv")
+    _write_pattern(data / "day2" / "b.csv", centers=(30.0, 45.0), seed=1)
+    (data / "broken.csv").write_text("two_theta,intensity\nnot,numbers\n")
+    out = tmp_path / "out"
+    assert len(discover([str(data)])) == 3
+
+    stats = run_batch([str(data)], str(out), workers=0, log=lambda msg: None)
+    assert (stats["ok"], stats["failed"], stats["skipped"]) == (2, 1, 0)
+    assert stats["files_per_s"] > 0 and stats["points_per_s"] > 0
+    assert "peaks" in stats["stage_timing_s"]
+    summary = read_summary(str(out)).set_index("sample_name")
+    assert summary.loc["a", "n_peaks"] == 3 and summary.loc["b", "n_peaks"] == 2
+    assert summary.loc["broken", "status"] == "failed"
+    assert os.path.exists(stats["summary_path"])
+
+    # completed inputs are skipped; failures and changed files are retried
+    _write_pattern(data / "a.csv", centers=(28.44, 47.30))
+    again = run_batch([str(data)], str(out), workers=0, log=lambda msg: None)
+    assert (again["files"], again["skipped"]) == (2, 1)
+    summary = read_summary(str(out)).drop_duplicates("path", keep="last").set_index("sample_name")
+    assert summary.loc["a", "n_peaks"] == 2
+
+
+def test_batch_process_pool(tmp_path, capfd):
+    data = tmp_path / "scans"
+    data.mkdir()
+    for i, centers in enumerate([(28.44, 47.30, 56.12), (30.0, 45.0), (28.44, 47.30, 56.12), (30.0, 45.0)]):
+        _write_pattern(data / f"s{i}.csv", centers=centers, seed=i)
+    out = tmp_path / "out"
+
+    stats = run_batch([str(data)], str(out), workers=2, log=lambda msg: None)
+    assert (stats["ok"], stats["failed"]) == (4, 0)
+    summary = read_summary(str(out)).set_index("sample_name")
+    assert summary["n_peaks"].to_dict() == {"s0": 3, "s1": 2, "s2": 3, "s3": 2}
+    # workers write nothing of their own to the console
+    assert capfd.readouterr().out == ""
@@ -0,0 +1,121 @@
+import asyncio
+import os
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from src.data_store.checkpoint import CheckpointStore
+from src.data_store.data_store import XRDDataStore
+
+
+def _fill(store):
+    theta = np.linspace(10, 80, 2000)
+    store["scan.csv"] = {"two_theta_deg": theta, "intensity": np.sin(theta), "meta": {"path": "scan.csv", "n": 2000}}
+    store["scan.csv"]["loops"] = {}
+    store["scan.csv"]["loops"][1] = {"intensity_corr": np.cos(theta), "peaks": [{"two_theta": 20.5, "fwhm": 0.1}]}
+
+
+def test_save_restore_round_trip(tmp_path):
+    checkpoints = CheckpointStore(str(tmp_path))
+    store = XRDDataStore()
+    _fill(store)
+    checkpoints.start_run("run", "analyze scan.csv", {"mode": "fast"})
+    checkpoints.save("run", store, {"loop_iteration": 1, "completed_stages": ["data_loader_agent@1"]},
+                     stage="data_loader_agent@1")
+
+    restored_store = XRDDataStore()
+    restored = checkpoints.restore("run", restored_store)
+
+    assert restored["completed_stages"] == ["data_loader_agent@1"]
+    assert restored["state"]["loop_iteration"] == 1
+    assert restored["status"] == "running"
+    entry = restored_store["scan.csv"]
+    np.testing.assert_array_equal(entry["two_theta_deg"], store["scan.csv"]["two_theta_deg"])
+    np.testing.assert_array_equal(entry["loops"][1]["intensity_corr"], store["scan.csv"]["loops"][1]["intensity_corr"])
+    assert entry["meta"] == {"path": "scan.csv", "n": 2000}
+    assert entry["loops"][1]["peaks"][0]["two_theta"] == 20.5
+    assert checkpoints.restore("unknown", XRDDataStore()) is None
+    assert checkpoints.runs()[0]["options"] == {"mode": "fast"}
+
+
+def test_arrays_are_content_addressed(tmp_path):
+    checkpoints = CheckpointStore(str(tmp_path))
+    store = XRDDataStore()
+    _fill(store)
+    checkpoints.save("a", store, stage="s1")
+    files = sorted(os.listdir(checkpoints.array_dir))
+    checkpoints.save("a", store, stage="s2")
+    checkpoints.save("b", store, stage="s1")
+
+    assert len(files) == 3
+    assert sorted(os.listdir(checkpoints.array_dir)) == files
+
+
+def test_delete_and_prune_sweep_unshared_arrays(tmp_path):
+    checkpoints = CheckpointStore(str(tmp_path), gc_grace_s=0)
+    shared = XRDDataStore()
+    _fill(shared)
+    own = XRDDataStore()
+    own["other.csv"] = {"intensity": np.arange(3000.0)}
+    for run_id in ("a", "b", "c"):
+        checkpoints.save(run_id, shared, stage="s1")
+    checkpoints.save("b", own, stage="s2")
+    # a temporary file left behind by a crashed save
+    open(os.path.join(checkpoints.array_dir, ".dead.1.2.npy"), "wb").close()
+    assert len(os.listdir(checkpoints.array_dir)) == 5
+
+    checkpoints.delete("b")
+    assert len(os.listdir(checkpoints.array_dir)) == 3  # the arrays of "a" and "c" stay
+    assert checkpoints.restore("a", XRDDataStore()) is not None
+
+    checkpoints.set_status("a", "done")
+    checkpoints.set_status("c", "done")
+    assert checkpoints.prune(max_runs=1) == ["a"]
+    checkpoints.start_run("d")
+    old = time.time() - 3600
+    with checkpoints._connect() as conn:
+        conn.execute("UPDATE runs SET updated_at=?", (old,))
+    # unfinished runs are never pruned
+    assert checkpoints.prune(max_age_s=60) == ["c"]
+    assert [r["run_id"] for r in checkpoints.runs()] == ["d"]
+    assert os.listdir(checkpoints.array_dir) == []
+
+
+def test_sweep_keeps_recent_files(tmp_path):
+    checkpoints = CheckpointStore(str(tmp_path))
+    store = XRDDataStore()
+    _fill(store)
+    checkpoints.save("a", store, stage="s1")
+    checkpoints._forget(["a"])
+    assert checkpoints.collect_garbage() == 0
+    assert checkpoints.collect_garbage(grace_s=0) == 3
+
+
+class _State(dict):
+    def to_dict(self):
+        return dict(self)
+
+
+def test_stage_callbacks_skip_completed_stages(tmp_path, monkeypatch):
+    from src.agents.xrd_agent.checkpointing import checkpoint_stage, skip_completed_stage
+    from src.data_store.data_store import XRD_DATA_STORE
+
+    monkeypatch.setenv("XRD_CHECKPOINT_DIR", str(tmp_path))
+    ctx = SimpleNamespace(state=_State(loop_iteration=1), agent_name="peak_finder_agent",
+                          _invocation_context=SimpleNamespace(session=SimpleNamespace(id="run")))
+
+    with XRD_DATA_STORE.namespace("run", end_on_exit=False) as store:
+        _fill(store)
+        assert skip_completed_stage(ctx) is None
+        asyncio.run(checkpoint_stage(ctx))
+    assert ctx.state["completed_stages"] == ["peak_finder_agent@1"]
+    assert skip_completed_stage(ctx) is not None
+
+    # the next loop runs the stage again
+    ctx.state["loop_iteration"] = 2
+    assert skip_completed_stage(ctx) is None
+
+    restored = CheckpointStore(str(tmp_path)).restore("run", XRDDataStore())
+    assert restored["completed_stages"] == ["peak_finder_agent@1"]
+    XRD_DATA_STORE.drop_namespace("run")
@@ -0,0 +1,154 @@
+import numpy as np
+
+from src.data_store.data_store import NamespacedDataStore, XRDDataStore
+
+
+def _entry(n=10_000, seed=0):
+    rng = np.random.default_rng(seed)
+    return {"two_theta_deg": np.linspace(10, 80, n) + seed, "intensity": rng.random(n), "meta": {"path": "x"}}
+
+
+def test_store_behaves_like_nested_dict():
+    store = XRDDataStore()
+    store["a"] = _entry()
+    store["a"]["loops"] = {}
+    store["a"]["loops"][1] = {"intensity_corr": np.ones(5), "peaks": [{"two_theta": 20.0}]}
+    store["a"]["loops"].setdefault(2, {})["meta"] = {"k": 1}
+
+    assert "a" in store and len(store) == 1
+    assert store["a"]["loops"][1]["peaks"][0]["two_theta"] == 20.0
+    assert store["a"]["loops"][2]["meta"] == {"k": 1}
+    assert isinstance(store["a"]["meta"], dict)
+    np.testing.assert_array_equal(store["a"]["loops"][1]["intensity_corr"], np.ones(5))
+    plain = {**store["a"]["loops"][1]}
+    assert set(plain) == {"intensity_corr", "peaks"}
+
+
+def test_lru_spill_and_transparent_reload(tmp_path):
+    one = 10_000 * 8
+    store = XRDDataStore(memory_budget_bytes=3 * one, spill_dir=str(tmp_path), min_spill_bytes=1024)
+    entries = {k: _entry(seed=i) for i, k in enumerate("abc")}
+    for k, e in entries.items():
+        store[k] = e
+        store[k]["two_theta_deg"]  # touch
+
+    usage = store.memory_usage()
+    assert usage["resident_bytes"] <= 3 * one
+    assert usage["spilled_bytes"] == 6 * one - usage["resident_bytes"]
+    # the oldest arrays went to disk first
+    assert store.entry_size("a")["spilled_bytes"] > 0
+    assert store.entry_size("c")["resident_bytes"] > 0
+
+    reloaded = store["a"]["intensity"]
+    assert isinstance(reloaded, np.memmap) and not reloaded.flags.writeable
+    np.testing.assert_array_equal(reloaded, entries["a"]["intensity"])
+    assert store["a"]["intensity"] is reloaded
+
+
+def test_delete_frees_accounting_and_spill_files(tmp_path):
+    store = XRDDataStore(memory_budget_bytes=0, spill_dir=str(tmp_path), min_spill_bytes=0)
+    store["a"] = _entry()
+    spill_dir = next(tmp_path.iterdir())
+    assert len(list(spill_dir.iterdir())) == 2
+
+    store["a"] = _entry(seed=1)  # overwrite releases the old arrays
+    del store["a"]
+    import gc
+    gc.collect()
+    assert store.memory_usage()["n_arrays"] == 0
+    assert list(spill_dir.iterdir()) == []
+
+
+def test_raw_and_absolute_paths_share_one_entry(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    store = XRDDataStore()
+    store["data/scan.csv"] = _entry(n=10)
+    assert str(tmp_path / "data" / "scan.csv") in store
+    assert store["./data/../data/scan.csv"] is store["data/scan.csv"]
+
+
+def test_namespaces_isolate_concurrent_runs():
+    import asyncio
+
+    store = NamespacedDataStore(ttl_s=0)
+    seen = {}
+
+    async def run(name, value):
+        with store.namespace(name):
+            store["/data/scan.csv"] = {"intensity": np.full(4, value), "loops": {}}
+            await asyncio.sleep(0)
+            store["/data/scan.csv"]["loops"][1] = {"intensity_corr": np.full(4, value)}
+            await asyncio.sleep(0)
+            seen[name] = float(store["/data/scan.csv"]["loops"][1]["intensity_corr"][0])
+            assert store.get_namespace(name) is not None
+
+    async def main():
+        await asyncio.gather(run("run-a", 1.0), run("run-b", 2.0))
+
+    asyncio.run(main())
+    assert seen == {"run-a": 1.0, "run-b": 2.0}
+    assert "/data/scan.csv" not in store  # default namespace untouched
+    # ended namespaces with ttl 0 are dropped on exit
+    assert store.get_namespace("run-a") is None and store.get_namespace("run-b") is None
+
+
+def test_namespace_quota_and_drop_callback(tmp_path):
+    dropped = []
+    store = NamespacedDataStore(session_quota_bytes=10_000 * 8, spill_dir=str(tmp_path), min_spill_bytes=0, ttl_s=3600)
+    store.on_drop(dropped.append)
+    with store.namespace("run-a"):
+        store["a"] = _entry()
+        usage = store.memory_usage()["namespaces"]["run-a"]
+        assert usage["resident_bytes"] <= 10_000 * 8 and usage["spilled_bytes"] > 0
+    assert store.memory_usage()["namespaces"]["run-a"]["ended"]
+    store.drop_namespace("run-a")
+    assert dropped == ["run-a"] and store.get_namespace("run-a") is None
+
+
+def test_arrays_are_frozen_shared_and_deduplicated():
+    store = XRDDataStore()
+    y = np.arange(5000, dtype=float)
+    store["a"] = {"intensity": y, "loops": {}}
+    store["a"]["loops"][1] = {"intensity_smooth": y.copy()}
+    store["a"]["loops"][2] = {"intensity_smooth": y.copy()}
+
+    assert store["a"]["intensity"] is y and not y.flags.writeable
+    assert store["a"]["loops"][2]["intensity_smooth"] is y  # same content, one copy
+    assert store.memory_usage()["resident_bytes"] == y.nbytes
+    try:
+        store["a"]["intensity"][0] = 1.0
+        raise AssertionError("stored arrays must be read-only")
+    except ValueError:
+        pass
+
+    del store["a"]["loops"][1]
+    assert store.memory_usage()["n_arrays"] == 1
+    del store["a"]
+    assert store.memory_usage()["resident_bytes"] == 0
+
+
+def test_overwriting_with_identical_content_keeps_refcount():
+    store = XRDDataStore()
+    y = np.arange(5000, dtype=float)
+    store["a"] = {"intensity": y}
+    store["a"]["intensity"] = y.copy()
+    store["a"]["intensity"] = y.copy()
+    del store["a"]
+    usage = store.memory_usage()
+    assert usage["resident_bytes"] == 0 and usage["n_arrays"] == 0
+
+
+def test_views_of_writable_memory_are_copied():
+    store = XRDDataStore()
+    base = np.linspace(10, 80, 1000)
+    store["a"] = {"two_theta_deg": base[:], "intensity": base.copy()}
+    digest = store["a"].digest("two_theta_deg")
+    base[0] = 99.0
+    assert store["a"]["two_theta_deg"][0] == 10.0
+    assert store["a"].digest("two_theta_deg") == digest
+    assert base.flags.writeable  # the caller's array is left alone
+
+    # an owned array is frozen in place, not copied
+    y = np.arange(100.0)
+    store["b"] = {"intensity": y}
+    assert store["b"]["intensity"] is y
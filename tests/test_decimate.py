@@ -0,0 +1,31 @@
+import numpy as np
+
+from src.agents.xrd_agent.sub_agents.reporter.tools.decimate import decimate_trace, lttb_indices, minmax_indices
+
+
+def _pattern(n=200_000):
+    x = np.linspace(10, 80, n)
+    rng = np.random.default_rng(1)
+    y = 100 * np.exp(-0.5 * ((x - 28.44) / 0.01) ** 2) + 40 * np.exp(-0.5 * ((x - 47.3) / 0.02) ** 2)
+    return x, y + rng.random(n)
+
+
+def test_lttb_and_minmax_respect_budget_and_endpoints():
+    x, y = _pattern()
+    for idx in (lttb_indices(x, y, 1000), minmax_indices(y, 1000)):
+        assert len(idx) <= 1002
+        assert idx[0] == 0 and idx[-1] == len(x) - 1
+        assert np.all(np.diff(idx) > 0)
+
+
+def test_decimate_trace_keeps_peak_apexes():
+    x, y = _pattern()
+    apex = [int(np.argmax(np.where(np.abs(x - c) < 0.05, y, -np.inf))) for c in (28.44, 47.3)]
+    for method in ("lttb", "minmax"):
+        xs, ys = decimate_trace(x, y, max_points=500, method=method, keep_x=[28.44, 47.3])
+        assert len(xs) <= 510
+        for i in apex:
+            assert abs(ys[np.argmin(np.abs(xs - x[i]))] - y[i]) < 2.0
+
+    xs, ys = decimate_trace(x[:100], y[:100], max_points=500)
+    assert len(xs) == 100
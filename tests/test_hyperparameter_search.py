@@ -0,0 +1,89 @@
+import numpy as np
+
+from src.agents.xrd_agent.sub_agents.hyperparameter_optimizer.estimate import estimate_initial_parameters
+from src.agents.xrd_agent.sub_agents.hyperparameter_optimizer.search import (
+    DEFAULT_PARAMS, Dim, PipelineObjective, estimate_noise, search_space, tpe_search,
+)
+from src.agents.xrd_agent.sub_agents.peak_finder.tools import _voigt, fit_peak
+
+CENTERS = [28.44, 47.30, 56.12, 69.13, 76.38]
+
+
+def _pattern(seed=0):
+    rng = np.random.default_rng(seed)
+    x = np.linspace(10, 80, 3501)
+    y = 200 + 2 * x + sum(_voigt(x, h, c, 0.05, 0.04, 0) for c, h in zip(CENTERS, [3000, 1800, 1000, 300, 400]))
+    return x, rng.poisson(y).astype(float)
+
+
+def test_voigt_fit_recovers_height_and_width():
+    x = np.linspace(20, 40, 4001)
+    y = _voigt(x, 500, 28.44, 0.04, 0.03, 0) + np.random.default_rng(0).normal(0, 3, len(x))
+    pk = fit_peak(x, y, int(np.argmin(np.abs(x - 28.44))), 0.8)
+    true_fwhm = 0.5346 * 0.06 + np.sqrt(0.2166 * 0.06 ** 2 + (2.3548 * 0.04) ** 2)
+    assert abs(pk["two_theta"] - 28.44) < 0.005
+    assert abs(pk["intensity"] - 500) < 15
+    assert abs(pk["fwhm_deg"] - true_fwhm) < 0.01
+
+
+def test_noise_estimate_ignores_peaks():
+    rng = np.random.default_rng(1)
+    x = np.linspace(10, 80, 7001)
+    y = 50 + sum(_voigt(x, 5000, c, 0.05, 0.04, 0) for c in CENTERS) + rng.normal(0, 4.0, len(x))
+    assert abs(estimate_noise(y) - 4.0) < 0.4
+
+
+def test_initial_estimate_tracks_width_and_beats_defaults():
+    x, y = _pattern()
+    params, diag = estimate_initial_parameters(x, y)
+    # Voigt(sigma=0.05, gamma=0.04) has FWHM ~0.166°
+    assert 0.12 < diag["fwhm_deg"] < 0.22
+    assert params["smoothing_window"] % 2 == 1 and params["smoothing_window"] >= 5
+    assert 0.2 <= params["fit_window_deg"] <= 3.0
+
+    obj = PipelineObjective(x, y, reference_two_theta=CENTERS)
+    score, comps = obj(params)
+    assert comps["n_peaks"] == len(CENTERS)
+    assert score > obj(DEFAULT_PARAMS)[0]
+
+
+def test_dim_roundtrip():
+    d = Dim("w", 5, 101, log=True, kind="odd")
+    assert d.decode(0.0) == 5 and d.decode(1.0) == 101
+    assert d.decode(d.encode(31)) == 31
+
+
+def test_tpe_beats_defaults_and_is_deterministic():
+    x, y = _pattern()
+    obj = PipelineObjective(x, y, reference_two_theta=CENTERS)
+    default_score, _ = obj(DEFAULT_PARAMS)
+    space = search_space(x, obj.sigma)
+    r1 = tpe_search(obj, space, initial=[DEFAULT_PARAMS], seed=0)
+    r2 = tpe_search(obj, space, initial=[DEFAULT_PARAMS], seed=0)
+    assert r1["best"]["params"] == r2["best"]["params"]
+    assert r1["best"]["score"] > default_score + 0.1
+    assert r1["best"]["components"]["match"] >= 0.8
+
+
+def test_successive_halving_prunes_and_ranks():
+    from src.agents.xrd_agent.sub_agents.hyperparameter_optimizer.sweep import (
+        expand_grid, leaderboard_table, successive_halving,
+    )
+
+    x, y = _pattern()
+    grid = {
+        "smoothing_window": (11, 31), "smoothing_polyorder": (2, 3), "baseline_lambda": (1e5, 1e7),
+        "baseline_p": (0.01,), "peak_min_prominence": (2.0, 10.0), "peak_min_distance_pts": (5,),
+        "peak_min_height_rel": (0.02, 0.3), "fit_window_deg": (0.8,),
+    }
+    configs = expand_grid(grid, estimate_noise(y))
+    assert len(configs) == 32
+    result = successive_halving(x, y, configs, {"reference_two_theta": CENTERS}, eta=3, max_workers=1)
+
+    assert [r["n_configs"] for r in result["rungs"]] == [32, 11, 4]
+    assert result["rungs"][0]["n_preprocess_groups"] == 8
+    best = result["ranked"][0]
+    assert best["rung"] == 2 and best["params"]["peak_min_height_rel"] == 0.02
+    assert best["components"]["n_peaks"] == 5
+    assert leaderboard_table(result["ranked"], 3).count("\n") == 4
+    assert {v["value"] for v in result["sensitivity"]["peak_min_height_rel"]} == {0.02, 0.3}
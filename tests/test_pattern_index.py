@@ -0,0 +1,47 @@
+import numpy as np
+
+from src.data_store.pattern_index import PatternIndex, fingerprint_grid, pattern_fingerprint
+
+
+def _pattern(centers, theta=None, shift=0.0, fwhm=0.15):
+    theta = np.linspace(10, 80, 7001) if theta is None else theta
+    y = np.zeros_like(theta)
+    for c in centers:
+        y += np.exp(-4 * np.log(2) * ((theta - c - shift) / fwhm) ** 2)
+    return theta, y
+
+
+def test_fingerprint_keeps_sharp_peaks_on_coarse_grid():
+    theta, y = _pattern([30.0], theta=np.linspace(10, 80, 70001), fwhm=0.02)
+    fp = pattern_fingerprint(theta, y, fingerprint_grid(5, 90, 0.05), smooth_deg=0)
+    assert np.isclose(np.linalg.norm(fp), 1.0)
+    assert np.argmax(fp) == round((30.0 - 5) / 0.05)
+
+
+def test_nearest_neighbours_and_persistence(tmp_path):
+    rng = np.random.default_rng(1)
+    phases = {f"s{i}": np.sort(rng.uniform(15, 75, 6)) for i in range(20)}
+    index = PatternIndex(str(tmp_path))
+    for name, centers in phases.items():
+        index.add(name, *_pattern(centers), meta={"sample_name": name})
+
+    hits = index.search(*_pattern(phases["s7"], shift=0.03), k=3)
+    assert hits[0]["sample_name"] == "s7" and hits[0]["similarity"] > 0.9
+    assert hits[0]["similarity"] >= hits[1]["similarity"]
+
+    index.add("s7", *_pattern(phases["s3"]), meta={"sample_name": "s7-rerun"})
+    reopened = PatternIndex(str(tmp_path))
+    assert len(reopened) == 20
+    hits = reopened.search(*_pattern(phases["s3"]), k=2, exclude_key="s3")
+    assert hits[0]["sample_name"] == "s7-rerun"
+
+
+def test_pca_index_trains_after_buffer(tmp_path):
+    rng = np.random.default_rng(2)
+    phases = [np.sort(rng.uniform(15, 75, 5)) for _ in range(40)]
+    index = PatternIndex(str(tmp_path), pca_dim=16, pca_train_size=30)
+    for i, centers in enumerate(phases):
+        index.add(f"p{i}", *_pattern(centers), meta={"i": i})
+        assert index.trained == (i >= 29)
+    assert PatternIndex(str(tmp_path)).search(*_pattern(phases[35]), k=1)[0]["i"] == 35
+    assert index.search(*_pattern(phases[3]), k=1)[0]["i"] == 3
@@ -0,0 +1,86 @@
+import numpy as np
+
+from src.agents.xrd_agent.pipeline import clear_pipeline_cache, run_pipeline
+from src.agents.xrd_agent.sub_agents.peak_finder.tools import _voigt
+from src.data_store.data_store import XRD_DATA_STORE
+
+CENTERS = [28.44, 47.30, 56.12, 69.13, 76.38]
+
+
+def _write_pattern(path):
+    x = np.linspace(10, 80, 3501)
+    y = 200 + 2 * x + sum(_voigt(x, h, c, 0.05, 0.04, 0) for c, h in zip(CENTERS, [3000, 1800, 1000, 300, 400]))
+    y = np.random.default_rng(0).poisson(y).astype(float)
+    np.savetxt(path, np.column_stack([x, y]), delimiter=",", header="two_theta,intensity", comments="")
+
+
+def _status(result):
+    return {s["stage"]: s["status"] for s in result["stages"]}
+
+
+def test_pipeline_runs_all_stages_and_recomputes_only_changed_ones(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    clear_pipeline_cache()
+    path = str(tmp_path / "scan.csv")
+    _write_pattern(path)
+    payload = {"path": path, "sample_name": "scan", "plot": False}
+
+    first = run_pipeline(payload)
+    assert first["success"], first["message"]
+    assert set(_status(first).values()) == {"done"}
+    found = sorted(p["two_theta"] for p in first["results"]["peaks"])
+    assert len(found) == 5 and np.allclose(found, CENTERS, atol=0.02)
+    assert (tmp_path / "xrd_outputs" / "scan_report_1.json").exists()
+
+    again = run_pipeline(payload)
+    assert _status(again) == {**{s: "cached" for s in _status(first)}, "report": "done"}
+    assert again["results"]["peaks"] == first["results"]["peaks"]
+
+    changed = run_pipeline({**payload, "peak_min_height_rel": 0.2})
+    status = _status(changed)
+    assert [status[s] for s in ("load", "estimate", "preprocess")] == ["cached"] * 3
+    assert status["peaks"] == status["scherrer_wh"] == "done"
+    assert len(changed["results"]["peaks"]) < 5
+    # the store holds what the last run computed
+    assert len(XRD_DATA_STORE[path]["loops"][1]["peaks"]) == len(changed["results"]["peaks"])
+
+
+def test_pipeline_runs_requested_stages_and_ancestors_only(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    path = str(tmp_path / "scan.csv")
+    _write_pattern(path)
+
+    result = run_pipeline({"path": path, "sample_name": "scan"}, stages=["peaks"])
+    assert [s["stage"] for s in result["stages"]] == ["load", "estimate", "preprocess", "peaks"]
+    assert not (tmp_path / "xrd_outputs" / "scan_report_1.json").exists()
+
+
+def test_identical_files_at_two_paths_do_not_share_the_load(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    clear_pipeline_cache()
+    a, b = str(tmp_path / "a.csv"), str(tmp_path / "b.csv")
+    _write_pattern(a)
+    _write_pattern(b)
+
+    run_pipeline({"path": a, "sample_name": "scan"}, stages=["load"])
+    second = run_pipeline({"path": b, "sample_name": "scan"}, stages=["load"])
+    assert _status(second)["load"] == "done"
+    assert XRD_DATA_STORE[b]["meta"]["path"] == b
+
+
+def test_memo_is_bounded_by_bytes(tmp_path, monkeypatch):
+    from src.agents.xrd_agent import pipeline
+
+    monkeypatch.chdir(tmp_path)
+    clear_pipeline_cache()
+    path = str(tmp_path / "scan.csv")
+    _write_pattern(path)
+    run_pipeline({"path": path, "sample_name": "scan"}, stages=["preprocess"])
+    full = pipeline._MEMO_BYTES
+    assert full == sum(s["nbytes"] for s in pipeline._MEMO.values()) > 0
+
+    clear_pipeline_cache()
+    monkeypatch.setattr(pipeline, "_MEMO_MAX_BYTES", full // 2)
+    run_pipeline({"path": path, "sample_name": "scan"}, stages=["preprocess"])
+    assert 0 < pipeline._MEMO_BYTES <= full // 2
+    assert len(pipeline._MEMO) < 3
@@ -0,0 +1,55 @@
+import logging
+from types import SimpleNamespace
+
+import numpy as np
+
+from src.agents.xrd_agent.sub_agents.reporter.tools import plotter
+from src.data_store.data_store import XRD_DATA_STORE
+from src.run_paths import RunPaths, use_run_paths
+
+
+def _plot(tmp_path, **payload):
+    x = np.linspace(10, 80, 20001)
+    y = 100 + 1000 * np.exp(-0.5 * ((x - 28.44) / 0.05) ** 2)
+    with use_run_paths(RunPaths.under(tmp_path)), XRD_DATA_STORE.namespace("plot", end_on_exit=False):
+        XRD_DATA_STORE["scan.csv"] = {
+            "two_theta_deg": x, "intensity": y, "meta": {},
+            "loops": {1: {"intensity_smooth": y, "intensity_corr": y - 100, "meta": {"sample_name": "scan"},
+                          "peaks": [{"two_theta": 28.44}]}},
+        }
+        ctx = SimpleNamespace(state={"loop_iteration": 1})
+        result = plotter.plot_results({"path": "scan.csv", **payload}, ctx)
+    XRD_DATA_STORE.drop_namespace("plot")
+    return result
+
+
+def _drain():
+    # the export executor has a single worker, so this runs after everything queued before it
+    plotter._static_executor().submit(lambda: None).result()
+
+
+def test_agg_backend_writes_png_inline_and_deferred(tmp_path):
+    inline = _plot(tmp_path)
+    png = tmp_path / "xrd_outputs" / "scan_pattern_1.png"
+    assert inline["success"] and str(png) in inline["figures"]
+    assert png.read_bytes()[:8] == b"\x89PNG\r\n\x1a\n"
+    png.unlink()
+
+    deferred = _plot(tmp_path, defer_static=True)
+    assert deferred["deferred_figures"] == [str(png)] and str(png) not in deferred["figures"]
+    _drain()
+    assert png.read_bytes()[:8] == b"\x89PNG\r\n\x1a\n"
+    assert str(png) not in plotter._PENDING_STATIC
+
+
+def test_failed_deferred_export_is_logged_and_forgotten(tmp_path, monkeypatch, caplog):
+    def broken(png_path, *args):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(plotter, "_render_png_agg", broken)
+    with caplog.at_level(logging.WARNING, logger=plotter.__name__):
+        result = _plot(tmp_path, defer_static=True)
+        _drain()
+    assert result["success"]
+    assert not plotter._PENDING_STATIC
+    assert "disk full" in caplog.text
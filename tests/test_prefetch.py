@@ -0,0 +1,43 @@
+import threading
+
+from src.agents.xrd_agent.sub_agents.reference_check.tools import prefetch
+
+
+def test_prefetch_is_keyed_by_wavelength_and_forgotten_once_awaited(monkeypatch):
+    calls = []
+    monkeypatch.setattr(prefetch, "_prefetch", lambda ident, wl: calls.append((ident, wl)) or {"material_ids": [ident]})
+
+    assert prefetch.start_reference_prefetch("my sample") is None
+    cu = prefetch.start_reference_prefetch("mp-149", 1.5406)
+    mo = prefetch.start_reference_prefetch("mp-149", 0.7093)
+    assert cu != mo
+    assert prefetch.start_reference_prefetch("mp-149", 1.5406) == cu
+
+    assert prefetch.await_reference_prefetch(cu) == {"material_ids": ["mp-149"]}
+    assert prefetch.await_reference_prefetch(mo) == {"material_ids": ["mp-149"]}
+    assert sorted(calls) == [("mp-149", 0.7093), ("mp-149", 1.5406)]
+    assert cu not in prefetch._PREFETCHES and mo not in prefetch._PREFETCHES
+    assert prefetch.await_reference_prefetch(cu) is None
+
+
+def test_prefetch_errors_and_timeouts_are_reported_not_raised(monkeypatch):
+    release = threading.Event()
+
+    def fake(ident, wl):
+        if ident == "Si":
+            raise RuntimeError("MP unavailable")
+        release.wait(5)
+        return {"material_ids": []}
+
+    monkeypatch.setattr(prefetch, "_prefetch", fake)
+    failed = prefetch.start_reference_prefetch("Si")
+    assert "MP unavailable" in prefetch.await_reference_prefetch(failed)["_error"]
+    assert failed not in prefetch._PREFETCHES
+
+    slow = prefetch.start_reference_prefetch("GaN")
+    assert "_error" in prefetch.await_reference_prefetch(slow, timeout=0.05)
+    # still running: kept so a later await can pick it up
+    assert slow in prefetch._PREFETCHES
+    release.set()
+    assert prefetch.await_reference_prefetch(slow) == {"material_ids": []}
+    assert slow not in prefetch._PREFETCHES
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from src.data_store.data_store import XRD_DATA_STORE
+from src.data_store.pyramid import ViewportPyramid, encode_viewport
+
+
+def _trace(n=100_000, seed=0):
+    x = np.linspace(10, 80, n)
+    y = np.random.default_rng(seed).normal(100, 5, n)
+    y[n // 3] = 5000   # a one-sample spike any decimation must keep
+    y[2 * n // 3] = -300
+    return x, y
+
+
+def test_query_picks_level_from_requested_resolution():
+    x, y = _trace()
+    pyramid = ViewportPyramid(x, y)
+    assert not hasattr(pyramid, "y") and not hasattr(pyramid, "x")
+
+    xs, ys, level = pyramid.query(x, y, points=2000)
+    assert level > 0 and len(xs) <= 2000 and np.all(np.diff(xs) > 0)
+    # a narrow window needs no decimation at all
+    xs, ys, level = pyramid.query(x, y, 40.0, 40.1, points=2000)
+    assert level == 0 and np.array_equal(xs, x[(x >= x[x < 40.0][-1]) & (x <= x[x > 40.1][0])])
+    # finer requests use finer levels
+    assert pyramid.query(x, y, points=20_000)[2] < pyramid.query(x, y, points=500)[2]
+
+
+def test_query_preserves_extremes_and_handles_unsorted_scans():
+    x, y = _trace()
+    pyramid = ViewportPyramid(x, y)
+    for points in (50, 500, 5000):
+        _, ys, _ = pyramid.query(x, y, points=points)
+        assert ys.max() == y.max() and ys.min() == y.min()
+
+    perm = np.random.default_rng(1).permutation(len(x))
+    shuffled = ViewportPyramid(x[perm], y[perm])
+    xs, ys, _ = shuffled.query(x[perm], y[perm], points=500)
+    assert np.all(np.diff(xs) > 0) and ys.max() == y.max()
+    with pytest.raises(ValueError):
+        pyramid.query(x[:10], y[:10])
+
+
+def test_encode_viewport_layout():
+    x = np.array([1.0, 2.5, 3.0])
+    y = np.array([10.0, -1.0, 7.5])
+    buf = encode_viewport(x, y)
+    assert len(buf) == 4 + 4 * 3 * 2
+    assert np.frombuffer(buf[:4], "<u4")[0] == 3
+    np.testing.assert_array_equal(np.frombuffer(buf[4:16], "<f4"), x)
+    np.testing.assert_array_equal(np.frombuffer(buf[16:], "<f4"), y)
+
+
+def test_viewport_endpoint(monkeypatch, tmp_path):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("XRD_CHECKPOINTS", "0")
+    monkeypatch.setenv("XRD_CHECKPOINT_DIR", str(tmp_path))
+    main = pytest.importorskip("backend.app.main")
+    from starlette.testclient import TestClient
+
+    x, y = _trace()
+    with XRD_DATA_STORE.namespace("viewport-run", end_on_exit=False):
+        XRD_DATA_STORE["/data/scan.csv"] = {"two_theta_deg": x, "intensity": y, "meta": {},
+                                            "loops": {1: {"intensity_corr": y - 100}}}
+    monkeypatch.setitem(main.RUN_INPUTS, "viewport-run", {"input": "", "paths": ["/data/scan.csv"]})
+    try:
+        client = TestClient(main.app)
+        res = client.get("/api/runs/viewport-run/data", params={"points": 1000})
+        assert res.status_code == 200 and res.headers["X-Loop"] == "1"
+        n = int(res.headers["X-Points"])
+        assert 0 < n <= 1000 and int(res.headers["X-Total-Points"]) == len(x)
+        assert len(res.content) == 4 + 8 * n
+        assert np.frombuffer(res.content[4 + 4 * n:], "<f4").max() == np.float32(y.max() - 100)
+
+        res = client.get("/api/runs/viewport-run/data", params={"trace": "raw", "xmin": 40, "xmax": 40.1, "format": "json"})
+        assert res.json()["level"] == 0 and min(res.json()["x"]) < 40.0 < 40.1 < max(res.json()["x"])
+
+        assert client.get("/api/runs/viewport-run/data", params={"trace": "peaks"}).status_code == 400
+        assert client.get("/api/runs/viewport-run/data", params={"loop": 7}).status_code == 404
+        assert client.get("/api/runs/nope/data").status_code == 404
+    finally:
+        XRD_DATA_STORE.drop_namespace("viewport-run")
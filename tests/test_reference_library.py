@@ -0,0 +1,71 @@
+import numpy as np
+
+from src.agents.xrd_agent.sub_agents.reference_check.tools.reference_library import (
+    ReferenceLibrary,
+    element_mask,
+    mask_to_elements,
+)
+
+
+def _library() -> ReferenceLibrary:
+    lib = ReferenceLibrary(capacity=2)
+    lib.add("mp-19395", ["Mn", "O"], formula="MnO2", space_group=136)
+    lib.add("mp-1221", ["Mn", "O"], formula="MnO", space_group=225)
+    lib.add("mp-25731", ["Li", "Mn", "O"], formula="LiMn2O4", space_group=227)
+    lib.add("mp-149", ["Si"], formula="Si", space_group=227)
+    lib.add("mp-1143", ["Al", "O"], formula="Al2O3", space_group=167)
+    return lib
+
+
+def test_element_mask_roundtrip():
+    mask = element_mask(["O", "Og", "H", "mn"])
+    assert mask.dtype == np.uint64 and mask.shape == (2,)
+    assert mask_to_elements(mask) == ["H", "O", "Mn", "Og"]
+
+
+def test_select_by_elements():
+    lib = _library()
+    ids = lambda rows: set(lib.material_ids(rows))
+
+    assert ids(lib.select(allowed_elements=["Mn", "O"])) == {"mp-19395", "mp-1221"}
+    assert ids(lib.select(required_elements=["Mn"], forbidden_elements=["Li"])) == {"mp-19395", "mp-1221"}
+    assert ids(lib.select(forbidden_elements=["O"])) == {"mp-149"}
+
+
+def test_select_by_symmetry_and_row_subset():
+    lib = _library()
+    rows = lib.select(crystal_systems=["cubic"])
+    assert set(lib.material_ids(rows)) == {"mp-1221", "mp-25731", "mp-149"}
+    assert lib.row(rows[0])["crystal_system"] == "cubic"
+
+    sub = lib.select(rows=rows, space_groups=[227], required_elements=["O"])
+    assert lib.material_ids(sub) == ["mp-25731"]
+
+
+def test_add_docs_updates_existing_rows():
+    lib = _library()
+    rows = lib.add_docs([
+        {"material_id": "mp-149", "formula_pretty": "Si", "elements": ["Si"],
+         "symmetry": {"number": 227, "crystal_system": "Cubic"}},
+        {"material_id": "mp-2657", "formula_pretty": "TiO2", "chemsys": "O-Ti"},
+    ])
+    assert len(lib) == 6
+    assert lib.row(rows[1])["elements"] == ["O", "Ti"]
+    assert lib.row(rows[1])["crystal_system"] is None
+
+
+def test_concurrent_adds_keep_rows_consistent():
+    from concurrent.futures import ThreadPoolExecutor
+
+    lib = ReferenceLibrary(capacity=1)
+    ids = [f"mp-{i % 700}" for i in range(2000)]
+
+    def add(i):
+        return lib.add(ids[i], ["Si"] if i % 2 else ["Ga", "N"], space_group=227)
+
+    with ThreadPoolExecutor(8) as pool:
+        rows = list(pool.map(add, range(len(ids))))
+    assert len(lib) == len(set(ids))
+    for material_id, row in zip(ids, rows):
+        assert lib.material_ids([row]) == [material_id]
+        assert lib.row(row)["space_group"] == 227 and lib.row(row)["elements"]
@@ -0,0 +1,104 @@
+import numpy as np
+
+from src.agents.xrd_agent.sub_agents.reference_check.tools.multiphase_match import (
+    build_profile_matrix,
+    greedy_nnls,
+)
+from src.agents.xrd_agent.sub_agents.reference_check.tools.profile_similarity import cross_correlation_scores
+
+
+def test_greedy_nnls_recovers_two_phase_mixture():
+    theta = np.linspace(10, 80, 7001)
+    rng = np.random.default_rng(0)
+    n_cand = 40
+    pos = rng.uniform(12, 78, n_cand * 15)
+    inten = rng.uniform(5, 100, n_cand * 15)
+    owner = np.repeat(np.arange(n_cand), 15)
+
+    A = build_profile_matrix(theta, pos, inten, owner, n_cand, fwhm_deg=0.2)
+    assert A.shape == (len(theta), n_cand)
+    assert np.allclose(A.max(axis=0), 1.0)
+
+    y = 0.6 * A[:, 3] + 0.25 * A[:, 17] + rng.normal(0, 0.002, len(theta))
+    selected, weights, history = greedy_nnls(A, y, max_phases=4)
+
+    assert sorted(selected) == [3, 17]
+    assert np.allclose(sorted(weights), [0.25, 0.6], atol=0.02)
+    assert history[-1] < 0.1 and history == sorted(history, reverse=True)
+
+
+def test_cross_correlation_recovers_zero_shift():
+    theta = np.linspace(10, 80, 7001)
+    pos = np.array([20.0, 31.5, 45.2, 56.1, 66.7, 20.0, 38.0])
+    inten = np.array([100.0, 60.0, 40.0, 30.0, 20.0, 100.0, 80.0])
+    owner = np.array([0, 0, 0, 0, 0, 1, 1])
+    refs = build_profile_matrix(theta, pos, inten, owner, 2, fwhm_deg=0.15).T
+
+    y = build_profile_matrix(theta, pos[:5] + 0.123, inten[:5], np.zeros(5, dtype=np.intp), 1, 0.15)[:, 0]
+    shifts, scores = cross_correlation_scores(y, refs, step_deg=theta[1] - theta[0], max_shift_deg=0.5)
+
+    assert abs(shifts[0] - 0.123) < 0.003
+    assert scores[0] > 0.99 > scores[1]
+
+
+def test_blocked_similarity_groups_shifted_patterns():
+    from src.agents.xrd_agent.sub_agents.reference_check.tools.cluster_patterns import (
+        blocked_similarity, cluster_from_similarity, cluster_representatives,
+    )
+    from src.data_store.pattern_index import fingerprint_grid, pattern_fingerprint
+
+    rng = np.random.default_rng(3)
+    theta = np.linspace(10, 80, 7001)
+    grid = fingerprint_grid(5, 90, 0.05)
+    phases = [np.sort(rng.uniform(15, 75, 6)) for _ in range(3)]
+    X, truth = [], []
+    for k, centers in enumerate(phases):
+        for _ in range(7):
+            shift = rng.uniform(-0.15, 0.15)
+            y = sum(np.exp(-4 * np.log(2) * ((theta - c - shift) / 0.08) ** 2) for c in centers)
+            X.append(pattern_fingerprint(theta, y + 0.01 * rng.random(len(theta)), grid, smooth_deg=0))
+            truth.append(k)
+    X = np.array(X)
+
+    S_full = blocked_similarity(X, max_shift_bins=4, block_size=1000)
+    S_tiled = blocked_similarity(X, max_shift_bins=4, block_size=4)
+    np.testing.assert_allclose(S_tiled, S_full, atol=1e-6)
+    np.testing.assert_allclose(S_full, S_full.T)
+
+    labels = cluster_from_similarity(S_full, X, threshold=0.6)
+    assert len(set(labels)) == 3
+    for k in range(3):
+        assert len(set(labels[np.array(truth) == k])) == 1
+
+    clusters = cluster_representatives(S_full, labels)
+    assert sorted(c["cluster"] for c in clusters) == [0, 1, 2]
+    assert all(truth[c["representative"]] == truth[c["members"][0]] for c in clusters)
+
+
+def test_cluster_patterns_lists_current_run_or_every_run():
+    from types import SimpleNamespace
+    from src.agents.xrd_agent.sub_agents.reference_check.tools.cluster_patterns import cluster_patterns
+    from src.data_store.data_store import XRD_DATA_STORE
+
+    theta = np.linspace(10, 80, 3501)
+
+    def pattern(center):
+        return {"two_theta_deg": theta, "intensity": np.exp(-0.5 * ((theta - center) / 0.1) ** 2),
+                "meta": {}, "loops": {}}
+
+    ctx = SimpleNamespace(state={"loop_iteration": 1})
+    try:
+        with XRD_DATA_STORE.namespace("cluster-a", end_on_exit=False):
+            XRD_DATA_STORE["/data/si.xy"] = pattern(28.4)
+            XRD_DATA_STORE["/data/si2.xy"] = pattern(28.45)
+        with XRD_DATA_STORE.namespace("cluster-b", end_on_exit=False):
+            XRD_DATA_STORE["/data/gan.xy"] = pattern(34.5)
+            own = cluster_patterns({}, ctx)
+            both = cluster_patterns({"namespaces": ["cluster-a", "cluster-b"]}, ctx)
+        assert own["success"] and own["n_patterns"] == 1
+        assert both["n_patterns"] == 3 and both["n_clusters"] == 2
+        members = sorted(sorted(c["members"]) for c in both["clusters"])
+        assert members == [["cluster-a::/data/si.xy", "cluster-a::/data/si2.xy"], ["cluster-b::/data/gan.xy"]]
+    finally:
+        XRD_DATA_STORE.drop_namespace("cluster-a")
+        XRD_DATA_STORE.drop_namespace("cluster-b")
@@ -0,0 +1,81 @@
+import pytest
+from pymatgen.core import Lattice, Structure
+
+from src.agents.xrd_agent.sub_agents.reference_check.tools.fetch_mp_xrd import fetch_mp_xrd_lines, search_mp_candidates
+from src.agents.xrd_agent.sub_agents.reference_check.tools.providers import (
+    LocalProvider,
+    ReplayProvider,
+    provider_from_config,
+    set_reference_provider,
+)
+from src.run_paths import RunPaths, use_run_paths
+
+
+@pytest.fixture()
+def reference_dir(tmp_path):
+    si = Structure.from_spacegroup("Fd-3m", Lattice.cubic(5.431), ["Si"], [[0, 0, 0]])
+    rutile = Structure.from_spacegroup(
+        "P4_2/mnm", Lattice.tetragonal(4.594, 2.959), ["Ti", "O"], [[0, 0, 0], [0.305, 0.305, 0]]
+    )
+    anatase = Structure.from_spacegroup(
+        "I4_1/amd", Lattice.tetragonal(3.785, 9.514), ["Ti", "O"], [[0, 0.75, 0.125], [0, 0.75, 0.333]]
+    )
+    si.to(filename=str(tmp_path / "mp-149.cif"))
+    rutile.to(filename=str(tmp_path / "mp-2657.json"))
+    anatase.to(filename=str(tmp_path / "mp-390.cif"))
+    (tmp_path / "energies.json").write_text('{"mp-2657": 0.0, "mp-390": 0.006}')
+    yield tmp_path
+    set_reference_provider(None)
+
+
+def test_local_provider_lookup_and_search(reference_dir):
+    provider = LocalProvider(str(reference_dir))
+    assert provider.get_structure("TiO2")["material_id"] == "mp-2657"
+    assert "_error" in provider.get_structure("mp-0")
+
+    entries = provider.search(chemsys="O-Ti")
+    assert [e.material_id for e in entries] == ["mp-2657", "mp-390"]
+    assert entries[0].symmetry["crystal_system"] == "tetragonal"
+
+    set_reference_provider(provider)
+    ref = fetch_mp_xrd_lines("mp-149", two_theta_min=20, two_theta_max=60, top_n=3)
+    assert ref["formula"] == "Si"
+    assert abs(ref["peaks"][0]["two_theta"] - 28.44) < 0.05
+
+
+def test_replay_provider_records_and_replays(reference_dir, tmp_path):
+    recording = str(tmp_path / "rec" / "recording.json")
+    recorder = ReplayProvider(recording, upstream=LocalProvider(str(reference_dir)))
+    recorded = [e.material_id for e in recorder.search(formula="TiO2")]
+    assert recorder.get_structure("mp-149")["formula"] == "Si"
+
+    replay = ReplayProvider(recording)
+    assert [e.material_id for e in replay.search(formula="TiO2")] == recorded
+    assert replay.get_structure("mp-149")["structure"].composition.reduced_formula == "Si"
+    assert "_error" in replay.get_structure("mp-390")
+    with pytest.raises(LookupError):
+        replay.search(formula="SiO2")
+
+    set_reference_provider(replay)
+    assert [e.material_id for e in search_mp_candidates(formula="TiO2")] == recorded
+
+
+def test_structure_cache_is_per_data_source(reference_dir, tmp_path):
+    other = tmp_path / "other"
+    other.mkdir()
+    Structure.from_spacegroup("Fm-3m", Lattice.cubic(5.658), ["Ge"], [[0, 0, 0]]).to(filename=str(other / "mp-149.cif"))
+
+    set_reference_provider(LocalProvider(str(reference_dir)))
+    assert fetch_mp_xrd_lines("mp-149")["formula"] == "Si"
+    set_reference_provider(LocalProvider(str(other)))
+    assert fetch_mp_xrd_lines("mp-149")["formula"] == "Ge"
+
+
+def test_default_provider_paths_resolve_against_the_run_root(tmp_path, monkeypatch):
+    monkeypatch.delenv("XRD_REFERENCE_DIR", raising=False)
+    monkeypatch.delenv("XRD_REFERENCE_RECORDING", raising=False)
+    with use_run_paths(RunPaths.under(str(tmp_path))):
+        monkeypatch.setenv("XRD_REFERENCE_PROVIDER", "local")
+        assert provider_from_config().directory == str(tmp_path / "reference_structures")
+        monkeypatch.setenv("XRD_REFERENCE_PROVIDER", "replay")
+        assert provider_from_config().recording_path == str(tmp_path / "reference_structures" / "recording.json")
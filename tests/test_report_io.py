@@ -0,0 +1,43 @@
+import json
+
+import numpy as np
+
+from src.agents.xrd_agent.sub_agents.reporter.tools.report_io import load_report, resolve_array, write_report
+
+
+def _store():
+    rng = np.random.default_rng(0)
+    return {
+        "intensity_smooth": rng.random(5000),
+        "intensity_corr": rng.random(5000).astype(np.float32),
+        "peaks": [{"two_theta": np.float64(28.44), "fwhm_deg": 0.12}],
+        "meta": {"sample_name": "Si", "smoothing_window": np.int64(31)},
+        "grid": {"counts": np.arange(12).reshape(3, 4)},
+    }
+
+
+def test_report_roundtrip_memory_mapped(tmp_path):
+    store = _store()
+    jpath, npz_path = write_report(store, str(tmp_path / "Si_report_1.json"))
+    assert npz_path.endswith("Si_report_1.npz")
+
+    with open(jpath) as f:
+        summary = json.load(f)
+    assert summary["intensity_corr"] == {"__array__": "intensity_corr", "dtype": "float32", "shape": [5000]}
+    assert summary["peaks"][0]["two_theta"] == 28.44 and summary["meta"]["smoothing_window"] == 31
+
+    report = load_report(jpath)
+    corr = resolve_array(report, report["intensity_corr"])
+    assert isinstance(corr, np.memmap) and not corr.flags.writeable
+    np.testing.assert_array_equal(corr, store["intensity_corr"])
+    np.testing.assert_array_equal(resolve_array(report, report["grid"]["counts"]), store["grid"]["counts"])
+    assert set(report["arrays"]) == {"intensity_smooth", "intensity_corr", "grid.counts"}
+
+
+def test_compressed_report_loads_lazily(tmp_path):
+    store = _store()
+    jpath, _ = write_report(store, str(tmp_path / "r.json"), compress=True)
+    report = load_report(jpath)
+    smooth = report["arrays"]["intensity_smooth"]
+    assert not isinstance(smooth, np.memmap)
+    np.testing.assert_array_equal(smooth, store["intensity_smooth"])
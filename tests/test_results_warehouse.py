@@ -0,0 +1,53 @@
+from src.data_store.warehouse import ResultsWarehouse
+
+
+def _loop(name, peaks, sizes, mp_id=None):
+    return {
+        "meta": {"sample_name": name, "wavelength_angstrom": 1.5406},
+        "peaks": [{"two_theta": t, "intensity": 100.0, "fwhm_deg": 0.2, "area": 30.0} for t in peaks],
+        "scherrer": [{"two_theta": t, "L_nm": s, "beta_deg": 0.2} for t, s in zip(peaks, sizes)],
+        "williamson_hall": None,
+        "mp_identifier": mp_id,
+        "mp_candidates": [{"material_id": mp_id, "formula": "Si", "confidence": 0.9}] if mp_id else [],
+    }
+
+
+def test_interval_and_size_query(tmp_path):
+    wh = ResultsWarehouse(str(tmp_path / "results.sqlite"))
+    wh.record("/data/a.xy", 1, _loop("a", [28.44, 47.3], [12.0, 14.0], "mp-149"))
+    wh.record("/data/b.xy", 1, _loop("b", [28.40, 56.1], [40.0, 42.0]))
+    wh.record("/data/c.xy", 1, _loop("c", [31.7, 45.4], [10.0, 11.0]))
+
+    runs = wh.query(two_theta_min=28.2, two_theta_max=28.6, max_size_nm=20)
+    assert [r["sample_name"] for r in runs] == ["a"]
+    assert [p["two_theta"] for p in runs[0]["peaks"]] == [28.44]
+    assert runs[0]["peaks"][0]["size_nm"] == 12.0
+    assert runs[0]["phases"][0]["material_id"] == "mp-149"
+
+    assert {r["sample_name"] for r in wh.query(two_theta_min=28.2, two_theta_max=28.6)} == {"a", "b"}
+    assert [r["sample_name"] for r in wh.query(material_id="mp-149")] == ["a"]
+
+
+def test_append_only_latest(tmp_path):
+    wh = ResultsWarehouse(str(tmp_path / "results.sqlite"))
+    wh.record("/data/a.xy", 1, _loop("a", [28.44], [12.0]))
+    wh.record("/data/a.xy", 1, _loop("a", [28.46], [15.0]))
+    assert [r["mean_size_nm"] for r in wh.query(sample_name="a")] == [15.0]
+    assert len(wh.query(sample_name="a", latest_only=False)) == 2
+
+
+def test_interval_query_uses_index(tmp_path):
+    wh = ResultsWarehouse(str(tmp_path / "results.sqlite"))
+    wh.record("/data/a.xy", 1, _loop("a", [28.44], [12.0]))
+    with wh._connect() as conn:
+        plan = " ".join(r[-1] for r in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT run_id FROM peaks WHERE two_theta BETWEEN 28 AND 29"))
+    assert "idx_peaks_two_theta" in plan
+
+
+def test_in_memory_warehouse_keeps_its_data():
+    wh = ResultsWarehouse(":memory:")
+    wh.record("/data/a.xy", 1, _loop("a", [28.44], [12.0], "mp-149"))
+    wh.record("/data/b.xy", 1, _loop("b", [31.7], [20.0]))
+    assert [r["sample_name"] for r in wh.query(two_theta_min=28, two_theta_max=29)] == ["a"]
+    assert len(wh.query()) == 2
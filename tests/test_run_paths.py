@@ -0,0 +1,61 @@
+import asyncio
+import os
+
+import numpy as np
+
+from src.agents.async_tools import run_blocking
+from src.agents.xrd_agent.pipeline import run_pipeline
+from src.agents.xrd_agent.sub_agents.peak_finder.tools import _voigt
+from src.data_store.data_store import XRD_DATA_STORE, canonical_key
+from src.run_paths import RunPaths, current_run_paths, use_run_paths
+
+
+def _write_pattern(path, center):
+    x = np.linspace(10, 80, 3501)
+    y = 200 + _voigt(x, 3000, center, 0.05, 0.04, 0)
+    np.savetxt(path, np.column_stack([x, y]), delimiter=",", header="two_theta,intensity", comments="")
+
+
+def test_relative_paths_resolve_against_the_current_run(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    paths = RunPaths.under(tmp_path / "project", outputs="/data/out")
+    assert current_run_paths().root == str(tmp_path)
+    with use_run_paths(paths):
+        assert canonical_key("scan.csv") == canonical_key(tmp_path / "project" / "scan.csv")
+        assert current_run_paths().resolve("/abs/scan.csv") == os.path.normpath("/abs/scan.csv")
+        assert current_run_paths().output("a.json") == os.path.join("/data/out", "a.json")
+        assert current_run_paths().paper("vector_store") == str(tmp_path / "project" / "papers" / "vector_store")
+    assert current_run_paths().root == str(tmp_path)
+
+
+def test_concurrent_runs_read_and_write_under_their_own_roots(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    roots = {"a": 30.0, "b": 50.0}
+    for name, center in roots.items():
+        os.makedirs(tmp_path / name)
+        _write_pattern(tmp_path / name / "scan.csv", center)
+
+    async def run(name):
+        with use_run_paths(RunPaths.under(tmp_path / name)), XRD_DATA_STORE.namespace(f"paths-{name}", end_on_exit=False):
+            payload = {"path": "scan.csv", "sample_name": "scan", "plot": False}
+            result = await run_blocking(run_pipeline, payload, use_cache=False)
+            return result, os.getcwd()
+
+    async def main():
+        return await asyncio.gather(*(run(name) for name in roots))
+
+    try:
+        outcomes = asyncio.run(main())
+    finally:
+        for name in roots:
+            XRD_DATA_STORE.drop_namespace(f"paths-{name}")
+
+    for (result, cwd), (name, center) in zip(outcomes, roots.items()):
+        assert result["success"], result["message"]
+        assert cwd == str(tmp_path)
+        # each run analysed its own scan.csv
+        found = [p["two_theta"] for p in result["results"]["peaks"]]
+        assert any(abs(t - center) < 0.02 for t in found)
+        assert not any(abs(t - other) < 1 for t in found for other in roots.values() if other != center)
+        assert (tmp_path / name / "xrd_outputs" / "scan_report_1.json").exists()
+    assert not (tmp_path / "xrd_outputs").exists()
@@ -0,0 +1,52 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+
+from src.data_store.shared_arrays import SharedArrayRegistry, attach, attach_all
+
+
+def _checksum(ref):
+    view = attach(ref)
+    return float(view.sum()), view.flags.writeable
+
+
+def test_workers_attach_published_arrays():
+    registry = SharedArrayRegistry()
+    data = np.random.default_rng(0).random(100_000)
+    ref = registry.publish(data, owner="run")
+
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        results = list(pool.map(_checksum, [ref] * 4))
+
+    assert results == [(pytest.approx(float(data.sum())), False)] * 4
+    registry.release_owner("run")
+
+
+def test_refcounted_dedup_and_cleanup():
+    registry = SharedArrayRegistry(min_bytes=1024)
+    data = np.arange(10_000, dtype=float)
+    a = registry.publish(data, owner="run-a")
+    b = registry.publish(data.copy(), owner="run-b")
+    assert a == b and registry.usage()["segments"] == 1
+
+    registry.release_owner("run-a")
+    np.testing.assert_array_equal(attach(b), data)
+    registry.release(b, owner="run-b")
+    assert registry.usage()["segments"] == 0
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=b.name)
+
+
+def test_share_payload_round_trip():
+    registry = SharedArrayRegistry(min_bytes=1024)
+    payload = {"theta": np.linspace(10, 80, 5000), "small": np.ones(3), "meta": {"name": "x"}, "params": [1, 2]}
+    shared = registry.share(payload, owner="run")
+
+    assert type(shared["theta"]).__name__ == "SharedArray"
+    assert isinstance(shared["small"], np.ndarray)
+    restored = attach_all(shared)
+    np.testing.assert_array_equal(restored["theta"], payload["theta"])
+    assert restored["meta"] == {"name": "x"} and restored["params"] == [1, 2]
+    registry.release_owner("run")
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+from pymatgen.core import Lattice, Structure
+from pymatgen.analysis.diffraction.xrd import XRDCalculator
+
+from src.agents.xrd_agent.sub_agents.reference_check.tools.simulate_pattern import (
+    clear_reflection_cache,
+    get_reflection_table,
+    simulate_pattern,
+    structure_hash,
+)
+
+
+def _structures():
+    si = Structure.from_spacegroup("Fd-3m", Lattice.cubic(5.431), ["Si"], [[0, 0, 0]])
+    zno = Structure.from_spacegroup(
+        "P6_3mc", Lattice.hexagonal(3.25, 5.207), ["Zn", "O"], [[1 / 3, 2 / 3, 0], [1 / 3, 2 / 3, 0.382]]
+    )
+    rutile = Structure.from_spacegroup(
+        "P4_2/mnm", Lattice.tetragonal(4.594, 2.959), ["Ti", "O"], [[0, 0, 0], [0.305, 0.305, 0]]
+    )
+    mixed = Structure(Lattice.cubic(4.2), [{"Mg": 0.5, "Fe": 0.5}, "O"], [[0, 0, 0], [0.5, 0.5, 0.5]])
+    return [si, zno, rutile, mixed]
+
+
+@pytest.mark.parametrize("structure", _structures(), ids=["Si", "ZnO", "TiO2", "MgFeO"])
+@pytest.mark.parametrize("wavelength, tt_range", [(1.5406, (10, 90)), (0.7093, (5, 60)), (1.5406, (30, 150))])
+def test_matches_pymatgen(structure, wavelength, tt_range):
+    clear_reflection_cache()
+    ref = XRDCalculator(wavelength=wavelength).get_pattern(structure, two_theta_range=tt_range)
+    ours = simulate_pattern(structure, wavelength, *tt_range)
+
+    assert len(ours["two_theta"]) == len(ref.x)
+    np.testing.assert_allclose(ours["two_theta"], ref.x, atol=1e-6)
+    np.testing.assert_allclose(ours["intensity"], ref.y, rtol=1e-6, atol=1e-6)
+    np.testing.assert_allclose(ours["d_angstrom"], ref.d_hkls, rtol=1e-9)
+    for fams, ref_fams in zip(ours["hkls"], ref.hkls):
+        assert sum(f["multiplicity"] for f in fams) == sum(f["multiplicity"] for f in ref_fams)
+
+
+def test_reflection_table_is_cached_per_structure():
+    clear_reflection_cache()
+    si = _structures()[0]
+    table = get_reflection_table(si)
+    assert get_reflection_table(si.copy()) is table
+    assert structure_hash(si) == structure_hash(si.copy())
+    # A wider limiting sphere (shorter wavelength) triggers a rebuild
+    simulate_pattern(si, 0.5, 10, 120)
+    assert get_reflection_table(si) is not table
+
+
+def test_reflection_cache_evicts_least_recently_used(monkeypatch):
+    from src.agents.xrd_agent.sub_agents.reference_check.tools import simulate_pattern as sp
+
+    clear_reflection_cache()
+    monkeypatch.setattr(sp, "MAX_CACHED_TABLES", 2)
+    si, zno, rutile, _ = _structures()
+    si_table = get_reflection_table(si)
+    get_reflection_table(zno)
+    assert get_reflection_table(si) is si_table  # si is now the most recently used
+    get_reflection_table(rutile)
+    assert len(sp._TABLE_CACHE) == 2
+    assert structure_hash(zno) not in sp._TABLE_CACHE
+    assert get_reflection_table(si) is si_table
@@ -0,0 +1,13 @@
+import numpy as np
+
+from src.agents.xrd_agent.sub_agents.peak_finder.tools import _voigt
+
+
+def test_voigt_amp_is_peak_height_and_width_follows_sigma_gamma():
+    x = np.linspace(27, 30, 300001)
+    y = _voigt(x, 500, 28.44, 0.04, 0.03, 10)
+    assert np.isclose(y.max(), 510) and np.isclose(x[np.argmax(y)], 28.44, atol=1e-4)
+    above = x[y - 10 >= 250]
+    fwhm = 0.5346 * 0.06 + np.sqrt(0.2166 * 0.06 ** 2 + (2.3548 * 0.04) ** 2)
+    # Olivero-Longbothum is accurate to ~0.02%
+    assert abs((above[-1] - above[0]) - fwhm) < 1e-3
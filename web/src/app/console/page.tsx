@@ -137,7 +137,7 @@ export default function ConsolePage() {
                     ) : null
               )
             ) : (
-              <PlotsView items={items} />
+              <PlotsView items={items} runId={runId} />
             )}
             {isRunning ? (
               <div className="mt-2 flex items-center justify-start gap-2 text-xs text-slate-600">
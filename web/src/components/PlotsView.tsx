@@ -1,7 +1,8 @@
 "use client";
 import { useMemo, useState } from "react";
+import ViewportChart from "@/components/ViewportChart";
 
-export default function PlotsView({ items }: { items: Array<{ kind: string; id: string; event?: any }> }) {
+export default function PlotsView({ items, runId }: { items: Array<{ kind: string; id: string; event?: any }>; runId?: string }) {
   const htmlFiles = useMemo(() => {
     const set = new Map<string, string>();
     for (const it of items) {
@@ -27,6 +28,8 @@ export default function PlotsView({ items }: { items: Array<{ kind: string; id:
 
   return (
     <div className="flex min-h-0 flex-1 flex-col">
+      {/* refetched whenever the reporter publishes another loop's figures */}
+      {runId ? <ViewportChart runId={runId} refreshKey={htmlFiles.length} /> : null}
       <div className="mb-2 flex gap-2 overflow-x-auto">
         {htmlFiles.map((f) => (
           <button
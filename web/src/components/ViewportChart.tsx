@@ -0,0 +1,133 @@
+"use client";
+import { useEffect, useMemo, useRef, useState } from "react";
+import { fetchViewport, Viewport } from "@/lib/viewport";
+
+const WIDTH = 900;
+const HEIGHT = 320;
+const PAD = 40;
+
+type Trace = "raw" | "smoothed" | "corrected";
+
+// Zoomable view of the run's pattern, served decimated by /api/runs/{runId}/data:
+// drag to zoom into a 2θ range, double-click to reset.
+export default function ViewportChart({ runId, refreshKey }: { runId: string; refreshKey?: number }) {
+  const [trace, setTrace] = useState<Trace>("corrected");
+  const [range, setRange] = useState<[number, number] | null>(null);
+  const [view, setView] = useState<Viewport | null>(null);
+  const [error, setError] = useState<string | null>(null);
+  const [drag, setDrag] = useState<[number, number] | null>(null);
+  const svgRef = useRef<SVGSVGElement | null>(null);
+
+  useEffect(() => {
+    const ctrl = new AbortController();
+    // two samples (min and max) per horizontal pixel
+    fetchViewport(runId, { trace, xmin: range?.[0], xmax: range?.[1], points: 2 * WIDTH }, ctrl.signal)
+      .then((v) => {
+        setView(v);
+        setError(null);
+      })
+      .catch((e) => {
+        if (!ctrl.signal.aborted) setError(String(e?.message ?? e));
+      });
+    return () => ctrl.abort();
+  }, [runId, trace, range, refreshKey]);
+
+  const scale = useMemo(() => {
+    if (!view || view.x.length === 0) return null;
+    const x0 = range ? range[0] : view.x[0];
+    const x1 = range ? range[1] : view.x[view.x.length - 1];
+    let y0 = Infinity;
+    let y1 = -Infinity;
+    for (let i = 0; i < view.y.length; i++) {
+      if (view.y[i] < y0) y0 = view.y[i];
+      if (view.y[i] > y1) y1 = view.y[i];
+    }
+    if (y1 <= y0) y1 = y0 + 1;
+    const sx = (x: number) => PAD + ((x - x0) / (x1 - x0 || 1)) * (WIDTH - 2 * PAD);
+    const sy = (y: number) => HEIGHT - PAD - ((y - y0) / (y1 - y0)) * (HEIGHT - 2 * PAD);
+    const invX = (px: number) => x0 + ((px - PAD) / (WIDTH - 2 * PAD)) * (x1 - x0);
+    return { x0, x1, sx, sy, invX };
+  }, [view, range]);
+
+  const polyline = useMemo(() => {
+    if (!view || !scale) return "";
+    const pts: string[] = new Array(view.x.length);
+    for (let i = 0; i < view.x.length; i++) {
+      pts[i] = `${scale.sx(view.x[i]).toFixed(1)},${scale.sy(view.y[i]).toFixed(1)}`;
+    }
+    return pts.join(" ");
+  }, [view, scale]);
+
+  const toSvgX = (clientX: number) => {
+    const rect = svgRef.current?.getBoundingClientRect();
+    return rect ? ((clientX - rect.left) / rect.width) * WIDTH : 0;
+  };
+
+  const endDrag = () => {
+    if (drag && scale && Math.abs(drag[1] - drag[0]) > 5) {
+      const a = scale.invX(Math.min(drag[0], drag[1]));
+      const b = scale.invX(Math.max(drag[0], drag[1]));
+      setRange([a, b]);
+    }
+    setDrag(null);
+  };
+
+  return (
+    <div className="mb-4 rounded-lg border border-slate-200 bg-white p-3 shadow-sm">
+      <div className="mb-2 flex items-center gap-2 text-sm text-slate-700">
+        {(["raw", "smoothed", "corrected"] as Trace[]).map((t) => (
+          <button
+            key={t}
+            onClick={() => setTrace(t)}
+            className={`rounded-lg px-3 py-1 transition ${trace === t ? "bg-[#d68e2f] text-white" : "border border-slate-200 bg-white/70 hover:bg-white"}`}
+          >
+            {t}
+          </button>
+        ))}
+        {view ? (
+          <span className="ml-auto text-xs text-slate-500">
+            {view.x.length.toLocaleString()} of {view.totalPoints.toLocaleString()} points, level {view.level}, loop {view.loop}
+          </span>
+        ) : null}
+      </div>
+      {error ? (
+        <div className="text-sm text-slate-500">{error}</div>
+      ) : (
+        <svg
+          ref={svgRef}
+          viewBox={`0 0 ${WIDTH} ${HEIGHT}`}
+          className="w-full cursor-crosshair select-none"
+          onMouseDown={(e) => {
+            const px = toSvgX(e.clientX);
+            setDrag([px, px]);
+          }}
+          onMouseMove={(e) => drag && setDrag([drag[0], toSvgX(e.clientX)])}
+          onMouseUp={endDrag}
+          onMouseLeave={endDrag}
+          onDoubleClick={() => setRange(null)}
+        >
+          <line x1={PAD} y1={HEIGHT - PAD} x2={WIDTH - PAD} y2={HEIGHT - PAD} stroke="#94a3b8" />
+          <line x1={PAD} y1={PAD} x2={PAD} y2={HEIGHT - PAD} stroke="#94a3b8" />
+          {scale ? (
+            <>
+              <text x={PAD} y={HEIGHT - PAD + 16} fontSize="11" fill="#475569">{scale.x0.toFixed(2)}°</text>
+              <text x={WIDTH - PAD} y={HEIGHT - PAD + 16} fontSize="11" fill="#475569" textAnchor="end">{scale.x1.toFixed(2)}°</text>
+              <text x={WIDTH / 2} y={HEIGHT - 8} fontSize="11" fill="#475569" textAnchor="middle">2θ (°)</text>
+            </>
+          ) : null}
+          <polyline points={polyline} fill="none" stroke="#d6512f" strokeWidth={1} />
+          {drag ? (
+            <rect
+              x={Math.min(drag[0], drag[1])}
+              y={PAD}
+              width={Math.abs(drag[1] - drag[0])}
+              height={HEIGHT - 2 * PAD}
+              fill="#d68e2f"
+              fillOpacity={0.15}
+            />
+          ) : null}
+        </svg>
+      )}
+    </div>
+  );
+}
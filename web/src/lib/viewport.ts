@@ -0,0 +1,39 @@
+export type Viewport = {
+  x: Float32Array;
+  y: Float32Array;
+  level: number;
+  totalPoints: number;
+  loop: number;
+};
+
+export type ViewportQuery = {
+  path?: string;
+  loop?: number;
+  trace?: "raw" | "smoothed" | "corrected";
+  xmin?: number;
+  xmax?: number;
+  points?: number;
+};
+
+// Fetches a decimated slice of a pattern from /api/runs/{runId}/data.
+// Body layout: uint32 n, float32 x[n], float32 y[n] (little-endian).
+export async function fetchViewport(runId: string, query: ViewportQuery = {}, signal?: AbortSignal): Promise<Viewport> {
+  const params = new URLSearchParams();
+  for (const [k, v] of Object.entries(query)) {
+    if (v !== undefined && v !== null) params.set(k, String(v));
+  }
+  const res = await fetch(`${process.env.NEXT_PUBLIC_API_HTTP}/api/runs/${runId}/data?${params}`, { signal });
+  if (!res.ok) {
+    const err = await res.json().catch(() => ({}));
+    throw new Error(err?.error ?? `Viewport request failed (${res.status})`);
+  }
+  const buf = await res.arrayBuffer();
+  const n = new DataView(buf).getUint32(0, true);
+  return {
+    x: new Float32Array(buf, 4, n),
+    y: new Float32Array(buf, 4 + 4 * n, n),
+    level: Number(res.headers.get("X-Level") ?? 0),
+    totalPoints: Number(res.headers.get("X-Total-Points") ?? n),
+    loop: Number(res.headers.get("X-Loop") ?? 0),
+  };
+}